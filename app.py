@@ -2,15 +2,24 @@
 Главное приложение Flask для портала управления поливом растений
 """
 import os
+import hashlib
 import logging
-from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, session
+from jinja2 import FileSystemBytecodeCache
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 import bcrypt
 from werkzeug.utils import secure_filename
 from config import Config
-from database import User, Plant, WateringHistory, SystemSettings
-from scheduler import notification_scheduler
+from database import (User, Plant, PlantAssignee, WateringHistory, SystemSettings, SchedulerRun,
+                      CareAlreadyDone, NotificationDelivery, DataVersion)
+from calendar_events import month_events
+from due_index import due_index
+from live_updates import live_updates
+from scheduler import get_notification_scheduler
+from notification_templates import render_completion
+from outbox import outbox_sender
 import threading
 
 # Настройка логирования
@@ -24,6 +33,12 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Скомпилированные шаблоны сохраняются на диск: новый воркер не компилирует
+# их заново при первом запросе (окружение Jinja создаётся при первом рендере)
+if Config.JINJA_CACHE_DIR:
+    os.makedirs(Config.JINJA_CACHE_DIR, exist_ok=True)
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(Config.JINJA_CACHE_DIR)}
+
 # Инициализация Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -74,26 +89,111 @@ def save_plant_image(file):
     return None
 
 
+def save_plant_assignees(plant_id, location):
+    """Сохранить ответственных из формы растения (на растение или на всё местоположение)"""
+    user_ids = [int(user_id) for user_id in request.form.getlist('assignees')]
+    if request.form.get('assignee_scope') == 'location' and location:
+        PlantAssignee.set_for_plant(plant_id, [])
+        PlantAssignee.set_for_location(location, user_ids)
+    else:
+        PlantAssignee.set_for_plant(plant_id, user_ids)
+
+
+def _build_tag():
+    """Версия кода страниц: после обновления app.py или шаблонов старые ETag не совпадут"""
+    template_dir = os.path.join(app.root_path, app.template_folder)
+    paths = [os.path.abspath(__file__)] + [
+        os.path.join(root, name) for root, _, names in os.walk(template_dir) for name in names
+    ]
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        digest.update(f"{path}:{os.stat(path).st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+BUILD_TAG = _build_tag()
+
+
+def conditional_get(view):
+    """
+    Условный GET по версии данных (DataVersion.get)
+
+    ETag строится из версии данных, пользователя, текущей даты (сроки ухода
+    считаются от сегодняшнего дня), адреса и версии кода. Если клиент прислал
+    совпадающий If-None-Match (или If-Modified-Since не старше изменений), ответ
+    304 отдаётся без запросов моделей и рендера шаблона.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Flash-сообщения показываются один раз: такую страницу нельзя подтверждать 304
+        if request.method != 'GET' or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        try:
+            version = DataVersion.get()
+        except Exception as e:
+            logger.error(f"Ошибка получения версии данных: {e}")
+            version = None
+        if version is None:
+            return view(*args, **kwargs)
+
+        now = datetime.now()
+        timestamps = [value for value in version if isinstance(value, datetime)]
+        # updated_at хранится с точностью до секунды: второе изменение в ту же секунду
+        # не изменит версию, поэтому свежие изменения отдаются без валидаторов
+        if any(value >= now.replace(microsecond=0) - timedelta(seconds=1) for value in timestamps):
+            return view(*args, **kwargs)
+
+        today = now.date()
+        etag = hashlib.sha1(
+            repr((BUILD_TAG, current_user.get_id(), today.isoformat(), version, request.full_path)).encode('utf-8')
+        ).hexdigest()
+        # Наивное время БД - локальное; в заголовке - UTC
+        last_modified = max(timestamps + [datetime.combine(today, datetime.min.time())])
+        last_modified = last_modified.replace(microsecond=0).astimezone(timezone.utc)
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = bool(request.if_modified_since) and request.if_modified_since >= last_modified
+
+        if not_modified:
+            response = app.response_class(status=304)
+        else:
+            # Сверка индекса сроков, если данные изменил другой процесс (бот, планировщик)
+            due_index.observe_version(version)
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            response.last_modified = last_modified
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    return wrapper
+
+
 # Маршруты приложения
 
 @app.route('/')
 @login_required
+@conditional_get
 def index():
     """Главная страница - дашборд"""
-    plants = Plant.get_all()
+    # Растения и сроки ухода - из индекса в памяти (due_index.py), без запросов к БД
+    plants = due_index.plants()
     recent_history = WateringHistory.get_recent(limit=10)
     
-    # Подсчет статистики
     today = datetime.now().date()
-    plants_needing_water = sum(1 for p in plants if p['next_watering_date'] and p['next_watering_date'] <= today)
-    plants_needing_fertilizer = sum(1 for p in plants if p['fertilizer_interval_days'] and 
-                                   p['next_fertilizer_date'] and p['next_fertilizer_date'] <= today)
+    due_counts = due_index.due_counts(today)
     
     return render_template('dashboard.html',
                           plants=plants,
                           recent_history=recent_history,
-                          plants_needing_water=plants_needing_water,
-                          plants_needing_fertilizer=plants_needing_fertilizer,
+                          plants_needing_water=due_counts.get('watering', 0),
+                          plants_needing_fertilizer=due_counts.get('fertilizer', 0),
+                          due_counts=due_counts,
                           today=today)
 
 
@@ -148,6 +248,7 @@ def add_user():
         password = request.form.get('password')
         telegram_id = request.form.get('telegram_id')
         receive_notifications = request.form.get('receive_notifications') == 'on'
+        dm_notifications = request.form.get('dm_notifications') == 'on'
         
         # Проверка существования пользователя
         existing_user = User.get_by_username(username)
@@ -159,7 +260,7 @@ def add_user():
         password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
         
         # Создание пользователя
-        User.create(name, username, password_hash, telegram_id, receive_notifications)
+        User.create(name, username, password_hash, telegram_id, receive_notifications, dm_notifications)
         flash(f'Пользователь {name} успешно создан', 'success')
         return redirect(url_for('users_list'))
     
@@ -180,10 +281,11 @@ def edit_user(user_id):
         username = request.form.get('username')
         telegram_id = request.form.get('telegram_id')
         receive_notifications = request.form.get('receive_notifications') == 'on'
+        dm_notifications = request.form.get('dm_notifications') == 'on'
         new_password = request.form.get('new_password')
         
         # Обновление пользователя
-        User.update(user_id, name, username, telegram_id, receive_notifications)
+        User.update(user_id, name, username, telegram_id, receive_notifications, dm_notifications)
         
         # Обновление пароля, если указан
         if new_password:
@@ -216,6 +318,7 @@ def delete_user(user_id):
 
 @app.route('/plants')
 @login_required
+@conditional_get
 def plants_list():
     """Список растений"""
     plants = Plant.get_all()
@@ -244,11 +347,13 @@ def add_plant():
                 image_url = save_plant_image(file)
         
         # Создание растения
-        Plant.create(name, watering_interval, fertilizer_interval, description, location, image_url)
+        plant_id = Plant.create(name, watering_interval, fertilizer_interval, description, location, image_url)
+        save_plant_assignees(plant_id, location)
         flash(f'Растение {name} успешно добавлено', 'success')
         return redirect(url_for('plants_list'))
     
-    return render_template('plant_form.html', action='add')
+    return render_template('plant_form.html', action='add', users=User.get_all(),
+                           assignee_ids=[], assignee_scope='plant')
 
 
 @app.route('/plants/edit/<int:plant_id>', methods=['GET', 'POST'])
@@ -280,10 +385,19 @@ def edit_plant(plant_id):
         
         # Обновление растения
         Plant.update(plant_id, name, watering_interval, fertilizer_interval, description, location, image_url)
+        save_plant_assignees(plant_id, location)
         flash(f'Данные растения {name} обновлены', 'success')
         return redirect(url_for('plants_list'))
     
-    return render_template('plant_form.html', action='edit', plant=plant)
+    # Назначение на растение важнее назначения на местоположение
+    assignee_ids = PlantAssignee.get_for_plant(plant_id)
+    assignee_scope = 'plant'
+    if not assignee_ids and plant['location']:
+        assignee_ids = PlantAssignee.get_for_location(plant['location'])
+        assignee_scope = 'location' if assignee_ids else 'plant'
+    
+    return render_template('plant_form.html', action='edit', plant=plant, users=User.get_all(),
+                           assignee_ids=assignee_ids, assignee_scope=assignee_scope)
 
 
 @app.route('/plants/delete/<int:plant_id>', methods=['POST'])
@@ -304,10 +418,16 @@ def delete_plant(plant_id):
 @login_required
 def water_plant(plant_id):
     """Полить растение"""
-    success = Plant.update_watering(plant_id, current_user.id)
+    plant = Plant.get_by_id(plant_id)
+    # Доставленные уведомления Telegram заменяются отметкой о выполнении
+    completion_text = render_completion(plant['name'], 'watering', current_user.name) if plant else None
+    try:
+        success = Plant.update_watering(plant_id, current_user.id, completion_text=completion_text)
+    except CareAlreadyDone as e:
+        flash(f'Уже полито: {e.user_name or "другой пользователь"}', 'info')
+        return redirect(request.referrer or url_for('index'))
     
     if success:
-        plant = Plant.get_by_id(plant_id)
         flash(f'Растение {plant["name"]} полито', 'success')
     else:
         flash('Ошибка при обновлении данных', 'error')
@@ -319,10 +439,16 @@ def water_plant(plant_id):
 @login_required
 def fertilize_plant(plant_id):
     """Прикормить растение"""
-    success = Plant.update_fertilizer(plant_id, current_user.id)
+    plant = Plant.get_by_id(plant_id)
+    # Доставленные уведомления Telegram заменяются отметкой о выполнении
+    completion_text = render_completion(plant['name'], 'fertilizer', current_user.name) if plant else None
+    try:
+        success = Plant.update_fertilizer(plant_id, current_user.id, completion_text=completion_text)
+    except CareAlreadyDone as e:
+        flash(f'Уже прикормлено: {e.user_name or "другой пользователь"}', 'info')
+        return redirect(request.referrer or url_for('index'))
     
     if success:
-        plant = Plant.get_by_id(plant_id)
         flash(f'Растение {plant["name"]} прикормлено', 'success')
     else:
         flash('Ошибка при обновлении данных', 'error')
@@ -360,63 +486,8 @@ def calendar_view():
         year = now.year
         month = now.month
     
-    # Получаем все растения
-    plants = Plant.get_all()
-    
-    # Получаем историю за выбранный месяц
-    month_start = date(year, month, 1)
-    if month == 12:
-        month_end = date(year + 1, 1, 1)
-    else:
-        month_end = date(year, month + 1, 1)
-    
-    # Собираем все события за месяц
-    events = {}  # {date: [events]}
-    
-    for plant in plants:
-        # Получаем историю полива за месяц
-        history = WateringHistory.get_by_plant(plant['id'], limit=100)
-        for entry in history:
-            event_date = entry['watered_at'].date()
-            if month_start <= event_date < month_end:
-                if event_date not in events:
-                    events[event_date] = []
-                
-                events[event_date].append({
-                    'type': entry['action_type'],
-                    'plant_name': plant['name'],
-                    'plant_id': plant['id'],
-                    'user_name': entry['user_name'],
-                    'time': entry['watered_at'].strftime('%H:%M')
-                })
-        
-        # Добавляем запланированные поливы
-        if plant['next_watering_date'] and month_start <= plant['next_watering_date'] < month_end:
-            event_date = plant['next_watering_date']
-            if event_date not in events:
-                events[event_date] = []
-            
-            events[event_date].append({
-                'type': 'planned_watering',
-                'plant_name': plant['name'],
-                'plant_id': plant['id'],
-                'user_name': None,
-                'time': None
-            })
-        
-        # Добавляем запланированные прикормки
-        if plant['next_fertilizer_date'] and month_start <= plant['next_fertilizer_date'] < month_end:
-            event_date = plant['next_fertilizer_date']
-            if event_date not in events:
-                events[event_date] = []
-            
-            events[event_date].append({
-                'type': 'planned_fertilizer',
-                'plant_name': plant['name'],
-                'plant_id': plant['id'],
-                'user_name': None,
-                'time': None
-            })
+    # История месяца одним запросом (прошедшие месяцы - из кеша) и запланированный уход
+    events = month_events(year, month, due_index.plants(), now.date())
     
     # Генерируем календарную сетку
     cal.setfirstweekday(0)  # Понедельник первый день недели
@@ -456,6 +527,32 @@ def calendar_view():
                          next_month=next_month)
 
 
+@app.route('/api/calendar/events')
+@login_required
+def calendar_events_api():
+    """
+    API событий календаря за месяц
+
+    Параметры: year, month (по умолчанию текущий месяц).
+    events - {дата ISO: [события]}, события как на странице календаря.
+    """
+    now = datetime.now()
+    year = request.args.get('year', type=int) or now.year
+    month = request.args.get('month', type=int) or now.month
+    if not 1 <= month <= 12:
+        return jsonify({'error': 'month должен быть от 1 до 12'}), 400
+    # Границы месяца (month_bounds) включают первый день следующего месяца
+    if not 1 <= year <= 9998:
+        return jsonify({'error': 'year должен быть от 1 до 9998'}), 400
+
+    events = month_events(year, month, due_index.plants(), now.date())
+    return jsonify({
+        'year': year,
+        'month': month,
+        'events': {day.isoformat(): events[day] for day in sorted(events)},
+    })
+
+
 @app.route('/statistics')
 @login_required
 def statistics():
@@ -567,7 +664,12 @@ def settings():
         SystemSettings.set('notification_end_hour', request.form.get('end_hour'))
         SystemSettings.set('notification_retry_interval_minutes', request.form.get('retry_interval'))
         SystemSettings.set('notification_max_retries', request.form.get('max_retries'))
+        SystemSettings.set('notification_release_spread_minutes', request.form.get('release_spread', '30'))
+        SystemSettings.set('assignee_rotation', request.form.get('assignee_rotation', 'none'))
+        SystemSettings.set('notification_escalate_after_retries', request.form.get('escalate_after', '2'))
         SystemSettings.set('telegram_bot_token', request.form.get('bot_token'))
+        SystemSettings.set('telegram_group_chat_id', (request.form.get('group_chat_id') or '').strip())
+        SystemSettings.set('notification_include_photo', 'true' if request.form.get('include_photo') else 'false')
         
         # Сохранение шаблонов повторных сообщений
         for i in range(1, 6):
@@ -583,27 +685,128 @@ def settings():
     return render_template('settings.html', settings=settings_dict)
 
 
+@app.route('/scheduler')
+@login_required
+def scheduler_runs_page():
+    """История тиков планировщика"""
+    job_id = request.args.get('job') or None
+    try:
+        runs = SchedulerRun.get_recent(200, job_id)
+        source = 'db'
+    except Exception as e:
+        logger.error(f"Ошибка чтения scheduler_runs: {e}")
+        runs = [r for r in get_notification_scheduler().history.recent() if not job_id or r['job_id'] == job_id]
+        source = 'memory'
+
+    # Доставка уведомлений за сутки по статусам получателей
+    try:
+        deliveries = NotificationDelivery.get_status_counts(datetime.now() - timedelta(days=1))
+    except Exception as e:
+        logger.error(f"Ошибка чтения notification_delivery: {e}")
+        deliveries = {}
+
+    # Сводка по задачам: длительность выполненных тиков и число пропусков
+    summary = {}
+    for run in runs:
+        item = summary.setdefault(run['job_id'], {'runs': 0, 'durations': [], 'missed': 0, 'overlap': 0, 'errors': 0})
+        item['runs'] += 1
+        if run['status'] == 'ok' and run['duration_ms'] is not None:
+            item['durations'].append(run['duration_ms'])
+        elif run['status'] in ('missed', 'overlap'):
+            item[run['status']] += 1
+        elif run['status'] == 'error':
+            item['errors'] += 1
+    for item in summary.values():
+        durations = sorted(item.pop('durations'))
+        item['avg_ms'] = int(sum(durations) / len(durations)) if durations else None
+        item['p95_ms'] = durations[max(0, int(len(durations) * 0.95) - 1)] if durations else None
+        item['max_ms'] = durations[-1] if durations else None
+
+    return render_template('scheduler.html',
+                         runs=runs,
+                         summary=summary,
+                         source=source,
+                         job_id=job_id,
+                         deliveries=deliveries,
+                         status=get_notification_scheduler().status())
+
+
 @app.route('/api/dashboard/stats')
 @login_required
+@conditional_get
 def dashboard_stats():
     """API для получения статистики дашборда"""
-    plants = Plant.get_all()
-    today = datetime.now().date()
-    
-    stats = {
-        'total_plants': len(plants),
-        'plants_needing_water': sum(1 for p in plants if p['next_watering_date'] and p['next_watering_date'] <= today),
-        'plants_needing_fertilizer': sum(1 for p in plants if p['fertilizer_interval_days'] and 
-                                        p['next_fertilizer_date'] and p['next_fertilizer_date'] <= today),
-        'watered_today': sum(1 for p in plants if p['last_watered_at'] and 
-                            p['last_watered_at'].date() == today)
-    }
-    
-    return jsonify(stats)
+    return jsonify(due_index.stats(datetime.now().date()))
+
+
+@app.route('/api/events')
+@login_required
+def live_events():
+    """Поток живых обновлений дашборда (Server-Sent Events, см. live_updates.py)"""
+    return Response(
+        live_updates.stream(request.headers.get('Last-Event-ID')),
+        mimetype='text/event-stream',
+        # X-Accel-Buffering: nginx не должен буферизовать поток
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/scheduler/status')
+@login_required
+def scheduler_status():
+    """API состояния планировщика и лидерства в этом процессе"""
+    return jsonify(get_notification_scheduler().status())
+
+
+@app.route('/api/scheduler/runs')
+@login_required
+def scheduler_runs():
+    """
+    API истории тиков планировщика
+
+    runs - общая история из scheduler_runs, memory - кольцевой буфер этого процесса.
+    Параметры: limit (по умолчанию 50), job - фильтр по id задачи.
+    """
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    job_id = request.args.get('job') or None
+
+    def serialize(run):
+        run = dict(run)
+        for key in ('started_at', 'finished_at'):
+            if run.get(key):
+                run[key] = run[key].isoformat()
+        return run
+
+    scheduler = get_notification_scheduler()
+    memory = [r for r in scheduler.history.recent() if not job_id or r['job_id'] == job_id]
+    try:
+        runs = [serialize(r) for r in SchedulerRun.get_recent(limit, job_id)]
+    except Exception as e:
+        logger.error(f"Ошибка чтения scheduler_runs: {e}")
+        runs = None
+
+    return jsonify({
+        'scheduler': scheduler.status(),
+        'runs': runs,
+        'memory': [serialize(r) for r in memory[:limit]],
+    })
 
 
 # Запуск приложения
 
+def start_background_services():
+    """Запустить планировщик и пул отправителей outbox"""
+    get_notification_scheduler().start()
+    outbox_sender.start()
+
+
+# Под WSGI-сервером (gunicorn -w N) блок __main__ не выполняется. Планировщик
+# можно запускать в каждом воркере: задачи выполнит только процесс-лидер,
+# а отправители outbox захватывают непересекающиеся пачки сообщений
+if Config.SCHEDULER_AUTOSTART and __name__ != '__main__':
+    start_background_services()
+
+
 def start_telegram_bot():
     """Запуск Telegram бота в отдельном потоке"""
     import asyncio
@@ -630,7 +833,7 @@ if __name__ == '__main__':
     # В debug режиме Flask запускает приложение дважды из-за reloader
     import os
     if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not Config.DEBUG:
-        notification_scheduler.start()
+        start_background_services()
         logger.info("Планировщик уведомлений запущен")
     else:
         logger.info("Пропуск запуска планировщика (reloader процесс)")
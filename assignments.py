@@ -0,0 +1,116 @@
+"""
+Ответственные за растения: кому отправлять уведомления об уходе
+"""
+from datetime import date
+from database import PlantAssignee, SystemSettings, User
+
+# Режимы ротации ответственных
+ROTATION_NONE = 'none'
+ROTATION_WEEKLY = 'weekly'
+
+
+class RecipientResolver:
+    """
+    Получатели уведомлений, вычисляемые один раз за тик
+
+    Ответственные назначаются на растение или на всё местоположение
+    (назначение на растение важнее). Без ротации уведомление получают все
+    ответственные, при еженедельной - один, по очереди с понедельника.
+    Первичное уведомление и первые escalate_after повторов уходят только
+    ответственным, следующие повторы - всем пользователям. Растения без
+    ответственных (или чьи ответственные не получают уведомлений) по-прежнему
+    оповещают всех.
+
+    Если настроен общий чат (telegram_group_chat_id), уведомление публикуется
+    в нём один раз, а в личные сообщения уходит только тем из выбранных
+    получателей, кто включил dm_notifications.
+    """
+
+    def __init__(self, users, assignments, rotation=ROTATION_NONE, escalate_after=2, today=None,
+                 group_chat_id=None):
+        """
+        Args:
+            users: Пользователи, получающие уведомления (User.get_users_for_notifications)
+            assignments: Строки plant_assignees в порядке очереди ротации
+            rotation: ROTATION_NONE или ROTATION_WEEKLY
+            escalate_after: Сколько повторов отправлять только ответственным
+            today: Дата тика (определяет неделю ротации)
+            group_chat_id: ID общего чата или None
+        """
+        self.users = users or []
+        self.rotation = rotation
+        self.escalate_after = escalate_after
+        self.group_chat_id = group_chat_id or None
+        self._users_by_id = {user['id']: user for user in self.users}
+        self._by_plant = {}
+        self._by_location = {}
+        for row in assignments or []:
+            if row['plant_id'] is not None:
+                self._by_plant.setdefault(row['plant_id'], []).append(row['user_id'])
+            elif row['location']:
+                self._by_location.setdefault(self._location_key(row['location']), []).append(row['user_id'])
+
+        # Номер недели от фиксированного понедельника: ротация не сбивается на стыке лет
+        self._week = ((today or date.today()).toordinal() - 1) // 7
+        self._cache = {}
+
+    @classmethod
+    def load(cls, users=None, today=None):
+        """Загрузить пользователей, назначения и настройки одним набором запросов"""
+        if users is None:
+            users = User.get_users_for_notifications()
+        return cls(
+            users,
+            PlantAssignee.get_all(),
+            rotation=SystemSettings.get('assignee_rotation', ROTATION_NONE),
+            escalate_after=int(SystemSettings.get('notification_escalate_after_retries', 2)),
+            today=today,
+            group_chat_id=(SystemSettings.get('telegram_group_chat_id') or '').strip(),
+        )
+
+    @staticmethod
+    def _location_key(location):
+        return location.strip().lower()
+
+    def assignees(self, plant):
+        """ID текущих ответственных за растение (с учётом ротации)"""
+        user_ids = self._by_plant.get(plant['id'])
+        if not user_ids and plant.get('location'):
+            user_ids = self._by_location.get(self._location_key(plant['location']))
+        if not user_ids:
+            return []
+        if self.rotation == ROTATION_WEEKLY:
+            return [user_ids[self._week % len(user_ids)]]
+        return user_ids
+
+    def is_escalated(self, retry):
+        """Уходит ли повтор номер retry (0 - первичное уведомление) всем пользователям"""
+        return retry > self.escalate_after
+
+    def recipients(self, plant, retry=0):
+        """
+        Пользователи, которым повтор номер retry уведомления о растении
+        отправляется в личные сообщения
+        """
+        escalated = self.is_escalated(retry)
+        targets = self._cache.get((plant['id'], escalated))
+        if targets is None:
+            if escalated:
+                targets = self.users
+            else:
+                targets = [
+                    self._users_by_id[user_id] for user_id in self.assignees(plant)
+                    if user_id in self._users_by_id
+                ] or self.users
+            if self.group_chat_id:
+                # Остальные увидят уведомление в общем чате
+                targets = [user for user in targets if user.get('dm_notifications')]
+            self._cache[(plant['id'], escalated)] = targets
+        return targets
+
+    def assignee_names(self, plant):
+        """Имена текущих ответственных (для сообщения в общем чате)"""
+        return [
+            self._users_by_id[user_id]['name'] for user_id in self.assignees(plant)
+            if user_id in self._users_by_id
+        ]
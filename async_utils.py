@@ -10,11 +10,17 @@ class AsyncLoopThread:
     _instance = None
     _loop = None
     _thread = None
+    _lock = threading.Lock()
 
     def __new__(cls):
+        # Экземпляр создаётся при первом обращении: одновременные первые вызовы
+        # не должны запустить два event loop
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._start_loop()
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance._start_loop()
+                    cls._instance = instance
         return cls._instance
 
     def _start_loop(self):
@@ -42,5 +48,6 @@ class AsyncLoopThread:
             self._loop.call_soon_threadsafe(self._loop.stop)
 
 
-# Глобальный экземпляр
-async_loop = AsyncLoopThread()
\ No newline at end of file
+def get_async_loop():
+    """Глобальный поток с event loop; запускается при первом обращении, а не при импорте"""
+    return AsyncLoopThread()
\ No newline at end of file
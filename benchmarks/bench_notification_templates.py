@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Микро-бенчмарк отрисовки уведомлений: старый путь против скомпилированных шаблонов
+
+Запуск: python benchmarks/bench_notification_templates.py [--plants 1000] [--repeat 5]
+
+Старый путь воспроизводит прежний _format_notification_message: поиск шаблона
+повтора в настройках на каждое сообщение (в продакшене это запрос к БД),
+три str.replace для прикормки, pytz.timezone и склейку строк. Для честного
+сравнения настройки здесь читаются из словаря, т.е. без стоимости запроса.
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytz  # noqa: E402
+from notification_templates import MOSCOW_TZ, NotificationTemplates  # noqa: E402
+
+SETTINGS = {
+    'retry_message_1': '⚠️ Напоминание: растение всё ещё ждёт полива!',
+    'retry_message_2': '💧 Полейте растение, пожалуйста, ему нужна вода',
+    'retry_message_3': '🚨 Третье напоминание о поливе!',
+}
+
+
+def legacy_render(plant, notif_type, attempt, settings_get):
+    """Копия прежней реализации для сравнения"""
+    if attempt > 0:
+        retry_message = settings_get(f'retry_message_{attempt}', '')
+        if retry_message:
+            if notif_type == 'fertilizer':
+                retry_message = retry_message.replace('полив', 'прикормк')
+                retry_message = retry_message.replace('Полейте', 'Прикормите')
+                retry_message = retry_message.replace('вод', 'удобрен')
+            header = f"{retry_message}\n\n"
+        else:
+            action = "полива" if notif_type == 'watering' else "прикормки"
+            header = f"⚠️ Напоминание #{attempt}: растение всё ещё ждёт {action}!\n\n"
+    else:
+        if notif_type == 'watering':
+            header = "💧 **Время полить растение!**\n\n"
+        else:
+            header = "🌱 **Время прикормить растение!**\n\n"
+
+    message = f"{header}🌿 Растение: **{plant['name']}**\n"
+    if plant.get('location'):
+        message += f"📍 Местоположение: {plant['location']}\n"
+    if plant.get('description'):
+        message += f"ℹ️ {plant['description']}\n"
+
+    moscow_tz = pytz.timezone('Europe/Moscow')
+    message += f"\n⏰ Дата уведомления: {datetime.now(moscow_tz).strftime('%d.%m.%Y %H:%M')}"
+    return message
+
+
+def make_workload(plants_count, seed=42):
+    """Набор (растение, тип, попытка), похожий на один тик с повторами"""
+    rng = random.Random(seed)
+    workload = []
+    for plant_id in range(1, plants_count + 1):
+        plant = {
+            'id': plant_id,
+            'name': f"Растение {plant_id}",
+            'location': rng.choice([None, 'Гостиная', 'Кухня', 'Балкон']),
+            'description': rng.choice([None, 'Любит рассеянный свет']),
+        }
+        workload.append((plant, rng.choice(['watering', 'fertilizer']), rng.randint(0, 5)))
+    return workload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--plants', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workload = make_workload(args.plants)
+    templates = NotificationTemplates(SETTINGS, version='bench')
+
+    # Результаты обоих путей должны совпадать
+    now = datetime.now(MOSCOW_TZ)
+    for plant, notif_type, attempt in workload[:50]:
+        assert legacy_render(plant, notif_type, attempt, SETTINGS.get) == \
+            templates.render(plant, notif_type, attempt, now)
+
+    def run_legacy():
+        for plant, notif_type, attempt in workload:
+            legacy_render(plant, notif_type, attempt, SETTINGS.get)
+
+    def run_compiled():
+        # Как в тике планировщика: одно "сейчас" на весь проход
+        tick_now = datetime.now(MOSCOW_TZ)
+        for plant, notif_type, attempt in workload:
+            templates.render(plant, notif_type, attempt, tick_now)
+
+    for name, func in (('legacy', run_legacy), ('compiled', run_compiled)):
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        per_message_us = best / len(workload) * 1e6
+        print(f"{name:>9}: {best * 1000:8.2f} мс на {len(workload)} сообщений, "
+              f"{per_message_us:6.2f} мкс/сообщение")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк холодного старта: время импорта модулей и первого запроса к порталу
+
+Запуск: python benchmarks/bench_startup.py [--repeat 5]
+
+Каждый замер - отдельный процесс Python, как у нового воркера gunicorn.
+Первый запрос (/login, без обращения к БД) меряется дважды: с пустым кешем
+байт-кода шаблонов (JINJA_CACHE_DIR) и с заполненным, как у воркеров,
+стартующих после первого. SCHEDULER_AUTOSTART отключается, чтобы замер
+не зависел от подключения к БД.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{'import_ms': (time.perf_counter() - started) * 1000}}))
+"""
+
+REQUEST_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+response = client.get('/login')
+first = time.perf_counter()
+client.get('/login')
+second = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (first - imported) * 1000,
+    'next_request_ms': (second - first) * 1000,
+}))
+"""
+
+
+def run(script, env):
+    """Выполнить скрипт в новом процессе и вернуть его JSON-результат"""
+    output = subprocess.run(
+        [sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median(results, key):
+    return statistics.median(result[key] for result in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help="Замеров на каждый сценарий (берётся медиана)")
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='bench_jinja_')
+    env = dict(os.environ, SCHEDULER_AUTOSTART='false', JINJA_CACHE_DIR=cache_dir)
+    try:
+        print(f"Медиана из {args.repeat} процессов, мс\n")
+
+        baseline = [run(IMPORT_SCRIPT.format(module='config'), env) for _ in range(args.repeat)]
+        print(f"{'import config':<34}{median(baseline, 'import_ms'):>10.1f}")
+        for module in ('app', 'telegram_bot'):
+            results = [run(IMPORT_SCRIPT.format(module=module), env) for _ in range(args.repeat)]
+            print(f"{'import ' + module:<34}{median(results, 'import_ms'):>10.1f}")
+
+        cold = []
+        for _ in range(args.repeat):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            cold.append(run(REQUEST_SCRIPT, env))
+        warm = [run(REQUEST_SCRIPT, env) for _ in range(args.repeat)]
+
+        print()
+        print(f"{'первый запрос, кеш шаблонов пуст':<34}{median(cold, 'first_request_ms'):>10.1f}")
+        print(f"{'первый запрос, кеш шаблонов есть':<34}{median(warm, 'first_request_ms'):>10.1f}")
+        print(f"{'следующий запрос':<34}{median(warm, 'next_request_ms'):>10.1f}")
+        print(f"{'импорт + первый запрос (с кешем)':<34}"
+              f"{median(warm, 'import_ms') + median(warm, 'first_request_ms'):>10.1f}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка Telegram Bot API для нагрузочных тестов
+
+Запуск: python benchmarks/fake_telegram_api.py [--port 8081] [--latency-ms 50]
+            [--error-rate 0.01] [--flood-rate 0.01] [--bot-rate 30] [--record calls.jsonl]
+
+Затем укажите TELEGRAM_API_BASE_URL=http://127.0.0.1:8081 для run_bot.py,
+run_outbox.py или портала: python-telegram-bot ходит в заглушку вместо
+api.telegram.org. Поддерживаются методы, которые использует проект:
+getMe, getUpdates, setWebhook, deleteWebhook, sendMessage, sendPhoto,
+editMessageText, editMessageCaption, answerCallbackQuery, answerInlineQuery.
+
+Методы отправки отвечают с задержкой --latency-ms (±--jitter-ms), часть
+запросов получает 502 (--error-rate) или 429 с retry_after (--flood-rate),
+а бот, превысивший --bot-rate запросов в секунду, получает 429, как от
+настоящего Telegram. Все вызовы записываются (в память и в --record).
+
+Служебные адреса для ручной проверки:
+    POST /_updates/<ID бота>  - поставить обновление (JSON) в очередь getUpdates
+    GET  /_calls              - записанные вызовы (JSON)
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+# Методы, к которым применяются задержка и внедрение ошибок
+SEND_METHODS = {
+    'sendMessage', 'sendPhoto', 'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup',
+    'answerCallbackQuery', 'answerInlineQuery',
+}
+
+# Максимальное ожидание обновлений в getUpdates (секунды)
+MAX_POLL_TIMEOUT = 10
+
+
+class FakeTelegramAPI:
+    """HTTP-сервер, отвечающий как Bot API, с задержками, ошибками и записью вызовов"""
+
+    def __init__(self, host='127.0.0.1', port=8081, latency_ms=0, jitter_ms=0, error_rate=0.0,
+                 flood_rate=0.0, retry_after=1, bot_rate=0, record=None, seed=None):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.bot_rate = bot_rate
+        self.calls = []
+        # Вызывается для каждого запроса: on_call(вызов) из потока сервера
+        self.on_call = None
+        self._record = open(record, 'a', encoding='utf-8') if record else None
+        self._random = random.Random(seed)
+        self._updates = {}
+        self._recent = {}
+        self._message_id = 0
+        self._lock = threading.Lock()
+        self._updates_changed = threading.Condition(self._lock)
+        self._httpd = None
+
+    @property
+    def url(self):
+        """Значение для TELEGRAM_API_BASE_URL"""
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        """Запустить сервер в фоновом потоке (port=0 - свободный порт)"""
+        self._httpd = ThreadingHTTPServer((self.host, self.port), FakeTelegramHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.api = self
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, name="fake-telegram-api", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        if self._record:
+            self._record.close()
+
+    def enqueue_update(self, bot_id, update):
+        """Поставить обновление в очередь getUpdates бота"""
+        with self._updates_changed:
+            self._updates.setdefault(str(bot_id), deque()).append(update)
+            self._updates_changed.notify_all()
+
+    def summary(self):
+        """Число вызовов по (метод, HTTP-статус)"""
+        with self._lock:
+            return Counter((call['method'], call['status']) for call in self.calls)
+
+    def handle(self, token, method, params):
+        """
+        Обработать вызов метода
+
+        Returns:
+            (HTTP-статус, тело ответа)
+        """
+        received_at = time.monotonic()
+        bot_id = token.split(':', 1)[0]
+        if method == 'getUpdates':
+            status, body = 200, {'ok': True, 'result': self._get_updates(bot_id, params)}
+        else:
+            if method in SEND_METHODS:
+                self._sleep()
+            status, body = self._inject(bot_id, method) or self._respond(bot_id, method, params)
+
+        call = {
+            'method': method, 'bot_id': bot_id, 'params': params, 'status': status,
+            'received_at': received_at, 'at': time.time(),
+        }
+        with self._lock:
+            self.calls.append(call)
+            if self._record:
+                self._record.write(json.dumps(call, ensure_ascii=False, default=str) + '\n')
+        if self.on_call:
+            self.on_call(call)
+        return status, body
+
+    def _sleep(self):
+        delay = self.latency_ms + (self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _inject(self, bot_id, method):
+        """Ошибка для метода отправки: лимит бота, случайный 429 или 502"""
+        if method not in SEND_METHODS:
+            return None
+
+        if self.bot_rate:
+            now = time.monotonic()
+            with self._lock:
+                recent = self._recent.setdefault(bot_id, deque())
+                while recent and now - recent[0] > 1:
+                    recent.popleft()
+                limited = len(recent) >= self.bot_rate
+                if not limited:
+                    recent.append(now)
+            if limited:
+                return self._flood()
+
+        roll = self._random.random()
+        if roll < self.flood_rate:
+            return self._flood()
+        if roll < self.flood_rate + self.error_rate:
+            return 502, {'ok': False, 'error_code': 502, 'description': 'Bad Gateway'}
+        return None
+
+    def _flood(self):
+        return 429, {
+            'ok': False, 'error_code': 429,
+            'description': f'Too Many Requests: retry after {self.retry_after}',
+            'parameters': {'retry_after': self.retry_after},
+        }
+
+    def _get_updates(self, bot_id, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = min(float(params.get('timeout') or 0), MAX_POLL_TIMEOUT)
+        deadline = time.monotonic() + timeout
+        with self._updates_changed:
+            queue = self._updates.setdefault(bot_id, deque())
+            # Обновления до offset подтверждены ботом
+            while queue and queue[0]['update_id'] < offset:
+                queue.popleft()
+            while not queue and time.monotonic() < deadline:
+                self._updates_changed.wait(deadline - time.monotonic())
+            return list(queue)[:limit]
+
+    def _message(self, params, **fields):
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+        chat_id = _as_int(params.get('chat_id'))
+        return {
+            'message_id': _as_int(params.get('message_id')) or message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if isinstance(chat_id, int) and chat_id > 0 else 'group'},
+            **fields,
+        }
+
+    def _respond(self, bot_id, method, params):
+        if method == 'getMe':
+            result = {
+                'id': _as_int(bot_id), 'is_bot': True, 'first_name': 'Fake bot', 'username': f'fake_{bot_id}_bot',
+                'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': True,
+            }
+        elif method in ('setWebhook', 'deleteWebhook', 'answerCallbackQuery', 'answerInlineQuery'):
+            result = True
+        elif method in ('sendMessage', 'editMessageText'):
+            result = self._message(params, text=params.get('text', ''))
+        elif method in ('sendPhoto', 'editMessageCaption'):
+            photo = [{'file_id': f"fake-{bot_id}-photo", 'file_unique_id': 'fake-photo', 'width': 800, 'height': 600}]
+            result = self._message(params, caption=params.get('caption', ''), photo=photo)
+        elif method == 'editMessageReplyMarkup':
+            result = self._message(params, text='')
+        else:
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+        return 200, {'ok': True, 'result': result}
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    """/bot<токен>/<метод> и служебные адреса /_updates, /_calls"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        api = self.server.api
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        params.update(self._read_body())
+
+        parts = url.path.strip('/').split('/')
+        if parts[0] == '_calls':
+            with api._lock:
+                self._reply(200, api.calls)
+            return
+        if parts[0] == '_updates' and len(parts) == 2:
+            api.enqueue_update(parts[1], params)
+            self._reply(200, {'ok': True})
+            return
+        if len(parts) != 2 or not parts[0].startswith('bot'):
+            self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+            return
+
+        self._reply(*api.handle(parts[0][3:], parts[1], params))
+
+    def _read_body(self):
+        """Параметры из тела: JSON, form-urlencoded или multipart (загрузка фото)"""
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        body = self.rfile.read(length)
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            return json.loads(body or b'{}')
+        if content_type.startswith('multipart/form-data'):
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + body
+            )
+            params = {}
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                if part.get_filename():
+                    params[name] = f"<file {part.get_filename()}>"
+                else:
+                    params[name] = part.get_content().strip()
+            return params
+        return dict(parse_qsl(body.decode('utf-8')))
+
+    def _reply(self, status, body):
+        data = json.dumps(body, ensure_ascii=False, default=str).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент закрыл соединение (например, прервал долгий getUpdates при остановке)
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0, help="Задержка ответа методов отправки")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="Разброс задержки (±)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов 502")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="retry_after в ответах 429 (секунды)")
+    parser.add_argument('--bot-rate', type=int, default=0, help="Лимит запросов бота в секунду (0 - без лимита)")
+    parser.add_argument('--record', help="Файл JSONL для записи всех вызовов")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    api = FakeTelegramAPI(
+        host=args.host, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, flood_rate=args.flood_rate, retry_after=args.retry_after,
+        bot_rate=args.bot_rate, record=args.record, seed=args.seed,
+    ).start()
+    print(f"Заглушка Bot API: {api.url} (TELEGRAM_API_BASE_URL={api.url}), Ctrl+C - остановить")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.stop()
+        for (method, status), count in sorted(api.summary().items()):
+            print(f"{method:<24}{status:>5}{count:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный прогон бота: синтетические /status и нажатия кнопок через заглушку Bot API
+
+Запуск: python benchmarks/replay_updates.py --telegram-id 123456789 [--updates 2000]
+            [--chats 50] [--callbacks 0.5] [--latency-ms 50] [--error-rate 0.01] [--flood-rate 0.01]
+
+Поднимает заглушку Bot API (fake_telegram_api.py) и запускает обработчики
+TelegramNotifier с опросом getUpdates, как run_bot.py, так что обновления и
+ответы проходят весь HTTP-стек python-telegram-bot. --chats виртуальных
+чатов работают по замкнутому циклу: чат отправляет следующее обновление
+(/status, листание /plants или детали растения), когда бот ответил на
+предыдущее. Задержка - от постановки обновления в очередь getUpdates до
+прихода в заглушку ответа бота (sendMessage или editMessageText).
+
+Обработчики читают данные из БД из .env, а автор обновлений - пользователь
+портала с --telegram-id. Связи синтетических чатов с ботом записываются в
+telegram_chat_bots, поэтому запускайте прогон на тестовой базе.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_telegram_api import FakeTelegramAPI  # noqa: E402
+
+# Токен бота в заглушке; настоящий Telegram этот прогон не видит
+FAKE_TOKEN = '100000001:FAKE-REPLAY-TOKEN'
+
+# Синтетические чаты: отрицательные ID, чтобы не совпасть с настоящими пользователями
+CHAT_ID_BASE = -1_000_000_000_000
+
+# Последний вызов Bot API, которым заканчивается обработка обновления
+FINAL_METHODS = {'sendMessage', 'editMessageText'}
+
+
+def percentile(values, pct):
+    """Перцентиль по методу ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Replay:
+    """Генератор обновлений и сопоставление ответов бота с ними"""
+
+    def __init__(self, api, telegram_id, plant_ids, callbacks, rng):
+        self.api = api
+        self.bot_id = FAKE_TOKEN.split(':', 1)[0]
+        self.telegram_id = telegram_id
+        self.plant_ids = plant_ids
+        self.callbacks = callbacks
+        self.rng = rng
+        self.update_id = 0
+        self.loop = None
+        self.pending = {}
+        self.latencies = {'status': [], 'callback': []}
+        self.errors = 0
+        self.timeouts = 0
+        api.on_call = self._on_call
+
+    def _user(self):
+        return {'id': self.telegram_id, 'is_bot': False, 'first_name': 'Replay'}
+
+    def _update(self, chat_id):
+        """Следующее синтетическое обновление: (вид, данные)"""
+        self.update_id += 1
+        chat = {'id': chat_id, 'type': 'group'}
+        now = int(time.time())
+        if self.rng.random() >= self.callbacks:
+            return 'status', {
+                'update_id': self.update_id,
+                'message': {
+                    'message_id': self.update_id, 'date': now, 'chat': chat, 'from': self._user(),
+                    'text': '/status', 'entities': [{'type': 'bot_command', 'offset': 0, 'length': 7}],
+                },
+            }
+
+        if self.plant_ids and self.rng.random() < 0.5:
+            data = f"detail_{self.rng.choice(self.plant_ids)}_0_"
+        else:
+            data = f"plist_{self.rng.randint(0, 3)}_"
+        return 'callback', {
+            'update_id': self.update_id,
+            'callback_query': {
+                'id': str(self.update_id), 'from': self._user(), 'chat_instance': 'replay', 'data': data,
+                'message': {
+                    'message_id': self.update_id, 'date': now, 'chat': chat,
+                    'from': {'id': int(self.bot_id), 'is_bot': True, 'first_name': 'Fake bot'},
+                    'text': '🌱 Растения',
+                },
+            },
+        }
+
+    def _on_call(self, call):
+        """Ответ бота дошёл до заглушки (поток HTTP-сервера)"""
+        if call['method'] in FINAL_METHODS and self.loop:
+            chat_id = call['params'].get('chat_id')
+            self.loop.call_soon_threadsafe(self._complete, str(chat_id), call)
+
+    def _complete(self, chat_id, call):
+        future = self.pending.pop(chat_id, None)
+        if future and not future.done():
+            future.set_result(call)
+
+    async def chat(self, index, budget, timeout):
+        """Виртуальный чат: следующее обновление - после ответа на предыдущее"""
+        chat_id = CHAT_ID_BASE - index
+        while budget[0] > 0:
+            budget[0] -= 1
+            kind, update = self._update(chat_id)
+            future = self.loop.create_future()
+            self.pending[str(chat_id)] = future
+            started = time.monotonic()
+            self.api.enqueue_update(self.bot_id, update)
+            try:
+                call = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                self.pending.pop(str(chat_id), None)
+                self.timeouts += 1
+                continue
+            if call['status'] != 200:
+                self.errors += 1
+            self.latencies[kind].append((call['received_at'] - started) * 1000)
+
+
+async def run(args, api):
+    from config import Config
+    from database import Plant
+    from telegram_bot import ALLOWED_UPDATES, TelegramNotifier, telegram_notifier
+
+    if not TelegramNotifier._find_user(args.telegram_id):
+        raise SystemExit(f"Пользователь с Telegram ID {args.telegram_id} не найден: /status ответит отказом")
+    plant_ids = [plant['id'] for plant in Plant.get_all() or []]
+
+    replay = Replay(api, args.telegram_id, plant_ids, args.callbacks, random.Random(args.seed))
+    replay.loop = asyncio.get_running_loop()
+
+    application = telegram_notifier.application
+    await application.initialize()
+    await application.start()
+    await application.updater.start_polling(allowed_updates=ALLOWED_UPDATES, poll_interval=0, timeout=5)
+    try:
+        budget = [args.updates]
+        started = time.monotonic()
+        await asyncio.gather(*(replay.chat(index, budget, args.timeout) for index in range(args.chats)))
+        elapsed = time.monotonic() - started
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        api.stop()
+
+    answered = sum(len(values) for values in replay.latencies.values())
+    print(f"\nОбновлений: {args.updates}, чатов: {args.chats}, "
+          f"TELEGRAM_CONCURRENT_UPDATES: {Config.TELEGRAM_CONCURRENT_UPDATES}")
+    print(f"Время: {elapsed:.1f} с, пропускная способность: {answered / elapsed:.0f} обновлений/с")
+    print(f"Ответов с ошибкой заглушки: {replay.errors}, без ответа за {args.timeout} с: {replay.timeouts}\n")
+    print(f"{'':<10}{'n':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  мс")
+    for kind, values in replay.latencies.items():
+        print(f"{kind:<10}{len(values):>8}{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}"
+              f"{percentile(values, 99):>10.1f}{max(values, default=0):>10.1f}")
+    print()
+    for (method, status), count in sorted(api.summary().items()):
+        print(f"{method:<24}{status:>5}{count:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--telegram-id', type=int, required=True, help="Telegram ID пользователя портала")
+    parser.add_argument('--updates', type=int, default=2000, help="Всего обновлений")
+    parser.add_argument('--chats', type=int, default=50, help="Одновременных виртуальных чатов")
+    parser.add_argument('--callbacks', type=float, default=0.5, help="Доля нажатий кнопок среди обновлений")
+    parser.add_argument('--timeout', type=float, default=10, help="Ожидание ответа на обновление (секунды)")
+    parser.add_argument('--latency-ms', type=float, default=0, help="Задержка ответов заглушки")
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов 502")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument('--bot-rate', type=int, default=0, help="Лимит запросов бота в секунду в заглушке")
+    parser.add_argument('--port', type=int, default=0, help="Порт заглушки (0 - свободный)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # Ошибки обработчиков от внедрённых сбоев учитываются в отчёте, а не в логе
+    logging.basicConfig(level=logging.CRITICAL)
+
+    # Заглушка поднимается до импорта config: бот читает TELEGRAM_API_BASE_URL из окружения
+    api = FakeTelegramAPI(
+        port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        flood_rate=args.flood_rate, bot_rate=args.bot_rate, seed=args.seed,
+    ).start()
+    os.environ.update({
+        'TELEGRAM_API_BASE_URL': api.url,
+        'TELEGRAM_BOT_TOKEN': FAKE_TOKEN,
+        'TELEGRAM_EXTRA_BOT_TOKENS': '',
+        'TELEGRAM_MODE': 'polling',
+        'SCHEDULER_AUTOSTART': 'false',
+    })
+    asyncio.run(run(args, api))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Симуляция NotificationScheduler на виртуальных часах
+
+Прогоняет дни cron-тиков планировщика за минуты реального времени: часы
+планировщика подменяются виртуальными, отправка идёт через пул outbox в
+записывающий поддельный Bot (без обращений к Telegram), а база заполняется
+детерминированными данными из --seed. В конце выводятся перцентили времени
+тиков, число SQL-запросов, число сообщений и пиковая память тика.
+
+Нужна отдельная база MySQL (по умолчанию plant_watering_sim) - она
+пересоздаётся при каждом запуске. Подключение берётся из .env.
+
+Запуск:
+    python benchmarks/simulate_scheduler.py --plants 10000 --users 200 --days 30
+"""
+import argparse
+import asyncio
+import heapq
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymysql  # noqa: E402
+from pymysql.cursors import Cursor  # noqa: E402
+from config import Config  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class VirtualClock:
+    """Виртуальные часы: планировщик получает время отсюда, а не из datetime.now"""
+
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+class FakeMessage:
+    """Минимальный ответ send_message"""
+
+    def __init__(self, message_id, chat_id):
+        self.message_id = message_id
+        self.chat_id = chat_id
+
+
+class RecordingBot:
+    """Поддельный Bot: считает сообщения и сообщает о них симуляции"""
+
+    def __init__(self, on_send=None):
+        self.on_send = on_send
+        self.sent_count = 0
+        self.edited_count = 0
+        self.sent_by_chat = {}
+
+    async def send_message(self, chat_id, text, reply_markup=None, parse_mode=None, **kwargs):
+        self.sent_count += 1
+        self.sent_by_chat[chat_id] = self.sent_by_chat.get(chat_id, 0) + 1
+        if self.on_send:
+            self.on_send(chat_id, text, reply_markup)
+        return FakeMessage(self.sent_count, chat_id)
+
+    async def edit_message_text(self, chat_id, message_id, text, reply_markup=None, parse_mode=None, **kwargs):
+        self.edited_count += 1
+        return FakeMessage(message_id, chat_id)
+
+
+class QueryCounter:
+    """
+    Счётчик SQL-запросов через все курсоры pymysql
+
+    executemany внутри вызывает execute (для INSERT - одним запросом на пачку),
+    поэтому считаются запросы, реально отправленные на сервер.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._execute = Cursor.execute
+
+    def install(self):
+        counter = self
+        original_execute = self._execute
+
+        def execute(cursor, query, args=None):
+            counter.count += 1
+            return original_execute(cursor, query, args)
+
+        Cursor.execute = execute
+
+    def uninstall(self):
+        Cursor.execute = self._execute
+
+
+def percentile(values, pct):
+    """Перцентиль по методу ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def create_schema(db_name):
+    """Пересоздать базу симуляции по database.sql"""
+    connection = pymysql.connect(
+        host=Config.DB_CONFIG['host'],
+        port=Config.DB_CONFIG['port'],
+        user=Config.DB_CONFIG['user'],
+        password=Config.DB_CONFIG['password'],
+        charset=Config.DB_CONFIG['charset'],
+        autocommit=True
+    )
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{db_name}`")
+            cursor.execute(
+                f"CREATE DATABASE `{db_name}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+            )
+            connection.select_db(db_name)
+
+            with open(os.path.join(ROOT, 'database.sql'), encoding='utf-8') as f:
+                sql = '\n'.join(line for line in f if not line.lstrip().startswith('--'))
+
+            for statement in sql.split(';'):
+                statement = statement.strip()
+                if not statement or re.match(r'^(CREATE DATABASE|USE)\b', statement, re.I):
+                    continue
+                cursor.execute(statement)
+    finally:
+        connection.close()
+
+
+def seed(rng, args, start):
+    """Заполнить базу пользователями и растениями"""
+    from database import CareTask, Database, SystemSettings
+
+    users = [
+        (f"Пользователь {i}", f"sim_user_{i}", 'x', str(100000 + i), True)
+        for i in range(1, args.users + 1)
+    ]
+    Database.execute_many(
+        """
+        INSERT INTO users (name, username, password_hash, telegram_id, receive_notifications)
+        VALUES (%s, %s, %s, %s, %s)
+        """,
+        users
+    )
+
+    plants = []
+    today = start.date()
+    for i in range(1, args.plants + 1):
+        watering_interval = rng.randint(2, 14)
+        fertilizer_interval = rng.choice([None, None, rng.randint(14, 60)])
+        next_watering = today + timedelta(days=rng.randint(-2, watering_interval))
+        next_fertilizer = (
+            today + timedelta(days=rng.randint(-2, fertilizer_interval))
+            if fertilizer_interval else None
+        )
+        plants.append((
+            f"Растение {i}", watering_interval, fertilizer_interval,
+            rng.choice([None, 'Гостиная', 'Кухня', 'Балкон', 'Офис']),
+            next_watering, next_fertilizer
+        ))
+    Database.execute_many(
+        """
+        INSERT INTO plants
+        (name, watering_interval_days, fertilizer_interval_days, location,
+         next_watering_date, next_fertilizer_date)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """,
+        plants
+    )
+    # Задачи ухода создаются по колонкам plants, как в миграции 005
+    CareTask.sync_from_plants()
+
+    # Ответственные: у доли растений один случайный пользователь (id растений в новой базе - 1..N)
+    assignees = [
+        (plant_id, rng.randint(1, args.users), 0)
+        for plant_id in range(1, args.plants + 1)
+        if rng.random() < args.assigned_share
+    ]
+    if assignees:
+        Database.execute_many(
+            "INSERT INTO plant_assignees (plant_id, user_id, position) VALUES (%s, %s, %s)",
+            assignees
+        )
+
+    SystemSettings.set('notification_retry_interval_minutes', str(args.retry_interval))
+    SystemSettings.set('notification_max_retries', str(args.max_retries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симуляция планировщика уведомлений на виртуальных часах")
+    parser.add_argument('--plants', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--retry-interval', type=int, default=120, help="интервал повторов, мин")
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--assigned-share', type=float, default=0.0,
+                        help="доля растений с ответственным (остальные оповещают всех)")
+    parser.add_argument('--response-rate', type=float, default=0.7,
+                        help="доля уведомлений, на которые кто-то реагирует")
+    parser.add_argument('--response-delay-max', type=int, default=240,
+                        help="максимальная задержка реакции, мин")
+    parser.add_argument('--db-name', default=os.getenv('SIM_DB_NAME', 'plant_watering_sim'))
+    args = parser.parse_args()
+
+    if args.db_name == Config.DB_CONFIG['database']:
+        parser.error("База симуляции пересоздаётся: укажите --db-name, отличный от рабочей базы")
+
+    Config.DB_CONFIG['database'] = args.db_name
+    create_schema(args.db_name)
+
+    from care_tasks import TASK_TYPES_BY_PREFIX
+    from database import CareTask, NotificationLog
+    from notification_templates import MOSCOW_TZ
+    from outbox import OutboxSender
+    from scheduler import NotificationScheduler
+
+    rng = random.Random(args.seed)
+    start = MOSCOW_TZ.localize(datetime(2026, 1, 5, 0, 0))
+    end = start + timedelta(days=args.days)
+    seed(rng, args, start)
+
+    clock = VirtualClock(start)
+    sender = OutboxSender(batch_size=500)
+    scheduler = NotificationScheduler(clock=clock, sender=sender)
+
+    events = []
+    sequence = 0
+
+    def push(at, kind, payload):
+        nonlocal sequence
+        sequence += 1
+        heapq.heappush(events, (at, sequence, kind, payload))
+
+    # Реакции пользователей: на уведомление отвечает не больше одного человека
+    decided_logs = set()
+
+    def on_send(chat_id, text, reply_markup):
+        if not reply_markup:
+            return
+        callback_data = reply_markup.inline_keyboard[0][0].callback_data
+        prefix, plant_id, log_id = callback_data.split('_')
+        if log_id in decided_logs:
+            return
+        decided_logs.add(log_id)
+        if rng.random() < args.response_rate:
+            delay = timedelta(minutes=rng.randint(1, args.response_delay_max))
+            user_id = int(chat_id) - 100000
+            push(clock.now + delay, 'complete', (prefix, int(plant_id), user_id))
+
+    bot = RecordingBot(on_send=on_send)
+
+    for job, trigger, job_id, name in scheduler.job_definitions():
+        push(trigger.get_next_fire_time(None, start), 'tick', (job_id, job, trigger))
+
+    counter = QueryCounter()
+    counter.install()
+    tracemalloc.start()
+
+    tick_latencies = {}
+    tick_queries = {}
+    delivery_seconds = 0.0
+    delivery_queries = 0
+    completions = 0
+    peak_memory = 0
+    loop = asyncio.new_event_loop()
+    wall_start = time.perf_counter()
+
+    try:
+        while events and events[0][0] < end:
+            at, _, kind, payload = heapq.heappop(events)
+            clock.now = at
+
+            if kind == 'complete':
+                prefix, plant_id, user_id = payload
+                notif_type = TASK_TYPES_BY_PREFIX[prefix].key
+                if NotificationLog.get_pending_for_plant(plant_id, notif_type):
+                    CareTask.complete(plant_id, notif_type, user_id, now=at.replace(tzinfo=None))
+                    completions += 1
+                continue
+
+            job_id, job, trigger = payload
+            queries_before = counter.count
+            tracemalloc.reset_peak()
+            tick_start = time.perf_counter()
+            job()
+            tick_latencies.setdefault(job_id, []).append(time.perf_counter() - tick_start)
+            tick_queries.setdefault(job_id, []).append(counter.count - queries_before)
+            peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+
+            # Доставка накопленного outbox (время доставки не входит во время тика)
+            queries_before = counter.count
+            delivery_start = time.perf_counter()
+            while loop.run_until_complete(sender.deliver_batch(bot, pause=0)):
+                pass
+            delivery_seconds += time.perf_counter() - delivery_start
+            delivery_queries += counter.count - queries_before
+
+            push(trigger.get_next_fire_time(at, at + timedelta(seconds=1)), 'tick', payload)
+    finally:
+        loop.close()
+        tracemalloc.stop()
+        counter.uninstall()
+
+    wall_seconds = time.perf_counter() - wall_start
+
+    print(f"Симуляция: {args.days} дн., {args.plants} растений, {args.users} пользователей, seed={args.seed}")
+    print(f"Реальное время прогона: {wall_seconds:.1f} с\n")
+    for job_id, latencies in tick_latencies.items():
+        ms = [value * 1000 for value in latencies]
+        queries = tick_queries[job_id]
+        print(f"{job_id}: {len(ms)} тиков")
+        print(f"  время тика, мс: p50={percentile(ms, 50):.1f} p95={percentile(ms, 95):.1f} "
+              f"p99={percentile(ms, 99):.1f} max={max(ms):.1f}")
+        print(f"  SQL-запросов за тик: среднее={sum(queries) / len(queries):.1f} max={max(queries)}")
+    print(f"\nОтправлено сообщений: {bot.sent_count} (получателей: {len(bot.sent_by_chat)}), "
+          f"изменено: {bot.edited_count}")
+    print(f"Доставка: {delivery_seconds:.1f} с, {delivery_queries} SQL-запросов")
+    print(f"Отмечено выполнений ухода: {completions}")
+    print(f"Пиковая память за тик: {peak_memory / 1024 / 1024:.1f} МБ")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Пул Telegram-ботов: закрепление чатов за ботами и лимиты отправки по токенам
+"""
+import logging
+import threading
+import time
+from config import Config
+from database import TelegramChatBot
+
+logger = logging.getLogger(__name__)
+
+# Как часто перечитывать закрепления чатов из БД (секунды)
+ASSIGNMENTS_TTL = 60
+
+# Задержка закреплённого бота, после которой сообщение уходит через другого
+# бота этого чата (секунды)
+OVERFLOW_DELAY = 1.0
+
+
+class TokenBucket:
+    """
+    Лимит частоты отправки одного бота (общий для всех потоков процесса)
+
+    Каждая отправка резервирует следующий свободный слот; reserve возвращает,
+    сколько нужно подождать до него. Допускается всплеск до burst сообщений.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.burst = burst or max(1, int(rate))
+        self._next_free = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """Через сколько секунд освободится слот (без резервирования)"""
+        with self._lock:
+            return max(0.0, self._next_free - time.monotonic())
+
+    def reserve(self):
+        """Занять слот и вернуть задержку до него"""
+        with self._lock:
+            now = time.monotonic()
+            # Неиспользованный запас не копится дольше, чем на burst сообщений
+            start = max(self._next_free, now - self.interval * (self.burst - 1))
+            self._next_free = start + self.interval
+            return max(0.0, start - now)
+
+    def penalize(self, seconds):
+        """Не отправлять раньше чем через seconds (ответ Telegram RetryAfter)"""
+        with self._lock:
+            self._next_free = max(self._next_free, time.monotonic() + seconds)
+
+
+class BotPool:
+    """
+    Токены ботов и выбор бота для чата
+
+    Первый токен (TELEGRAM_BOT_TOKEN) - основной, остальные -
+    TELEGRAM_EXTRA_BOT_TOKENS. Бот может писать только в чаты, которые с ним
+    общались, поэтому чат закрепляется за ботом, которому написал первым
+    (таблица telegram_chat_bots); чаты без записи обслуживает основной бот.
+    Если закреплённый бот упёрся в лимит, а чат общался и с другими ботами,
+    сообщение уходит через наименее загруженного из них. Правки сообщений
+    всегда идут через бота, отправившего сообщение. Нажатия кнопок любого
+    бота обрабатывает run_bot.py, поэтому ответ не зависит от бота.
+    """
+
+    def __init__(self, tokens=None, rate=None):
+        if tokens is None:
+            tokens = [Config.TELEGRAM_BOT_TOKEN] if Config.TELEGRAM_BOT_TOKEN else []
+            tokens += [token for token in Config.TELEGRAM_EXTRA_BOT_TOKENS if token not in tokens]
+        self.tokens = tokens
+        self.bot_ids = [self.bot_id_of(token) for token in tokens]
+        rate = rate or Config.TELEGRAM_BOT_RATE
+        self._buckets = {bot_id: TokenBucket(rate) for bot_id in self.bot_ids}
+        self._chat_bots = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def bot_id_of(token):
+        """ID бота - числовая часть токена до двоеточия (не секрет)"""
+        return token.split(':', 1)[0]
+
+    @staticmethod
+    def api_urls():
+        """Аргументы base_url/base_file_url для Bot при заданном TELEGRAM_API_BASE_URL"""
+        if not Config.TELEGRAM_API_BASE_URL:
+            return {}
+        return {
+            'base_url': f"{Config.TELEGRAM_API_BASE_URL}/bot",
+            'base_file_url': f"{Config.TELEGRAM_API_BASE_URL}/file/bot",
+        }
+
+    @property
+    def primary_id(self):
+        return self.bot_ids[0] if self.bot_ids else None
+
+    def _bots_for_chat(self, chat_id):
+        """Боты пула, с которыми общался чат, в порядке закрепления"""
+        with self._lock:
+            expired = self._loaded_at is None or time.monotonic() - self._loaded_at > ASSIGNMENTS_TTL
+            if expired and len(self.bot_ids) > 1:
+                try:
+                    chat_bots = {}
+                    for row in TelegramChatBot.get_all() or []:
+                        if row['bot_id'] in self._buckets:
+                            chat_bots.setdefault(row['chat_id'], []).append(row['bot_id'])
+                    self._chat_bots = chat_bots
+                except Exception as e:
+                    logger.error(f"Ошибка загрузки закреплений чатов за ботами: {e}")
+                self._loaded_at = time.monotonic()
+            return self._chat_bots.get(str(chat_id), [])
+
+    def choose(self, chat_id, bot_id=None):
+        """
+        Выбрать бота для сообщения в чат
+
+        Args:
+            bot_id: Обязательный бот (правка ранее отправленного сообщения)
+        """
+        if bot_id:
+            return bot_id
+        if len(self.bot_ids) < 2:
+            return self.primary_id
+
+        candidates = self._bots_for_chat(chat_id) or [self.primary_id]
+        assigned = candidates[0]
+        if len(candidates) > 1 and self._buckets[assigned].delay() > OVERFLOW_DELAY:
+            return min(candidates, key=lambda candidate: self._buckets[candidate].delay())
+        return assigned
+
+    def reserve(self, bot_id):
+        """Занять слот отправки бота и вернуть задержку до него (секунды)"""
+        bucket = self._buckets.get(bot_id)
+        return bucket.reserve() if bucket else 0.0
+
+    def penalize(self, bot_id, seconds):
+        """Притормозить бота после RetryAfter: остальные боты продолжают отправку"""
+        bucket = self._buckets.get(bot_id)
+        if bucket:
+            bucket.penalize(seconds)
+
+    def remember_chat(self, chat_id, bot_id):
+        """Записать, что чат общался с ботом (вызывается ботом на каждое обновление)"""
+        with self._lock:
+            known = self._chat_bots.setdefault(str(chat_id), [])
+            if bot_id in known:
+                return
+            known.append(bot_id)
+        try:
+            TelegramChatBot.touch(chat_id, bot_id)
+        except Exception as e:
+            logger.error(f"Ошибка записи связи чата {chat_id} с ботом {bot_id}: {e}")
+
+    def forget_chat(self, chat_id, bot_id):
+        """
+        Забыть связь чата с ботом, который чат заблокировал
+
+        Returns:
+            Другие боты пула, через которых чат ещё доступен
+        """
+        if len(self.bot_ids) < 2:
+            return []
+        remaining = [other for other in self._bots_for_chat(chat_id) if other != bot_id]
+        with self._lock:
+            self._chat_bots[str(chat_id)] = remaining
+        try:
+            TelegramChatBot.delete(chat_id, bot_id)
+        except Exception as e:
+            logger.error(f"Ошибка удаления связи чата {chat_id} с ботом {bot_id}: {e}")
+        return remaining
+
+
+# Глобальный пул ботов
+bot_pool = BotPool()
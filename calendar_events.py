@@ -0,0 +1,134 @@
+"""
+События календаря ухода: история месяца одним запросом и кеш прошедших месяцев
+"""
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+import events
+from database import WateringHistory
+
+logger = logging.getLogger(__name__)
+
+# Сколько прошедших месяцев держать в памяти
+MONTH_CACHE_SIZE = 36
+
+# Запланированный уход: (тип события, колонка следующей даты в plants)
+PLANNED_EVENTS = (
+    ('planned_watering', 'next_watering_date'),
+    ('planned_fertilizer', 'next_fertilizer_date'),
+)
+
+
+def month_bounds(year, month):
+    """Первый день месяца и первый день следующего: период [start, end)"""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+class MonthHistoryCache:
+    """
+    История ухода по дням месяца
+
+    Месяц читается одним запросом по диапазону watered_at (WateringHistory.get_range).
+    Месяцы, закончившиеся больше суток назад, больше не меняются и хранятся в
+    памяти: запись истории в такой месяц (событие CARE_DONE с прошлой датой)
+    сбрасывает только его. Имена растений и пользователей хранятся в событиях,
+    поэтому перед выдачей прошлого месяца из кеша сверяется их версия
+    (WateringHistory.get_names_version): переименование, отключение или удаление в
+    любом процессе сбрасывает весь кеш. В этом процессе то же делают события
+    PLANT_CHANGED и USER_CHANGED. Текущий месяц читается каждый раз.
+    """
+
+    def __init__(self, max_months=MONTH_CACHE_SIZE):
+        self.max_months = max_months
+        self._months = OrderedDict()
+        self._names_version = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _is_closed(end, today):
+        # Сутки запаса: отметка, начатая в последний день месяца, успеет зафиксироваться
+        return end + timedelta(days=1) <= today
+
+    def get(self, year, month, today=None):
+        """История месяца: {дата: [события]} (результат не изменять)"""
+        today = today or datetime.now().date()
+        start, end = month_bounds(year, month)
+        closed = self._is_closed(end, today)
+        key = (year, month)
+
+        if closed:
+            names_version = WateringHistory.get_names_version()
+            with self._lock:
+                if names_version != self._names_version:
+                    self._months.clear()
+                    self._names_version = names_version
+                cached = self._months.get(key)
+                if cached is not None:
+                    self._months.move_to_end(key)
+                    return cached
+
+        history = {}
+        for entry in WateringHistory.get_range(start, end):
+            history.setdefault(entry['watered_at'].date(), []).append({
+                'type': entry['action_type'],
+                'plant_name': entry['plant_name'],
+                'plant_id': entry['plant_id'],
+                'user_name': entry['user_name'],
+                'time': entry['watered_at'].strftime('%H:%M'),
+            })
+
+        if closed:
+            with self._lock:
+                self._months[key] = history
+                while len(self._months) > self.max_months:
+                    self._months.popitem(last=False)
+        return history
+
+    def invalidate_day(self, day):
+        """Сбросить месяц, в который записана история"""
+        with self._lock:
+            self._months.pop((day.year, day.month), None)
+
+    def clear(self):
+        with self._lock:
+            self._months.clear()
+
+
+def month_events(year, month, plants, today=None):
+    """
+    События календаря за месяц: история и запланированный уход
+
+    Args:
+        plants: Активные растения (строки plants) для запланированных дат
+
+    Returns:
+        {дата: [события]} - новый словарь, который можно изменять
+    """
+    start, end = month_bounds(year, month)
+    events_by_day = {day: list(items) for day, items in month_history_cache.get(year, month, today).items()}
+
+    for plant in plants:
+        for event_type, column in PLANNED_EVENTS:
+            planned = plant.get(column)
+            if planned and start <= planned < end:
+                events_by_day.setdefault(planned, []).append({
+                    'type': event_type,
+                    'plant_name': plant['name'],
+                    'plant_id': plant['id'],
+                    'user_name': None,
+                    'time': None,
+                })
+    return events_by_day
+
+
+# Глобальный кеш истории по месяцам
+month_history_cache = MonthHistoryCache()
+events.subscribe(
+    events.CARE_DONE,
+    lambda plant_id, task_type, next_due, done_at: month_history_cache.invalidate_day(done_at.date())
+)
+events.subscribe(events.PLANT_CHANGED, lambda plant_id: month_history_cache.clear())
+events.subscribe(events.USER_CHANGED, lambda user_id: month_history_cache.clear())
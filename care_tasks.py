@@ -0,0 +1,84 @@
+"""
+Реестр типов ухода за растениями (полив, прикормка, ...)
+
+Все типы хранятся в одной таблице care_tasks, поэтому планировщик, дашборд
+и бот находят просроченный уход одним запросом по индексу (next_due, is_active).
+Чтобы добавить новый тип (например, опрыскивание), достаточно описать его
+здесь и создать строки care_tasks для нужных растений: новых колонок в plants
+и отдельных проходов по таблице не требуется.
+"""
+
+
+class CareTaskType:
+    """Описание типа ухода: тексты уведомлений, кнопки и колонки-зеркала в plants"""
+
+    def __init__(self, key, icon, title, action_genitive, action_past, first_header,
+                 button_text, callback_prefix, quick_button_text, quick_prefix,
+                 info_title, retry_replacements=(), plant_columns=None):
+        self.key = key
+        self.icon = icon
+        # «Полив» - в заголовках и списках
+        self.title = title
+        # «полива» - «растение ждёт полива»
+        self.action_genitive = action_genitive
+        # «полил(а)» - «Анна полил(а) растение»
+        self.action_past = action_past
+        self.first_header = first_header
+        # Кнопка уведомления и префикс её callback_data
+        self.button_text = button_text
+        self.callback_prefix = callback_prefix
+        # Кнопка быстрого действия в карточке растения в боте
+        self.quick_button_text = quick_button_text
+        self.quick_prefix = quick_prefix
+        self.info_title = info_title
+        # Замены, превращающие настраиваемый шаблон повтора про полив в шаблон этого типа
+        self.retry_replacements = retry_replacements
+        # (интервал, следующая дата, последнее выполнение) - колонки plants, которые
+        # дублируют care_tasks для страниц портала; None для типов без зеркала
+        self.plant_columns = plant_columns
+
+
+CARE_TASK_TYPES = {
+    'watering': CareTaskType(
+        key='watering',
+        icon="💧",
+        title="Полив",
+        action_genitive="полива",
+        action_past="полил(а)",
+        first_header="💧 **Время полить растение!**\n\n",
+        button_text="✅ Я полью",
+        callback_prefix='water',
+        quick_button_text="💧 Полить",
+        quick_prefix='qwater',
+        info_title="ℹ️ **Информация о поливе**",
+        plant_columns=('watering_interval_days', 'next_watering_date', 'last_watered_at'),
+    ),
+    'fertilizer': CareTaskType(
+        key='fertilizer',
+        icon="🌱",
+        title="Прикормка",
+        action_genitive="прикормки",
+        action_past="прикормил(а)",
+        first_header="🌱 **Время прикормить растение!**\n\n",
+        button_text="✅ Я прикормлю",
+        callback_prefix='fert',
+        quick_button_text="🌱 Прикормить",
+        quick_prefix='qfert',
+        info_title="ℹ️ **Информация о прикормке**",
+        retry_replacements=(
+            ('полив', 'прикормк'),
+            ('Полейте', 'Прикормите'),
+            ('вод', 'удобрен'),
+        ),
+        plant_columns=('fertilizer_interval_days', 'next_fertilizer_date', 'last_fertilized_at'),
+    ),
+}
+
+# Тип ухода по префиксу callback_data кнопки уведомления / быстрой кнопки
+TASK_TYPES_BY_PREFIX = {task.callback_prefix: task for task in CARE_TASK_TYPES.values()}
+TASK_TYPES_BY_QUICK_PREFIX = {task.quick_prefix: task for task in CARE_TASK_TYPES.values()}
+
+
+def get_task_type(key):
+    """Тип ухода по ключу (KeyError для неизвестного типа)"""
+    return CARE_TASK_TYPES[key]
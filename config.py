@@ -26,6 +26,60 @@ class Config:
     
     # Telegram бот
     TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
+    # Дополнительные токены ботов через запятую: пул для отправки сверх лимита одного бота
+    TELEGRAM_EXTRA_BOT_TOKENS = [
+        token.strip() for token in os.getenv('TELEGRAM_EXTRA_BOT_TOKENS', '').split(',') if token.strip()
+    ]
+    # Лимит отправки одного бота в этом процессе (сообщений в секунду)
+    TELEGRAM_BOT_RATE = float(os.getenv('TELEGRAM_BOT_RATE', 25))
+    # Сколько обновлений бот обрабатывает одновременно
+    TELEGRAM_CONCURRENT_UPDATES = int(os.getenv('TELEGRAM_CONCURRENT_UPDATES', 16))
+    # Получение обновлений: polling - опрос getUpdates, webhook - встроенный HTTP-сервер
+    TELEGRAM_MODE = os.getenv('TELEGRAM_MODE', 'polling').lower()
+    # Публичный HTTPS-адрес, на который Telegram шлёт обновления (пусто - вебхук не регистрируется,
+    # например для локальной проверки POST-запросами)
+    TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '').rstrip('/')
+    # Секрет из заголовка X-Telegram-Bot-Api-Secret-Token (A-Z, a-z, 0-9, _ и -)
+    TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+    TELEGRAM_WEBHOOK_HOST = os.getenv('TELEGRAM_WEBHOOK_HOST', '0.0.0.0')
+    TELEGRAM_WEBHOOK_PORT = int(os.getenv('TELEGRAM_WEBHOOK_PORT', 8443))
+    # Сколько обновлений обрабатывается одновременно и сколько ждут в очереди (при
+    # переполнении Telegram получает 503 и повторит доставку позже)
+    TELEGRAM_WEBHOOK_WORKERS = int(os.getenv('TELEGRAM_WEBHOOK_WORKERS', 8))
+    TELEGRAM_WEBHOOK_QUEUE_SIZE = int(os.getenv('TELEGRAM_WEBHOOK_QUEUE_SIZE', 100))
+    # Адрес Bot API (пусто - api.telegram.org); для нагрузочных тестов - локальная
+    # заглушка benchmarks/fake_telegram_api.py, например http://127.0.0.1:8081
+    TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL', '').rstrip('/')
+    
+    # Планировщик уведомлений
+    # Запускать планировщик при импорте app.py (нужно под gunicorn, где блок __main__ не выполняется)
+    SCHEDULER_AUTOSTART = os.getenv('SCHEDULER_AUTOSTART', 'False').lower() == 'true'
+    # Имя блокировки MySQL, которой держится лидерство планировщика между процессами
+    SCHEDULER_LEADER_LOCK = os.getenv('SCHEDULER_LEADER_LOCK', 'plant_watering_scheduler')
+    # Как часто процесс проверяет/захватывает лидерство (секунды)
+    SCHEDULER_LEADER_HEARTBEAT_SECONDS = int(os.getenv('SCHEDULER_LEADER_HEARTBEAT_SECONDS', 5))
+    # Режим работы нескольких процессов: leader - всё выполняет один лидер,
+    # sharded - каждый узел обрабатывает свою долю растений (id % число узлов)
+    SCHEDULER_MODE = os.getenv('SCHEDULER_MODE', 'leader').lower()
+    # Через сколько секунд без heartbeat узел считается вышедшим из кластера
+    SCHEDULER_NODE_TIMEOUT_SECONDS = int(os.getenv('SCHEDULER_NODE_TIMEOUT_SECONDS', 30))
+    # История тиков: сколько последних тиков держать в памяти и сколько дней хранить в scheduler_runs
+    SCHEDULER_RUNS_BUFFER = int(os.getenv('SCHEDULER_RUNS_BUFFER', 200))
+    SCHEDULER_RUNS_RETENTION_DAYS = int(os.getenv('SCHEDULER_RUNS_RETENTION_DAYS', 30))
+    # Тик дольше этого порога (секунды) пишется в лог предупреждением
+    SCHEDULER_SLOW_TICK_SECONDS = float(os.getenv('SCHEDULER_SLOW_TICK_SECONDS', 60))
+    # Сколько дней хранить завершённые сообщения outbox, строки доставки и сообщения уведомлений
+    OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', 30))
+    
+    # Очередь исходящих сообщений (outbox) и пул отправителей
+    OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', 2))
+    OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 20))
+    # Сколько сообщений каждый поток-отправитель отправляет одновременно
+    OUTBOX_CONCURRENCY = int(os.getenv('OUTBOX_CONCURRENCY', 2))
+    OUTBOX_POLL_SECONDS = float(os.getenv('OUTBOX_POLL_SECONDS', 1))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+    # Через сколько секунд сообщение в статусе 'sending' считается брошенным упавшим воркером
+    OUTBOX_STALE_SECONDS = int(os.getenv('OUTBOX_STALE_SECONDS', 300))
     
     # Часовой пояс
     TIMEZONE = os.getenv('TIMEZONE', 'Europe/Moscow')
@@ -45,6 +99,15 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB максимальный размер файла
     UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+    # Кеш байт-кода шаблонов Jinja, общий для воркеров (пусто - не использовать)
+    JINJA_CACHE_DIR = os.getenv('JINJA_CACHE_DIR', os.path.join(os.path.dirname(__file__), '.jinja_cache'))
+
+    # Живые обновления дашборда (Server-Sent Events): как часто процесс сверяет версию
+    # данных в БД, чтобы заметить отметки ухода из бота и других процессов (секунды)
+    LIVE_UPDATES_POLL_SECONDS = float(os.getenv('LIVE_UPDATES_POLL_SECONDS', 3))
+    # Пинг открытых соединений (секунды): держит их через прокси и выявляет закрытые вкладки
+    LIVE_UPDATES_HEARTBEAT_SECONDS = float(os.getenv('LIVE_UPDATES_HEARTBEAT_SECONDS', 15))
     
     @staticmethod
     def init_app(app):
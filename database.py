@@ -5,29 +5,49 @@ import pymysql
 from pymysql.cursors import DictCursor
 from contextlib import contextmanager
 from config import Config
+import events
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Приоритет правок уведомлений после выполнения в outbox: они обгоняют
+# утренний пакет (его приоритет - дни просрочки), иначе кнопка «Я полью»
+# ещё долго висит у остальных получателей
+EDIT_PRIORITY = 1000
+
+
+class CareAlreadyDone(Exception):
+    """Уход за этот срок уже отметил другой пользователь (CareTask.complete)"""
+
+    def __init__(self, user_name, done_at):
+        super().__init__(f"уже выполнено: {user_name or 'неизвестно'}")
+        self.user_name = user_name
+        self.done_at = done_at
+
 
 class Database:
     """Класс для работы с базой данных MySQL"""
     
+    @staticmethod
+    def connect():
+        """Открыть новое соединение с БД (закрывать должен вызывающий)"""
+        return pymysql.connect(
+            host=Config.DB_CONFIG['host'],
+            port=Config.DB_CONFIG['port'],
+            user=Config.DB_CONFIG['user'],
+            password=Config.DB_CONFIG['password'],
+            database=Config.DB_CONFIG['database'],
+            charset=Config.DB_CONFIG['charset'],
+            cursorclass=DictCursor
+        )
+
     @staticmethod
     @contextmanager
     def get_connection():
         """Контекстный менеджер для получения соединения с БД"""
         connection = None
         try:
-            connection = pymysql.connect(
-                host=Config.DB_CONFIG['host'],
-                port=Config.DB_CONFIG['port'],
-                user=Config.DB_CONFIG['user'],
-                password=Config.DB_CONFIG['password'],
-                database=Config.DB_CONFIG['database'],
-                charset=Config.DB_CONFIG['charset'],
-                cursorclass=DictCursor
-            )
+            connection = Database.connect()
             yield connection
         except pymysql.Error as e:
             logger.error(f"Ошибка подключения к базе данных: {e}")
@@ -54,7 +74,8 @@ class Database:
                 cursor.close()
     
     @staticmethod
-    def execute_query(query, params=None, commit=False, fetch_one=False, fetch_all=False):
+    def execute_query(query, params=None, commit=False, fetch_one=False, fetch_all=False,
+                      cursor=None):
         """
         Выполнить SQL запрос
         
@@ -64,20 +85,85 @@ class Database:
             commit: Выполнить коммит после запроса
             fetch_one: Получить одну запись
             fetch_all: Получить все записи
+            cursor: Курсор уже открытой транзакции (коммит выполняет её владелец)
             
         Returns:
             Результат запроса или None
         """
+        if cursor is not None:
+            return Database._execute(cursor, query, params, commit, fetch_one, fetch_all)
+
         with Database.get_cursor(commit=commit) as cursor:
-            cursor.execute(query, params or ())
+            return Database._execute(cursor, query, params, commit, fetch_one, fetch_all)
+    
+    @staticmethod
+    def _execute(cursor, query, params, commit, fetch_one, fetch_all):
+        """Выполнить запрос на переданном курсоре"""
+        cursor.execute(query, params or ())
+        
+        if fetch_one:
+            return cursor.fetchone()
+        elif fetch_all:
+            return cursor.fetchall()
+        elif commit:
+            return cursor.lastrowid
+        return None
+    
+    @staticmethod
+    def iter_batches(query, params=(), batch_size=500, key='id'):
+        """
+        Выполнить SELECT пачками по возрастанию ключа (keyset-пагинация)
+        
+        Запрос должен заканчиваться условием вида "AND id > %s ORDER BY id LIMIT %s":
+        последние два параметра (последний ключ и размер пачки) подставляются здесь.
+        В памяти одновременно находится не больше batch_size строк.
+        """
+        last_key = 0
+        while True:
+            rows = Database.execute_query(query, (*params, last_key, batch_size), fetch_all=True)
+            if not rows:
+                return
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last_key = rows[-1][key]
+
+    @staticmethod
+    def delete_in_batches(query, params=(), batch_size=1000):
+        """
+        Выполнить DELETE пачками, каждую в своей транзакции
+
+        Запрос должен заканчиваться "LIMIT %s": размер пачки подставляется здесь.
+        Короткие транзакции не держат блокировки на всю очистку.
+
+        Returns:
+            Количество удалённых строк
+        """
+        deleted = 0
+        while True:
+            with Database.get_cursor(commit=True) as cursor:
+                cursor.execute(query, (*params, batch_size))
+                count = cursor.rowcount
+            deleted += count
+            if count < batch_size:
+                return deleted
+
+    @staticmethod
+    def partition_filter(column, partition):
+        """
+        Условие доли узла шардированного планировщика
+        
+        Args:
+            column: Колонка с id растения
+            partition: (index, count) или None (все растения)
             
-            if fetch_one:
-                return cursor.fetchone()
-            elif fetch_all:
-                return cursor.fetchall()
-            elif commit:
-                return cursor.lastrowid
-            return None
+        Returns:
+            (фрагмент SQL, параметры)
+        """
+        if not partition:
+            return '', ()
+        index, count = partition
+        return f"AND MOD({column}, %s) = %s", (count, index)
     
     @staticmethod
     def execute_many(query, params_list):
@@ -120,31 +206,40 @@ class User:
         return Database.execute_query(query, fetch_all=True)
     
     @staticmethod
-    def create(name, username, password_hash, telegram_id=None, receive_notifications=True):
+    def create(name, username, password_hash, telegram_id=None, receive_notifications=True,
+               dm_notifications=False):
         """Создать нового пользователя"""
         query = """
-            INSERT INTO users (name, username, password_hash, telegram_id, receive_notifications)
-            VALUES (%s, %s, %s, %s, %s)
+            INSERT INTO users (name, username, password_hash, telegram_id, receive_notifications,
+                               dm_notifications)
+            VALUES (%s, %s, %s, %s, %s, %s)
         """
         return Database.execute_query(
             query, 
-            (name, username, password_hash, telegram_id, receive_notifications),
+            (name, username, password_hash, telegram_id, receive_notifications, dm_notifications),
             commit=True
         )
     
     @staticmethod
-    def update(user_id, name, username, telegram_id=None, receive_notifications=True):
-        """Обновить данные пользователя"""
+    def update(user_id, name, username, telegram_id=None, receive_notifications=True,
+               dm_notifications=False):
+        """Обновить данные пользователя (смена Telegram ID снимает блокировку доставки)"""
+        # Условие по старому telegram_id должно стоять до его присваивания
         query = """
             UPDATE users 
-            SET name = %s, username = %s, telegram_id = %s, receive_notifications = %s
+            SET telegram_suppressed_at = IF(telegram_id <=> %s, telegram_suppressed_at, NULL),
+                telegram_suppressed_reason = IF(telegram_id <=> %s, telegram_suppressed_reason, NULL),
+                name = %s, username = %s, telegram_id = %s, receive_notifications = %s,
+                dm_notifications = %s
             WHERE id = %s
         """
         Database.execute_query(
             query,
-            (name, username, telegram_id, receive_notifications, user_id),
+            (telegram_id, telegram_id, name, username, telegram_id, receive_notifications,
+             dm_notifications, user_id),
             commit=True
         )
+        events.publish(events.USER_CHANGED, user_id=user_id)
     
     @staticmethod
     def update_password(user_id, password_hash):
@@ -160,16 +255,54 @@ class User:
     
     @staticmethod
     def get_users_for_notifications():
-        """Получить пользователей для отправки уведомлений"""
+        """Получить пользователей для отправки уведомлений (кроме заблокированных чатов)"""
         query = """
             SELECT * FROM users 
             WHERE is_active = TRUE 
             AND receive_notifications = TRUE 
             AND telegram_id IS NOT NULL 
             AND telegram_id != ''
+            AND telegram_suppressed_at IS NULL
         """
         return Database.execute_query(query, fetch_all=True)
 
+    @staticmethod
+    def suppress_telegram(chat_id, reason):
+        """
+        Остановить доставку в чат, который окончательно недоступен
+        
+        Пользователь заблокировал бота или чат не существует: повторные
+        отправки только расходуют запросы к API. Неотправленные сообщения
+        в этот чат отменяются.
+        
+        Returns:
+            Количество пользователей, для которых доставка остановлена
+        """
+        with Database.get_cursor(commit=True) as cursor:
+            cursor.execute(
+                """
+                UPDATE users
+                SET telegram_suppressed_at = NOW(), telegram_suppressed_reason = %s
+                WHERE telegram_id = %s AND telegram_suppressed_at IS NULL
+                """,
+                (reason, str(chat_id))
+            )
+            suppressed = cursor.rowcount
+            Outbox.cancel_for_chat(chat_id, cursor=cursor)
+        return suppressed
+
+    @staticmethod
+    def unsuppress_telegram(chat_id):
+        """Возобновить доставку в чат (пользователь снова написал боту)"""
+        query = """
+            UPDATE users
+            SET telegram_suppressed_at = NULL, telegram_suppressed_reason = NULL
+            WHERE telegram_id = %s AND telegram_suppressed_at IS NOT NULL
+        """
+        with Database.get_cursor(commit=True) as cursor:
+            cursor.execute(query, (str(chat_id),))
+            return cursor.rowcount
+
 
 class Plant:
     """Модель растения"""
@@ -207,110 +340,85 @@ class Plant:
              location, image_url, next_watering_date, next_fertilizer_date)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """
-        return Database.execute_query(
-            query,
-            (name, watering_interval_days, fertilizer_interval_days, description,
-             location, image_url, next_watering.date(), 
-             next_fertilizer.date() if next_fertilizer else None),
-            commit=True
-        )
+        with Database.get_cursor(commit=True) as cursor:
+            plant_id = Database.execute_query(
+                query,
+                (name, watering_interval_days, fertilizer_interval_days, description,
+                 location, image_url, next_watering.date(), 
+                 next_fertilizer.date() if next_fertilizer else None),
+                commit=True,
+                cursor=cursor
+            )
+            CareTask.sync_from_plants(plant_id, cursor=cursor)
+        events.publish(events.PLANT_CHANGED, plant_id=plant_id)
+        return plant_id
     
     @staticmethod
     def update(plant_id, name, watering_interval_days, fertilizer_interval_days=None,
                description=None, location=None, image_url=None):
         """Обновить данные растения"""
+        # Если прикормка только что включена, первая дата считается от сегодняшнего дня
         query = """
             UPDATE plants 
             SET name = %s, watering_interval_days = %s, fertilizer_interval_days = %s,
-                description = %s, location = %s, image_url = %s
+                description = %s, location = %s, image_url = %s,
+                next_fertilizer_date = COALESCE(next_fertilizer_date, CURDATE() + INTERVAL %s DAY)
             WHERE id = %s
         """
-        Database.execute_query(
-            query,
-            (name, watering_interval_days, fertilizer_interval_days, description,
-             location, image_url, plant_id),
-            commit=True
-        )
+        with Database.get_cursor(commit=True) as cursor:
+            # Фото заменено: file_id прежнего фото в Telegram больше не понадобятся
+            old = Database.execute_query(
+                "SELECT image_url FROM plants WHERE id = %s", (plant_id,), fetch_one=True, cursor=cursor
+            )
+            if old and old['image_url'] and old['image_url'] != image_url:
+                TelegramFile.delete(old['image_url'], cursor=cursor)
+            Database.execute_query(
+                query,
+                (name, watering_interval_days, fertilizer_interval_days, description,
+                 location, image_url, fertilizer_interval_days, plant_id),
+                cursor=cursor
+            )
+            CareTask.sync_from_plants(plant_id, cursor=cursor)
+        events.publish(events.PLANT_CHANGED, plant_id=plant_id)
     
     @staticmethod
     def delete(plant_id):
         """Удалить растение (мягкое удаление)"""
         query = "UPDATE plants SET is_active = FALSE WHERE id = %s"
         Database.execute_query(query, (plant_id,), commit=True)
+        events.publish(events.PLANT_CHANGED, plant_id=plant_id)
     
     @staticmethod
-    def update_watering(plant_id, user_id):
-        """Обновить данные о поливе"""
-        from datetime import datetime, timedelta
-        
-        # Получаем растение
-        plant = Plant.get_by_id(plant_id)
-        if not plant:
-            return False
-        
-        now = datetime.now()
-        next_watering = now + timedelta(days=plant['watering_interval_days'])
-        
-        # Обновляем растение
-        query = """
-            UPDATE plants 
-            SET last_watered_at = %s, next_watering_date = %s
-            WHERE id = %s
+    def update_watering(plant_id, user_id, outbox_messages=None, now=None, completion_text=None):
         """
-        Database.execute_query(query, (now, next_watering.date(), plant_id), commit=True)
+        Обновить данные о поливе
         
-        # Закрываем все активные уведомления о поливе для этого растения
-        close_query = """
-            UPDATE notification_log 
-            SET is_completed = TRUE, completed_by_user_id = %s, completed_at = %s
-            WHERE plant_id = %s AND notification_type = 'watering' AND is_completed = FALSE
+        Args:
+            plant_id: ID растения
+            user_id: ID пользователя
+            outbox_messages: Сообщения для очереди outbox, которые записываются
+                в той же транзакции, что и закрытие уведомлений
+            now: Время полива (по умолчанию текущее)
+            completion_text: Текст для правки уведомлений в общем чате
         """
-        Database.execute_query(close_query, (user_id, now, plant_id), commit=True)
-        
-        # Добавляем в историю
-        WateringHistory.add(plant_id, user_id, 'watering')
-        
-        return True
+        return CareTask.complete(plant_id, 'watering', user_id, outbox_messages, now, completion_text)
     
     @staticmethod
-    def update_fertilizer(plant_id, user_id):
-        """Обновить данные о прикормке"""
-        from datetime import datetime, timedelta
-        
-        # Получаем растение
-        plant = Plant.get_by_id(plant_id)
-        if not plant or not plant['fertilizer_interval_days']:
-            return False
-        
-        now = datetime.now()
-        next_fertilizer = now + timedelta(days=plant['fertilizer_interval_days'])
-        
-        # Обновляем растение
-        query = """
-            UPDATE plants 
-            SET last_fertilized_at = %s, next_fertilizer_date = %s
-            WHERE id = %s
-        """
-        Database.execute_query(query, (now, next_fertilizer.date(), plant_id), commit=True)
-        
-        # Закрываем все активные уведомления о прикормке для этого растения
-        close_query = """
-            UPDATE notification_log 
-            SET is_completed = TRUE, completed_by_user_id = %s, completed_at = %s
-            WHERE plant_id = %s AND notification_type = 'fertilizer' AND is_completed = FALSE
-        """
-        Database.execute_query(close_query, (user_id, now, plant_id), commit=True)
-        
-        # Добавляем в историю
-        WateringHistory.add(plant_id, user_id, 'fertilizer')
-        
-        return True
+    def update_fertilizer(plant_id, user_id, outbox_messages=None, now=None, completion_text=None):
+        """Обновить данные о прикормке (аргументы как у update_watering)"""
+        return CareTask.complete(plant_id, 'fertilizer', user_id, outbox_messages, now, completion_text)
+    
+    @staticmethod
+    def lock(plant_id, cursor):
+        """Заблокировать строку растения до конца транзакции (SELECT ... FOR UPDATE)"""
+        cursor.execute("SELECT id FROM plants WHERE id = %s FOR UPDATE", (plant_id,))
+        return cursor.fetchone() is not None
     
     @staticmethod
-    def get_plants_needing_water():
+    def get_plants_needing_water(today=None):
         """Получить растения, которые нужно полить сегодня"""
         from datetime import datetime
-        today = datetime.now().date()
+        today = today or datetime.now().date()
         
         query = """
             SELECT * FROM plants 
@@ -321,10 +429,10 @@ class Plant:
         return Database.execute_query(query, (today,), fetch_all=True)
     
     @staticmethod
-    def get_plants_needing_fertilizer():
+    def get_plants_needing_fertilizer(today=None):
         """Получить растения, которые нужно прикормить сегодня"""
         from datetime import datetime
-        today = datetime.now().date()
+        today = today or datetime.now().date()
         
         query = """
             SELECT * FROM plants 
@@ -336,11 +444,377 @@ class Plant:
         return Database.execute_query(query, (today,), fetch_all=True)
 
 
+class CareTask:
+    """Модель задач ухода (типы описаны в care_tasks.py)"""
+
+    @staticmethod
+    def sync_from_plants(plant_id=None, cursor=None):
+        """
+        Обновить задачи типов с колонками-зеркалами по данным таблицы plants
+        
+        Args:
+            plant_id: ID растения или None для всех растений
+            cursor: Курсор транзакции, в которой изменена строка plants
+        """
+        from care_tasks import CARE_TASK_TYPES
+
+        for task_type in CARE_TASK_TYPES.values():
+            if not task_type.plant_columns:
+                continue
+            interval_column, next_column, last_column = task_type.plant_columns
+            query = f"""
+                INSERT INTO care_tasks (plant_id, task_type, interval_days, next_due, last_done_at, is_active)
+                SELECT id, %s, {interval_column}, {next_column}, {last_column}, {interval_column} IS NOT NULL
+                FROM plants
+                {'WHERE id = %s' if plant_id else ''}
+                ON DUPLICATE KEY UPDATE interval_days = VALUES(interval_days), next_due = VALUES(next_due),
+                    last_done_at = VALUES(last_done_at), is_active = VALUES(is_active)
+            """
+            params = (task_type.key, plant_id) if plant_id else (task_type.key,)
+            Database.execute_query(query, params, commit=True, cursor=cursor)
+
+    @staticmethod
+    def get(plant_id, task_type):
+        """Получить задачу растения по типу"""
+        query = "SELECT * FROM care_tasks WHERE plant_id = %s AND task_type = %s"
+        return Database.execute_query(query, (plant_id, task_type), fetch_one=True)
+
+    @staticmethod
+    def get_for_plant(plant_id, include_inactive=False):
+        """Задачи ухода растения"""
+        query = "SELECT * FROM care_tasks WHERE plant_id = %s"
+        if not include_inactive:
+            query += " AND is_active = TRUE"
+        query += " ORDER BY id"
+        return Database.execute_query(query, (plant_id,), fetch_all=True)
+
+    @staticmethod
+    def iter_due(today=None, batch_size=500, partition=None):
+        """
+        Просроченные задачи всех типов одним проходом, пачками по id задачи
+        
+        Каждая строка - данные растения (plants.*) плюс task_id, task_type,
+        interval_days и next_due задачи.
+        
+        Args:
+            partition: (index, count) - доля узла по plant_id (SCHEDULER_MODE=sharded)
+        """
+        from datetime import datetime
+        today = today or datetime.now().date()
+        partition_sql, partition_params = Database.partition_filter('ct.plant_id', partition)
+
+        query = f"""
+            SELECT p.*, ct.id AS task_id, ct.task_type, ct.interval_days, ct.next_due
+            FROM care_tasks ct
+            JOIN plants p ON p.id = ct.plant_id
+            WHERE ct.next_due <= %s
+            AND ct.is_active = TRUE
+            AND p.is_active = TRUE
+            {partition_sql}
+            AND ct.id > %s
+            ORDER BY ct.id
+            LIMIT %s
+        """
+        return Database.iter_batches(query, (today, *partition_params), batch_size, key='task_id')
+
+    @staticmethod
+    def get_due(today=None):
+        """Все просроченные задачи (для статуса в боте): растение + task_type и next_due"""
+        return list(CareTask.iter_due(today))
+
+    @staticmethod
+    def get_due_counts(today=None):
+        """Количество растений с просроченным уходом по типам: {task_type: count}"""
+        from datetime import datetime
+        today = today or datetime.now().date()
+
+        query = """
+            SELECT ct.task_type, COUNT(*) AS due_count
+            FROM care_tasks ct
+            JOIN plants p ON p.id = ct.plant_id
+            WHERE ct.next_due <= %s AND ct.is_active = TRUE AND p.is_active = TRUE
+            GROUP BY ct.task_type
+        """
+        rows = Database.execute_query(query, (today,), fetch_all=True) or []
+        return {row['task_type']: row['due_count'] for row in rows}
+
+    @staticmethod
+    def get_status_rows(plant_id=None):
+        """
+        Активные растения со сроками ухода одним запросом (для due_index.py)
+
+        Строка на пару (растение, активная задача со сроком): plants.* плюс
+        due_task_type и due_next_due; у растения без задач они NULL.
+        """
+        query = """
+            SELECT p.*, ct.task_type AS due_task_type, ct.next_due AS due_next_due
+            FROM plants p
+            LEFT JOIN care_tasks ct
+                ON ct.plant_id = p.id AND ct.is_active = TRUE AND ct.next_due IS NOT NULL
+            WHERE p.is_active = TRUE
+        """
+        params = ()
+        if plant_id:
+            query += " AND p.id = %s"
+            params = (plant_id,)
+        return Database.execute_query(query + " ORDER BY p.id", params, fetch_all=True) or []
+
+    @staticmethod
+    def get_status_fingerprint():
+        """
+        Контрольные суммы сроков ухода для сверки due_index.py с БД
+
+        Возвращает агрегаты без чтения строк: число и CRC32 названий активных
+        растений, сумму дней последнего полива, сумму updated_at (TO_SECONDS: любое
+        изменение строки растения - местоположения, фото, интервалов) и по каждому
+        типу ухода - число задач со сроком и сумму их сроков (TO_DAYS).
+        """
+        plants = Database.execute_query(
+            """
+            SELECT COUNT(*) AS plants, COALESCE(SUM(CRC32(name)), 0) AS names,
+                COALESCE(SUM(TO_DAYS(last_watered_at)), 0) AS watered,
+                COALESCE(SUM(TO_SECONDS(updated_at)), 0) AS updated
+            FROM plants WHERE is_active = TRUE
+            """,
+            fetch_one=True
+        ) or {}
+        tasks = Database.execute_query(
+            """
+            SELECT ct.task_type, COUNT(*) AS tasks, COALESCE(SUM(TO_DAYS(ct.next_due)), 0) AS due_days
+            FROM care_tasks ct
+            JOIN plants p ON p.id = ct.plant_id
+            WHERE ct.is_active = TRUE AND ct.next_due IS NOT NULL AND p.is_active = TRUE
+            GROUP BY ct.task_type
+            """,
+            fetch_all=True
+        ) or []
+        return {
+            'plants': int(plants.get('plants') or 0),
+            'names': int(plants.get('names') or 0),
+            'watered': int(plants.get('watered') or 0),
+            'updated': int(plants.get('updated') or 0),
+            'tasks': {row['task_type']: (int(row['tasks']), int(row['due_days'])) for row in tasks},
+        }
+
+    @staticmethod
+    def complete(plant_id, task_type, user_id, outbox_messages=None, now=None,
+                 completion_text=None, edited_message=None, log_id=None):
+        """
+        Отметить уход выполненным
+        
+        В одной транзакции переносит срок задачи (и колонки-зеркала в plants),
+        закрывает уведомления этого типа, отменяет неотправленные напоминания,
+        пишет историю и ставит в outbox сообщения о выполнении.
+
+        Срок переносится условным UPDATE (по прочитанному next_due), поэтому
+        из одновременных отметок за один срок выигрывает первая, а остальные
+        получают CareAlreadyDone без двойной записи истории. Блокировка строки
+        держится только на время короткой транзакции.
+        
+        Args:
+            plant_id: ID растения
+            task_type: Ключ типа ухода из care_tasks.py
+            user_id: ID пользователя
+            outbox_messages: Дополнительные сообщения для очереди outbox
+            now: Время выполнения (по умолчанию текущее)
+            completion_text: Текст, которым заменяются доставленные уведомления
+                (кнопка убирается); None - не править
+            edited_message: (chat_id, message_id) сообщения, которое уже изменил
+                вызывающий код (нажатая кнопка), - его повторно не правим
+            log_id: Уведомление, из которого отмечен уход; если оно уже закрыто,
+                срок уже отмечен кем-то другим
+            
+        Returns:
+            False, если у растения нет активной задачи этого типа
+
+        Raises:
+            CareAlreadyDone: срок уже отметил другой пользователь
+        """
+        from datetime import datetime, timedelta
+        from care_tasks import get_task_type
+
+        definition = get_task_type(task_type)
+        task = CareTask.get(plant_id, task_type)
+        if not task or not task['is_active'] or not task['interval_days']:
+            return False
+
+        if log_id:
+            # Кнопка из уведомления, которое уже закрыто: этот срок уже отмечен
+            log = Database.execute_query(
+                """
+                SELECT n.is_completed, n.completed_at, u.name AS user_name
+                FROM notification_log n
+                LEFT JOIN users u ON u.id = n.completed_by_user_id
+                WHERE n.id = %s
+                """,
+                (log_id,),
+                fetch_one=True
+            )
+            if log and log['is_completed']:
+                raise CareAlreadyDone(log['user_name'], log['completed_at'])
+
+        now = now or datetime.now()
+        next_due = (now + timedelta(days=task['interval_days'])).date()
+
+        with Database.get_cursor(commit=True) as cursor:
+            # Первым в транзакции: конкурирующая отметка ждёт здесь и после
+            # фиксации первой видит изменённый next_due (0 строк)
+            cursor.execute(
+                """
+                UPDATE care_tasks SET last_done_at = %s, last_done_by = %s, next_due = %s
+                WHERE id = %s AND next_due <=> %s
+                """,
+                (now, user_id, next_due, task['id'], task['next_due'])
+            )
+            winner = None
+            if cursor.rowcount == 0:
+                winner = Database.execute_query(
+                    """
+                    SELECT t.last_done_at, u.name AS user_name FROM care_tasks t
+                    LEFT JOIN users u ON u.id = t.last_done_by
+                    WHERE t.id = %s
+                    """,
+                    (task['id'],),
+                    fetch_one=True,
+                    cursor=cursor
+                ) or {}
+            else:
+                CareTask._apply_completion(
+                    cursor, plant_id, definition, user_id, now, next_due,
+                    outbox_messages, completion_text, edited_message
+                )
+
+        if winner is not None:
+            raise CareAlreadyDone(winner.get('user_name'), winner.get('last_done_at'))
+        events.publish(events.CARE_DONE, plant_id=plant_id, task_type=task_type, next_due=next_due, done_at=now)
+        return True
+
+    @staticmethod
+    def _apply_completion(cursor, plant_id, definition, user_id, now, next_due,
+                          outbox_messages, completion_text, edited_message):
+        """Остальные изменения выигравшей отметки (в транзакции complete)"""
+        if definition.plant_columns:
+            _, next_column, last_column = definition.plant_columns
+            # updated_at задаётся явно: due_index ставит то же значение без чтения строки
+            Database.execute_query(
+                f"UPDATE plants SET {last_column} = %s, {next_column} = %s, updated_at = %s WHERE id = %s",
+                (now, next_due, now.replace(microsecond=0), plant_id),
+                cursor=cursor
+            )
+
+        # Открытые уведомления - их доставленные сообщения будут исправлены
+        open_logs = Database.execute_query(
+            """
+            SELECT id FROM notification_log
+            WHERE plant_id = %s AND notification_type = %s AND is_completed = FALSE
+            FOR UPDATE
+            """,
+            (plant_id, definition.key),
+            fetch_all=True,
+            cursor=cursor
+        ) or []
+
+        # Закрываем все активные уведомления этого типа для растения
+        close_query = """
+            UPDATE notification_log 
+            SET is_completed = TRUE, completed_by_user_id = %s, completed_at = %s
+            WHERE plant_id = %s AND notification_type = %s AND is_completed = FALSE
+        """
+        Database.execute_query(close_query, (user_id, now, plant_id, definition.key), cursor=cursor)
+
+        # Ещё не отправленные напоминания (в том числе отложенные до окна) больше не нужны
+        Outbox.cancel_for_plant(plant_id, definition.key, cursor=cursor)
+
+        # Добавляем в историю
+        WateringHistory.add(plant_id, user_id, definition.key, cursor=cursor)
+
+        if outbox_messages:
+            Outbox.add_many(outbox_messages, cursor=cursor)
+
+        if completion_text and open_logs:
+            # Все доставленные уведомления (в личных сообщениях и в общем чате)
+            # правятся на месте вместо новых сообщений: кнопка исчезает, и
+            # никто не пойдёт поливать повторно. Правки отправляет пул outbox
+            # параллельно и в пределах лимитов ботов
+            messages = NotificationDelivery.get_messages_for_logs(
+                [log['id'] for log in open_logs], cursor=cursor
+            )
+            Outbox.add_many([
+                {
+                    'action': 'edit',
+                    'chat_id': message['chat_id'],
+                    'message_id': message['message_id'],
+                    'bot_id': message['bot_id'],
+                    # Сообщение с фото правится как подпись
+                    'photo': message['photo'],
+                    'text': completion_text,
+                    'parse_mode': 'Markdown',
+                    'log_id': message['notification_log_id'],
+                    'priority': EDIT_PRIORITY,
+                }
+                for message in messages
+                if edited_message is None
+                or (str(edited_message[0]), edited_message[1]) != (message['chat_id'], message['message_id'])
+            ], cursor=cursor)
+
+
+class PlantAssignee:
+    """Модель ответственных за растения (для одного растения или всего местоположения)"""
+
+    @staticmethod
+    def get_all():
+        """Все назначения в порядке очереди ротации"""
+        query = "SELECT * FROM plant_assignees ORDER BY position, id"
+        return Database.execute_query(query, fetch_all=True)
+
+    @staticmethod
+    def get_for_plant(plant_id):
+        """ID ответственных, назначенных на само растение"""
+        query = "SELECT user_id FROM plant_assignees WHERE plant_id = %s ORDER BY position, id"
+        rows = Database.execute_query(query, (plant_id,), fetch_all=True)
+        return [row['user_id'] for row in rows]
+
+    @staticmethod
+    def get_for_location(location):
+        """ID ответственных за все растения местоположения"""
+        query = """
+            SELECT user_id FROM plant_assignees
+            WHERE plant_id IS NULL AND location = %s
+            ORDER BY position, id
+        """
+        rows = Database.execute_query(query, (location,), fetch_all=True)
+        return [row['user_id'] for row in rows]
+
+    @staticmethod
+    def set_for_plant(plant_id, user_ids):
+        """Заменить ответственных за растение (порядок списка - очередь ротации)"""
+        with Database.get_cursor(commit=True) as cursor:
+            cursor.execute("DELETE FROM plant_assignees WHERE plant_id = %s", (plant_id,))
+            if user_ids:
+                cursor.executemany(
+                    "INSERT INTO plant_assignees (plant_id, user_id, position) VALUES (%s, %s, %s)",
+                    [(plant_id, user_id, position) for position, user_id in enumerate(user_ids)]
+                )
+
+    @staticmethod
+    def set_for_location(location, user_ids):
+        """Заменить ответственных за местоположение (порядок списка - очередь ротации)"""
+        with Database.get_cursor(commit=True) as cursor:
+            cursor.execute(
+                "DELETE FROM plant_assignees WHERE plant_id IS NULL AND location = %s", (location,)
+            )
+            if user_ids:
+                cursor.executemany(
+                    "INSERT INTO plant_assignees (location, user_id, position) VALUES (%s, %s, %s)",
+                    [(location, user_id, position) for position, user_id in enumerate(user_ids)]
+                )
+
+
 class WateringHistory:
     """Модель истории полива"""
     
     @staticmethod
-    def add(plant_id, user_id, action_type, notes=None):
+    def add(plant_id, user_id, action_type, notes=None, cursor=None):
         """Добавить запись в историю"""
         query = """
             INSERT INTO watering_history (plant_id, user_id, action_type, notes)
@@ -349,7 +823,8 @@ class WateringHistory:
         return Database.execute_query(
             query,
             (plant_id, user_id, action_type, notes),
-            commit=True
+            commit=True,
+            cursor=cursor
         )
     
     @staticmethod
@@ -366,6 +841,46 @@ class WateringHistory:
         """
         return Database.execute_query(query, (plant_id, limit), fetch_all=True)
     
+    @staticmethod
+    def get_range(start, end):
+        """
+        История активных растений за период [start, end) одним запросом
+
+        Использует индекс idx_watered_at; строки упорядочены по времени.
+        """
+        query = """
+            SELECT wh.id, wh.plant_id, wh.action_type, wh.watered_at,
+                u.name as user_name, p.name as plant_name
+            FROM watering_history wh
+            JOIN users u ON wh.user_id = u.id
+            JOIN plants p ON wh.plant_id = p.id
+            WHERE wh.watered_at >= %s AND wh.watered_at < %s AND p.is_active = TRUE
+            ORDER BY wh.watered_at, wh.id
+        """
+        return Database.execute_query(query, (start, end), fetch_all=True) or []
+
+    @staticmethod
+    def get_names_version():
+        """
+        Версия данных, от которых зависит история прошлых периодов, кроме самих записей
+
+        Контрольные суммы id и названий активных растений и id и имён пользователей:
+        меняются при переименовании, отключении и удалении в любом процессе.
+        """
+        query = """
+            SELECT
+                (SELECT COUNT(*) FROM plants WHERE is_active = TRUE) AS plants_count,
+                (SELECT COALESCE(SUM(CRC32(CONCAT(id, ':', name))), 0)
+                 FROM plants WHERE is_active = TRUE) AS plants_names,
+                (SELECT COUNT(*) FROM users) AS users_count,
+                (SELECT COALESCE(SUM(CRC32(CONCAT(id, ':', name))), 0) FROM users) AS users_names
+        """
+        result = Database.execute_query(query, fetch_one=True)
+        if not result:
+            return None
+        return (int(result['plants_count']), int(result['plants_names']),
+                int(result['users_count']), int(result['users_names']))
+    
     @staticmethod
     def get_recent(limit=20):
         """Получить последние записи истории"""
@@ -406,18 +921,63 @@ class SystemSettings:
         query = "SELECT * FROM system_settings ORDER BY setting_key"
         return Database.execute_query(query, fetch_all=True)
 
+    @staticmethod
+    def get_version():
+        """Получить версию настроек (меняется при любом изменении значений)"""
+        query = """
+            SELECT COUNT(*) AS settings_count, MAX(updated_at) AS updated_at
+            FROM system_settings
+        """
+        result = Database.execute_query(query, fetch_one=True)
+        return (result['settings_count'], result['updated_at']) if result else None
+
+
+class DataVersion:
+    """Версия данных портала для условных запросов (ETag/Last-Modified)"""
+
+    @staticmethod
+    def get():
+        """
+        Получить версию данных, которые показывают дашборд, список растений и API статистики
+
+        Меняется при добавлении, изменении и удалении растений и пользователей
+        (updated_at с индексом - MAX читается из индекса) и при любой отметке
+        ухода (новая запись watering_history).
+
+        Returns:
+            (число растений, MAX(plants.updated_at), число пользователей,
+             MAX(users.updated_at), MAX(watering_history.id)) или None
+        """
+        query = """
+            SELECT
+                (SELECT COUNT(*) FROM plants) AS plants_count,
+                (SELECT MAX(updated_at) FROM plants) AS plants_updated_at,
+                (SELECT COUNT(*) FROM users) AS users_count,
+                (SELECT MAX(updated_at) FROM users) AS users_updated_at,
+                (SELECT MAX(id) FROM watering_history) AS history_id
+        """
+        result = Database.execute_query(query, fetch_one=True)
+        if not result:
+            return None
+        return (result['plants_count'], result['plants_updated_at'], result['users_count'],
+                result['users_updated_at'], result['history_id'])
+
 
 class NotificationLog:
     """Модель журнала уведомлений"""
 
     @staticmethod
-    def create(plant_id, notification_type):
-        """Создать запись об уведомлении"""
+    def create(plant_id, notification_type, cursor=None, now=None):
+        """Создать запись об уведомлении (now - время отправки, по умолчанию текущее)"""
+        from datetime import datetime
+        now = now or datetime.now()
         query = """
-            INSERT INTO notification_log (plant_id, notification_type, last_attempt_at)
-            VALUES (%s, %s, NOW())
+            INSERT INTO notification_log (plant_id, notification_type, sent_at, last_attempt_at)
+            VALUES (%s, %s, %s, %s)
         """
-        return Database.execute_query(query, (plant_id, notification_type), commit=True)
+        return Database.execute_query(
+            query, (plant_id, notification_type, now, now), commit=True, cursor=cursor
+        )
 
     @staticmethod
     def mark_completed(log_id, user_id):
@@ -431,7 +991,7 @@ class NotificationLog:
         Database.execute_query(query, (user_id, datetime.now(), log_id), commit=True)
 
     @staticmethod
-    def get_pending_for_plant(plant_id, notification_type):
+    def get_pending_for_plant(plant_id, notification_type, cursor=None):
         """Получить незавершенные уведомления для растения"""
         query = """
             SELECT * FROM notification_log 
@@ -440,7 +1000,7 @@ class NotificationLog:
             AND is_completed = FALSE
             ORDER BY sent_at DESC
         """
-        return Database.execute_query(query, (plant_id, notification_type), fetch_all=True)
+        return Database.execute_query(query, (plant_id, notification_type), fetch_all=True, cursor=cursor)
 
     @staticmethod
     def get_all_pending():
@@ -453,12 +1013,552 @@ class NotificationLog:
         return Database.execute_query(query, fetch_all=True)
 
     @staticmethod
-    def increment_attempt(log_id):
-        """Увеличить счётчик попыток и обновить время последней попытки"""
+    def iter_due_retries(max_retries, last_attempt_before, batch_size=500, partition=None):
+        """
+        Незавершённые уведомления, которым пора отправить повтор, пачками по id
+        
+        К строке журнала добавляется next_due задачи ухода (для приоритета).
+        
+        Args:
+            max_retries: Уведомления с attempt_number >= max_retries пропускаются
+            last_attempt_before: Последняя попытка должна быть не позже этого времени
+            partition: (index, count) - доля узла по plant_id (SCHEDULER_MODE=sharded)
+        """
+        partition_sql, partition_params = Database.partition_filter('n.plant_id', partition)
+        query = f"""
+            SELECT n.*, ct.next_due FROM notification_log n
+            LEFT JOIN care_tasks ct ON ct.plant_id = n.plant_id AND ct.task_type = n.notification_type
+            WHERE n.is_completed = FALSE
+            AND n.attempt_number < %s
+            AND COALESCE(n.last_attempt_at, n.sent_at) <= %s
+            {partition_sql}
+            AND n.id > %s
+            ORDER BY n.id
+            LIMIT %s
+        """
+        return Database.iter_batches(
+            query, (max_retries, last_attempt_before, *partition_params), batch_size
+        )
+
+    @staticmethod
+    def increment_attempt(log_id, cursor=None, now=None, expected_attempt=None):
+        """
+        Увеличить счётчик попыток и обновить время последней попытки
+        
+        Args:
+            expected_attempt: Если задан, счётчик меняется, только пока он равен
+                этому значению и уведомление не выполнено (повтор не будет
+                отправлен дважды разными узлами или после выполнения)
+            
+        Returns:
+            Количество изменённых строк (0 - попытку уже засчитал другой узел)
+        """
+        from datetime import datetime
+        now = now or datetime.now()
         query = """
             UPDATE notification_log 
             SET attempt_number = attempt_number + 1, 
-                last_attempt_at = NOW()
+                last_attempt_at = %s
+            WHERE id = %s
+        """
+        params = (now, log_id)
+        if expected_attempt is not None:
+            query += " AND attempt_number = %s AND is_completed = FALSE"
+            params += (expected_attempt,)
+
+        if cursor is not None:
+            cursor.execute(query, params)
+            return cursor.rowcount
+        with Database.get_cursor(commit=True) as cursor:
+            cursor.execute(query, params)
+            return cursor.rowcount
+
+
+class NotificationDelivery:
+    """Модель доставки уведомлений по получателям (notification_delivery)"""
+
+    @staticmethod
+    def add_many(log_id, chats, cursor=None):
+        """
+        Отметить, что в чаты поставлено в очередь сообщение уведомления
+        
+        Повторная постановка (повтор уведомления) возвращает строку в 'pending'
+        и увеличивает attempts - число сообщений, отправленных в чат.
+        
+        Args:
+            chats: Список (user_id, chat_id); user_id None - общий чат
+        """
+        if not chats:
+            return 0
+
+        query = """
+            INSERT INTO notification_delivery (notification_log_id, user_id, chat_id, status, attempts)
+            VALUES (%s, %s, %s, 'pending', 1)
+            ON DUPLICATE KEY UPDATE status = 'pending', user_id = VALUES(user_id),
+                attempts = attempts + 1, error = NULL
+        """
+        params_list = [(log_id, user_id, str(chat_id)) for user_id, chat_id in chats]
+        if cursor is not None:
+            cursor.executemany(query, params_list)
+            return cursor.rowcount
+        return Database.execute_many(query, params_list)
+
+    @staticmethod
+    def get_for_log(log_id, cursor=None):
+        """Доставка уведомления по чатам: {chat_id: строка}"""
+        query = "SELECT * FROM notification_delivery WHERE notification_log_id = %s"
+        rows = Database.execute_query(query, (log_id,), fetch_all=True, cursor=cursor) or []
+        return {row['chat_id']: row for row in rows}
+
+    @staticmethod
+    def get_messages_for_logs(log_ids, cursor=None):
+        """
+        Все доставленные сообщения уведомлений (первичные и повторы) для правки
+        после выполнения
+
+        Чтение блокирующее: оно видит сообщения, записанные после начала
+        транзакции отметки ухода, пока она ждала блокировку notification_log.
+        """
+        if not log_ids:
+            return []
+        placeholders = ', '.join(['%s'] * len(log_ids))
+        query = f"""
+            SELECT * FROM notification_messages
+            WHERE notification_log_id IN ({placeholders})
+            ORDER BY id
+            FOR SHARE
+        """
+        return Database.execute_query(query, tuple(log_ids), fetch_all=True, cursor=cursor) or []
+
+    @staticmethod
+    def update_status(log_id, chat_id, status, message_id=None, error=None, bot_id=None, photo=None):
+        """
+        Записать результат отправки сообщения уведомления в чат (bot_id - отправивший бот)
+
+        В notification_delivery хранится последнее сообщение чата, а каждое
+        доставленное сообщение дополнительно записывается в notification_messages:
+        после выполнения правятся все, включая повторы. photo - image_url, если
+        сообщение ушло с фото (такое сообщение правится как подпись).
+
+        Строка notification_log блокируется до конца транзакции, как и при отметке
+        ухода (CareTask.complete): если уход отмечен, пока сообщение отправлялось,
+        отметка уже не найдёт его среди доставленных, поэтому правка ставится в
+        очередь здесь.
+        """
+        with Database.get_cursor(commit=True) as cursor:
+            log = None
+            if message_id is not None:
+                cursor.execute(
+                    """
+                    SELECT plant_id, notification_type, is_completed, completed_by_user_id, completed_at
+                    FROM notification_log WHERE id = %s
+                    FOR UPDATE
+                    """,
+                    (log_id,)
+                )
+                log = cursor.fetchone()
+            cursor.execute(
+                """
+                UPDATE notification_delivery
+                SET status = %s, message_id = COALESCE(%s, message_id), error = %s,
+                    bot_id = COALESCE(%s, bot_id)
+                WHERE notification_log_id = %s AND chat_id = %s
+                """,
+                (status, message_id, error, bot_id, log_id, str(chat_id))
+            )
+            if message_id is not None:
+                cursor.execute(
+                    """
+                    INSERT IGNORE INTO notification_messages
+                    (notification_log_id, chat_id, message_id, bot_id, photo)
+                    VALUES (%s, %s, %s, %s, %s)
+                    """,
+                    (log_id, str(chat_id), message_id, bot_id, photo)
+                )
+            if log and log['is_completed']:
+                NotificationDelivery._add_completion_edit(
+                    cursor, log, log_id, chat_id, message_id, bot_id, photo
+                )
+
+    @staticmethod
+    def _add_completion_edit(cursor, log, log_id, chat_id, message_id, bot_id, photo):
+        """Поставить в очередь правку сообщения, доставленного уже после отметки ухода"""
+        from notification_templates import render_completion
+
+        plant = Database.execute_query(
+            "SELECT name FROM plants WHERE id = %s", (log['plant_id'],), fetch_one=True, cursor=cursor
+        )
+        user = Database.execute_query(
+            "SELECT name FROM users WHERE id = %s", (log['completed_by_user_id'],), fetch_one=True, cursor=cursor
+        ) if log['completed_by_user_id'] else None
+        if not plant:
+            return
+
+        Outbox.add_many([{
+            'action': 'edit',
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'bot_id': bot_id,
+            'photo': photo,
+            'text': render_completion(
+                plant['name'], log['notification_type'], user['name'] if user else 'Пользователь',
+                log['completed_at']
+            ),
+            'parse_mode': 'Markdown',
+            'log_id': log_id,
+            'priority': EDIT_PRIORITY,
+        }], cursor=cursor)
+
+    @staticmethod
+    def get_status_counts(since):
+        """Число доставок по статусам для уведомлений, созданных после since"""
+        query = """
+            SELECT d.status, COUNT(*) AS total FROM notification_delivery d
+            JOIN notification_log n ON n.id = d.notification_log_id
+            WHERE n.sent_at >= %s
+            GROUP BY d.status
+        """
+        rows = Database.execute_query(query, (since,), fetch_all=True) or []
+        return {row['status']: row['total'] for row in rows}
+
+    @staticmethod
+    def delete_older_than(days):
+        """
+        Удалить строки доставки и сообщения уведомлений старше days дней
+
+        Они нужны, пока уведомление повторяется и ждёт выполнения; сам
+        notification_log остаётся историей уведомлений.
+
+        Returns:
+            Количество удалённых строк
+        """
+        deleted = Database.delete_in_batches(
+            "DELETE FROM notification_delivery WHERE updated_at < NOW() - INTERVAL %s DAY LIMIT %s",
+            (int(days),)
+        )
+        return deleted + Database.delete_in_batches(
+            "DELETE FROM notification_messages WHERE sent_at < NOW() - INTERVAL %s DAY LIMIT %s",
+            (int(days),)
+        )
+
+
+class Outbox:
+    """Модель очереди исходящих сообщений Telegram (transactional outbox)"""
+
+    @staticmethod
+    def add_many(messages, cursor=None):
+        """
+        Поставить сообщения в очередь
+        
+        Args:
+            messages: Список словарей с ключами chat_id, text и необязательными
+                parse_mode, reply_markup (dict), log_id, user_id, а также
+                release_at (начало окна, к которому отложено сообщение),
+                available_at (не отправлять раньше; по умолчанию сразу),
+                priority (больше - раньше; для утреннего пакета это дни просрочки) и
+                action ('send' или 'edit' - правка сообщения message_id),
+                bot_id (бот пула, которым отправлять; для правки - отправивший) и
+                photo (image_url фото растения: текст уходит подписью к фото)
+            cursor: Курсор транзакции, в которой меняется notification_log
+        """
+        import json
+
+        if not messages:
+            return 0
+
+        query = """
+            INSERT INTO outbox
+            (chat_id, text, parse_mode, reply_markup, notification_log_id, user_id,
+             release_at, available_at, priority, action, message_id, bot_id, photo)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP), %s, %s, %s, %s, %s)
+        """
+        params_list = [
+            (
+                str(m['chat_id']),
+                m['text'],
+                m.get('parse_mode'),
+                json.dumps(m['reply_markup'], ensure_ascii=False) if m.get('reply_markup') else None,
+                m.get('log_id'),
+                m.get('user_id'),
+                m.get('release_at'),
+                m.get('available_at'),
+                m.get('priority', 0),
+                m.get('action', 'send'),
+                m.get('message_id'),
+                m.get('bot_id'),
+                m.get('photo'),
+            )
+            for m in messages
+        ]
+
+        if cursor is not None:
+            cursor.executemany(query, params_list)
+            return cursor.rowcount
+        return Database.execute_many(query, params_list)
+
+    @staticmethod
+    def claim_batch(limit, stale_after_seconds):
+        """
+        Захватить пачку сообщений для отправки
+        
+        Строки блокируются через FOR UPDATE SKIP LOCKED, поэтому параллельные
+        воркеры (в том числе в других процессах) получают непересекающиеся пачки.
+        Сообщения, зависшие в статусе 'sending' дольше stale_after_seconds
+        (воркер упал во время отправки), захватываются повторно.
+        """
+        select_query = """
+            SELECT * FROM outbox
+            WHERE (status = 'pending' AND available_at <= NOW())
+               OR (status = 'sending' AND claimed_at < NOW() - INTERVAL %s SECOND)
+            ORDER BY priority DESC, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """
+        with Database.get_cursor(commit=True) as cursor:
+            cursor.execute(select_query, (stale_after_seconds, limit))
+            rows = cursor.fetchall()
+            if rows:
+                ids = [row['id'] for row in rows]
+                placeholders = ', '.join(['%s'] * len(ids))
+                cursor.execute(
+                    f"""
+                    UPDATE outbox
+                    SET status = 'sending', claimed_at = NOW(), attempts = attempts + 1
+                    WHERE id IN ({placeholders})
+                    """,
+                    ids
+                )
+            return rows
+
+    @staticmethod
+    def spread_release(release_at, spread_seconds, now=None):
+        """
+        Распределить отложенные до открытия окна сообщения по первым spread_seconds
+        
+        Уведомления (все сообщения одной записи журнала получают одно время)
+        упорядочиваются по приоритету и равномерно раскладываются по интервалу
+        [max(now, release_at), release_at + spread_seconds). Повторный вызов во время
+        раскладки (повтор в 08:10) пересчитывает только ещё не доступные сообщения
+        вместе с добавленными и раскладывает их по оставшейся части интервала:
+        слоты, которые уже в прошлом, не выпускают пачку сообщений разом.
+        
+        Returns:
+            Количество уведомлений в пакете
+        """
+        from datetime import datetime, timedelta
+        now = now or datetime.now()
+        start = max(now.replace(microsecond=0), release_at)
+        remaining = max(0, int((release_at + timedelta(seconds=spread_seconds) - start).total_seconds()))
+
+        with Database.get_cursor(commit=True) as cursor:
+            cursor.execute(
+                """
+                SELECT COUNT(DISTINCT notification_log_id) AS total FROM outbox
+                WHERE status = 'pending' AND release_at = %s AND available_at > %s
+                """,
+                (release_at, start)
+            )
+            total = cursor.fetchone()['total']
+            if not total:
+                return 0
+
+            cursor.execute(
+                """
+                UPDATE outbox o
+                JOIN (
+                    SELECT id, DENSE_RANK() OVER (ORDER BY priority DESC, notification_log_id) - 1 AS slot
+                    FROM outbox
+                    WHERE status = 'pending' AND release_at = %s AND available_at > %s
+                ) ranked ON ranked.id = o.id
+                SET o.available_at = %s + INTERVAL FLOOR(ranked.slot * %s / %s) SECOND
+                """,
+                (release_at, start, start, remaining, total)
+            )
+            return total
+
+    @staticmethod
+    def cancel_for_plant(plant_id, notification_type, cursor=None):
+        """
+        Отменить неотправленные уведомления растения (уход уже выполнен)
+
+        Правки ('edit') не отменяются: их поставила предыдущая отметка ухода, и
+        повторная отметка уже не найдёт эти уведомления среди открытых.
+        """
+        query = """
+            UPDATE outbox o
+            JOIN notification_log n ON n.id = o.notification_log_id
+            LEFT JOIN notification_delivery d
+                ON d.notification_log_id = o.notification_log_id AND d.chat_id = o.chat_id
+            SET o.status = 'cancelled',
+                d.status = IF(d.status = 'pending', 'cancelled', d.status)
+            WHERE n.plant_id = %s AND n.notification_type = %s AND o.status = 'pending'
+                AND o.action = 'send'
+        """
+        Database.execute_query(query, (plant_id, notification_type), commit=True, cursor=cursor)
+
+    @staticmethod
+    def cancel_for_chat(chat_id, cursor=None):
+        """Отменить неотправленные сообщения в чат, доставка в который остановлена"""
+        query = """
+            UPDATE outbox o
+            LEFT JOIN notification_delivery d
+                ON d.notification_log_id = o.notification_log_id AND d.chat_id = o.chat_id
+            SET o.status = 'cancelled',
+                d.status = IF(d.status = 'pending', 'suppressed', d.status)
+            WHERE o.chat_id = %s AND o.status = 'pending'
+        """
+        Database.execute_query(query, (str(chat_id),), commit=True, cursor=cursor)
+
+    @staticmethod
+    def mark_sent(outbox_id):
+        """Отметить сообщение как доставленное"""
+        query = """
+            UPDATE outbox
+            SET status = 'sent', sent_at = NOW(), last_error = NULL
+            WHERE id = %s
+        """
+        Database.execute_query(query, (outbox_id,), commit=True)
+
+    @staticmethod
+    def mark_retry(outbox_id, error, delay_seconds):
+        """Вернуть сообщение в очередь для повторной отправки через delay_seconds"""
+        query = """
+            UPDATE outbox
+            SET status = 'pending', last_error = %s,
+                available_at = NOW() + INTERVAL %s SECOND
             WHERE id = %s
         """
-        Database.execute_query(query, (log_id,), commit=True)
\ No newline at end of file
+        Database.execute_query(query, (error, int(delay_seconds), outbox_id), commit=True)
+
+    @staticmethod
+    def mark_failed(outbox_id, error):
+        """Окончательно отметить сообщение как недоставленное"""
+        query = "UPDATE outbox SET status = 'failed', last_error = %s WHERE id = %s"
+        Database.execute_query(query, (error, outbox_id), commit=True)
+
+    @staticmethod
+    def delete_finished_older_than(days):
+        """
+        Удалить отправленные, недоставленные и отменённые сообщения старше days дней
+
+        Returns:
+            Количество удалённых строк
+        """
+        query = """
+            DELETE FROM outbox
+            WHERE status IN ('sent', 'failed', 'cancelled') AND available_at < NOW() - INTERVAL %s DAY
+            LIMIT %s
+        """
+        return Database.delete_in_batches(query, (int(days),))
+
+
+class TelegramChatBot:
+    """Модель связей чат - бот из пула (каким ботам чат писал и, значит, может получать от них)"""
+
+    @staticmethod
+    def touch(chat_id, bot_id):
+        """Отметить, что чат написал боту (первое появление закрепляет бота за чатом)"""
+        query = """
+            INSERT INTO telegram_chat_bots (chat_id, bot_id, first_seen_at, last_seen_at)
+            VALUES (%s, %s, NOW(), NOW())
+            ON DUPLICATE KEY UPDATE last_seen_at = NOW()
+        """
+        Database.execute_query(query, (str(chat_id), str(bot_id)), commit=True)
+
+    @staticmethod
+    def delete(chat_id, bot_id):
+        """Удалить связь (чат заблокировал бота)"""
+        query = "DELETE FROM telegram_chat_bots WHERE chat_id = %s AND bot_id = %s"
+        Database.execute_query(query, (str(chat_id), str(bot_id)), commit=True)
+
+    @staticmethod
+    def get_all():
+        """Все связи, для каждого чата - в порядке закрепления"""
+        query = "SELECT chat_id, bot_id FROM telegram_chat_bots ORDER BY chat_id, first_seen_at, bot_id"
+        return Database.execute_query(query, fetch_all=True)
+
+
+class TelegramFile:
+    """Модель file_id фото, уже загруженных в Telegram (по ботам пула)"""
+
+    @staticmethod
+    def get_file_id(image_url, bot_id):
+        """file_id фото для бота или None"""
+        query = "SELECT file_id FROM telegram_files WHERE image_url = %s AND bot_id = %s"
+        row = Database.execute_query(query, (image_url, str(bot_id)), fetch_one=True)
+        return row['file_id'] if row else None
+
+    @staticmethod
+    def save(image_url, bot_id, file_id):
+        """Запомнить file_id загруженного фото"""
+        query = """
+            INSERT INTO telegram_files (image_url, bot_id, file_id)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE file_id = VALUES(file_id)
+        """
+        Database.execute_query(query, (image_url, str(bot_id), file_id), commit=True)
+
+    @staticmethod
+    def delete(image_url, bot_id=None, cursor=None):
+        """Удалить file_id фото (для одного бота или для всех)"""
+        query = "DELETE FROM telegram_files WHERE image_url = %s"
+        params = [image_url]
+        if bot_id is not None:
+            query += " AND bot_id = %s"
+            params.append(str(bot_id))
+        Database.execute_query(query, tuple(params), commit=cursor is None, cursor=cursor)
+
+
+class SchedulerRun:
+    """Модель истории тиков планировщика"""
+
+    @staticmethod
+    def add(run):
+        """
+        Сохранить тик
+        
+        Args:
+            run: Словарь из TickStats.to_dict() (scheduler_stats.py)
+        """
+        import json
+
+        query = """
+            INSERT INTO scheduler_runs
+            (job_id, node_id, status, started_at, finished_at, duration_ms, phases, counts, error)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        return Database.execute_query(query, (
+            run['job_id'],
+            run.get('node_id'),
+            run['status'],
+            run['started_at'],
+            run.get('finished_at'),
+            run.get('duration_ms'),
+            json.dumps(run.get('phases') or {}),
+            json.dumps(run.get('counts') or {}),
+            run.get('error'),
+        ), commit=True)
+
+    @staticmethod
+    def get_recent(limit=100, job_id=None):
+        """Последние тики (новые первыми), phases и counts уже разобраны из JSON"""
+        import json
+
+        if job_id:
+            query = "SELECT * FROM scheduler_runs WHERE job_id = %s ORDER BY started_at DESC LIMIT %s"
+            params = (job_id, limit)
+        else:
+            query = "SELECT * FROM scheduler_runs ORDER BY started_at DESC LIMIT %s"
+            params = (limit,)
+
+        runs = Database.execute_query(query, params, fetch_all=True) or []
+        for run in runs:
+            run['phases'] = json.loads(run['phases']) if run['phases'] else {}
+            run['counts'] = json.loads(run['counts']) if run['counts'] else {}
+        return runs
+
+    @staticmethod
+    def delete_older_than(days):
+        """Удалить тики старше days дней"""
+        query = "DELETE FROM scheduler_runs WHERE started_at < NOW() - INTERVAL %s DAY"
+        Database.execute_query(query, (int(days),), commit=True)
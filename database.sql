@@ -10,11 +10,17 @@ CREATE TABLE IF NOT EXISTS users (
     password_hash VARCHAR(255) NOT NULL,
     telegram_id VARCHAR(100),
     receive_notifications BOOLEAN DEFAULT TRUE,
+    -- Получать уведомления в личные сообщения, даже если настроен общий чат
+    dm_notifications BOOLEAN DEFAULT FALSE,
+    -- Доставка в Telegram остановлена: бот заблокирован или чат не найден
+    telegram_suppressed_at TIMESTAMP NULL,
+    telegram_suppressed_reason TEXT NULL,
     is_active BOOLEAN DEFAULT TRUE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_username (username),
-    INDEX idx_telegram_id (telegram_id)
+    INDEX idx_telegram_id (telegram_id),
+    INDEX idx_updated_at (updated_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Таблица растений
@@ -34,7 +40,42 @@ CREATE TABLE IF NOT EXISTS plants (
     next_watering_date DATE,
     next_fertilizer_date DATE,
     INDEX idx_next_watering (next_watering_date),
-    INDEX idx_next_fertilizer (next_fertilizer_date)
+    INDEX idx_next_fertilizer (next_fertilizer_date),
+    INDEX idx_updated_at (updated_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Задачи ухода (полив, прикормка, ...): одна строка на растение и тип ухода.
+-- Колонки next_watering_date/next_fertilizer_date в plants остаются зеркалом для портала,
+-- а планировщик, дашборд и бот ищут просроченный уход только здесь
+CREATE TABLE IF NOT EXISTS care_tasks (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    plant_id INT NOT NULL,
+    task_type VARCHAR(30) NOT NULL,
+    interval_days INT NULL,
+    next_due DATE NULL,
+    last_done_at TIMESTAMP NULL,
+    -- Кто отметил последний срок (ответ «уже выполнено» проигравшей одновременной отметке)
+    last_done_by INT NULL,
+    is_active BOOLEAN DEFAULT TRUE,
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE,
+    FOREIGN KEY (last_done_by) REFERENCES users(id) ON DELETE SET NULL,
+    UNIQUE KEY uq_plant_task (plant_id, task_type),
+    INDEX idx_next_due_active (next_due, is_active)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Ответственные за растения: назначение на растение (plant_id) или на все растения
+-- местоположения (location). position задаёт очередь еженедельной ротации
+CREATE TABLE IF NOT EXISTS plant_assignees (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    plant_id INT NULL,
+    location VARCHAR(255) NULL,
+    user_id INT NOT NULL,
+    position INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_plant_id (plant_id),
+    INDEX idx_location (location)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Таблица настроек системы
@@ -51,7 +92,7 @@ CREATE TABLE IF NOT EXISTS watering_history (
     id INT AUTO_INCREMENT PRIMARY KEY,
     plant_id INT NOT NULL,
     user_id INT NOT NULL,
-    action_type ENUM('watering', 'fertilizer') NOT NULL,
+    action_type VARCHAR(30) NOT NULL,
     watered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     notes TEXT,
     FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE,
@@ -65,9 +106,10 @@ CREATE TABLE IF NOT EXISTS watering_history (
 CREATE TABLE IF NOT EXISTS notification_log (
     id INT AUTO_INCREMENT PRIMARY KEY,
     plant_id INT NOT NULL,
-    notification_type ENUM('watering', 'fertilizer') NOT NULL,
+    notification_type VARCHAR(30) NOT NULL,
     sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     attempt_number INT DEFAULT 1,
+    last_attempt_at TIMESTAMP NULL,
     is_completed BOOLEAN DEFAULT FALSE,
     completed_by_user_id INT NULL,
     completed_at TIMESTAMP NULL,
@@ -78,12 +120,134 @@ CREATE TABLE IF NOT EXISTS notification_log (
     INDEX idx_is_completed (is_completed)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Доставка уведомлений по чатам: повторы не ставятся туда, где сообщение ещё
+-- в очереди, а message_id позволяет править уже отправленное сообщение.
+-- user_id NULL - общий чат (telegram_group_chat_id)
+CREATE TABLE IF NOT EXISTS notification_delivery (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    notification_log_id INT NOT NULL,
+    user_id INT NULL,
+    chat_id VARCHAR(100) NOT NULL,
+    status ENUM('pending', 'sent', 'failed', 'suppressed', 'cancelled') NOT NULL DEFAULT 'pending',
+    message_id BIGINT NULL,
+    -- ID бота пула, отправившего сообщение (правки идут через него же)
+    bot_id VARCHAR(20) NULL,
+    error TEXT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (notification_log_id) REFERENCES notification_log(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_log_chat (notification_log_id, chat_id),
+    INDEX idx_status (status),
+    INDEX idx_updated_at (updated_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Все доставленные сообщения уведомлений (первичные и повторы): после
+-- выполнения они правятся на «выполнено» вместо новых сообщений
+CREATE TABLE IF NOT EXISTS notification_messages (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    notification_log_id INT NOT NULL,
+    chat_id VARCHAR(100) NOT NULL,
+    message_id BIGINT NOT NULL,
+    bot_id VARCHAR(20) NULL,
+    -- image_url фото, если сообщение отправлено с фото (правится подпись)
+    photo VARCHAR(500) NULL,
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (notification_log_id) REFERENCES notification_log(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_chat_message (chat_id, message_id),
+    INDEX idx_log (notification_log_id),
+    INDEX idx_sent_at (sent_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Очередь исходящих сообщений Telegram (transactional outbox).
+-- Планировщик и бот пишут сюда сообщения в той же транзакции, что и изменения
+-- notification_log; доставкой занимается пул воркеров (outbox.py)
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    chat_id VARCHAR(100) NOT NULL,
+    text TEXT NOT NULL,
+    parse_mode VARCHAR(20) NULL,
+    reply_markup TEXT NULL,
+    notification_log_id INT NULL,
+    user_id INT NULL,
+    status ENUM('pending', 'sending', 'sent', 'failed', 'cancelled') NOT NULL DEFAULT 'pending',
+    -- send - новое сообщение, edit - правка сообщения message_id
+    action ENUM('send', 'edit') NOT NULL DEFAULT 'send',
+    message_id BIGINT NULL,
+    -- Обязательный бот пула (для правок), NULL - выбирает outbox.py
+    bot_id VARCHAR(20) NULL,
+    -- image_url фото растения: текст уходит подписью к фото
+    photo VARCHAR(500) NULL,
+    priority INT NOT NULL DEFAULT 0,
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    release_at DATETIME NULL,
+    claimed_at TIMESTAMP NULL,
+    sent_at TIMESTAMP NULL,
+    FOREIGN KEY (notification_log_id) REFERENCES notification_log(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
+    INDEX idx_status_available (status, available_at),
+    INDEX idx_status_release (status, release_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- История тиков планировщика: время фаз, счётчики и пропуски/наложения запусков
+CREATE TABLE IF NOT EXISTS scheduler_runs (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    job_id VARCHAR(50) NOT NULL,
+    node_id VARCHAR(255) NULL,
+    status VARCHAR(20) NOT NULL,
+    started_at DATETIME(3) NOT NULL,
+    finished_at DATETIME(3) NULL,
+    duration_ms INT NULL,
+    phases TEXT NULL,
+    counts TEXT NULL,
+    error TEXT NULL,
+    INDEX idx_started_at (started_at),
+    INDEX idx_job_started (job_id, started_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Узлы планировщика в шардированном режиме (SCHEDULER_MODE=sharded)
+CREATE TABLE IF NOT EXISTS scheduler_nodes (
+    node_id VARCHAR(255) PRIMARY KEY,
+    started_at DATETIME(3) NOT NULL,
+    heartbeat_at DATETIME(3) NOT NULL,
+    INDEX idx_heartbeat_at (heartbeat_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Боты пула (TELEGRAM_EXTRA_BOT_TOKENS), с которыми общался чат: писать
+-- в чат может только бот, которому чат написал; первый бот - закреплённый
+CREATE TABLE IF NOT EXISTS telegram_chat_bots (
+    chat_id VARCHAR(100) NOT NULL,
+    bot_id VARCHAR(20) NOT NULL,
+    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (chat_id, bot_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- file_id фото растений, уже загруженных в Telegram: повторная отправка
+-- ссылается на file_id вместо загрузки файла (file_id свой у каждого бота)
+CREATE TABLE IF NOT EXISTS telegram_files (
+    image_url VARCHAR(500) NOT NULL,
+    bot_id VARCHAR(20) NOT NULL,
+    file_id VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (bot_id, image_url)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- Вставка начальных настроек системы
 INSERT INTO system_settings (setting_key, setting_value, description) VALUES
 ('notification_start_hour', '8', 'Начало времени отправки уведомлений (час)'),
 ('notification_end_hour', '22', 'Конец времени отправки уведомлений (час)'),
 ('notification_retry_interval_minutes', '120', 'Интервал повтора уведомлений (минуты)'),
 ('notification_max_retries', '3', 'Максимальное количество повторов уведомлений'),
+('notification_release_spread_minutes', '30', 'За сколько минут после начала окна распределяются отложенные уведомления'),
+('assignee_rotation', 'none', 'Ротация ответственных за растения: none или weekly'),
+('notification_escalate_after_retries', '2', 'Сколько повторов отправлять только ответственным, прежде чем оповестить всех'),
+('notification_include_photo', 'false', 'Прикладывать фото растения к уведомлениям'),
+('telegram_group_chat_id', '', 'ID общего чата Telegram для уведомлений (пусто - только личные сообщения)'),
 ('timezone', 'Europe/Moscow', 'Часовой пояс системы'),
 ('telegram_bot_token', '', 'Токен Telegram бота')
 ON DUPLICATE KEY UPDATE setting_value=VALUES(setting_value);
@@ -0,0 +1,271 @@
+"""
+Сроки ухода всех растений в памяти для дашборда, API статистики и /status
+"""
+import logging
+import threading
+import time
+import zlib
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import datetime, timedelta
+import events
+from care_tasks import CARE_TASK_TYPES
+from database import CareTask
+
+logger = logging.getLogger(__name__)
+
+# Как часто индекс сверяется с БД контрольными суммами (секунды): так подхватываются
+# изменения, сделанные другими процессами (бот, планировщик, второй экземпляр портала)
+DUE_INDEX_CHECK_INTERVAL = 60
+
+
+def _to_days(value):
+    """Номер дня как у TO_DAYS() в MySQL (для сверки с БД)"""
+    return value.toordinal() + 365
+
+
+def _to_seconds(value):
+    """Секунды как у TO_SECONDS() в MySQL (для сверки с БД)"""
+    return _to_days(value) * 86400 + value.hour * 3600 + value.minute * 60 + value.second
+
+
+class DueStatusIndex:
+    """
+    Активные растения, разложенные по срокам ухода
+
+    Строится одним запросом (CareTask.get_status_rows). Для каждого типа ухода
+    хранится отсортированный по сроку список (срок, название, id), поэтому число
+    растений, требующих ухода сегодня, - один бинарный поиск, а список «требуют
+    ухода» уже упорядочен от самых просроченных. Отметка ухода (событие CARE_DONE)
+    обновляет индекс без запросов, изменение растения (PLANT_CHANGED) - перечитывает
+    одно растение. Раз в DUE_INDEX_CHECK_INTERVAL секунд агрегаты индекса сверяются
+    с CareTask.get_status_fingerprint, и при расхождении индекс перестраивается.
+    В агрегатах есть сумма updated_at растений, поэтому правка любой колонки
+    растения в другом процессе (местоположение, фото, интервалы) тоже замечается.
+    """
+
+    def __init__(self, check_interval=DUE_INDEX_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._plants = {}
+        self._plant_tasks = {}
+        self._due = {}
+        self._watered = Counter()
+        self._plant_list = None
+        self._built_at = None
+        self._checked_at = None
+        self._data_version = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _group(rows):
+        """Строки get_status_rows -> [(растение, {тип ухода: срок})]"""
+        grouped = {}
+        for row in rows:
+            plant_id = row['id']
+            if plant_id not in grouped:
+                plant = {key: value for key, value in row.items() if not key.startswith('due_')}
+                grouped[plant_id] = (plant, {})
+            if row['due_task_type']:
+                grouped[plant_id][1][row['due_task_type']] = row['due_next_due']
+        return list(grouped.values())
+
+    @staticmethod
+    def _task_key(plant, next_due):
+        return (next_due, plant['name'].casefold(), plant['id'])
+
+    def _add(self, plant, tasks):
+        self._plants[plant['id']] = plant
+        self._plant_tasks[plant['id']] = tasks
+        for task_type, next_due in tasks.items():
+            insort(self._due.setdefault(task_type, []), self._task_key(plant, next_due))
+        if plant.get('last_watered_at'):
+            self._watered[plant['last_watered_at'].date()] += 1
+        self._plant_list = None
+
+    def _remove(self, plant_id):
+        plant = self._plants.pop(plant_id, None)
+        if plant is None:
+            return
+        for task_type, next_due in self._plant_tasks.pop(plant_id, {}).items():
+            entries = self._due[task_type]
+            del entries[bisect_left(entries, self._task_key(plant, next_due))]
+        if plant.get('last_watered_at'):
+            day = plant['last_watered_at'].date()
+            self._watered[day] -= 1
+            if not self._watered[day]:
+                del self._watered[day]
+        self._plant_list = None
+
+    def rebuild(self):
+        """Перестроить индекс по всем активным растениям"""
+        grouped = self._group(CareTask.get_status_rows())
+        with self._lock:
+            self._plants, self._plant_tasks, self._due, self._watered = {}, {}, {}, Counter()
+            for plant, tasks in grouped:
+                self._add(plant, tasks)
+            self._built_at = self._checked_at = time.monotonic()
+        logger.info(f"Индекс сроков ухода построен: {len(grouped)} растений")
+
+    def refresh_plant(self, plant_id):
+        """Перечитать одно растение (после изменения на портале)"""
+        if self._built_at is None:
+            return
+        grouped = self._group(CareTask.get_status_rows(plant_id))
+        with self._lock:
+            self._remove(plant_id)
+            for plant, tasks in grouped:
+                self._add(plant, tasks)
+
+    def care_done(self, plant_id, task_type, next_due, done_at):
+        """Перенести срок после отметки ухода (без запросов к БД)"""
+        with self._lock:
+            plant = self._plants.get(plant_id)
+            if plant is None:
+                return
+            # Строки отдаются читателям, поэтому не меняются на месте
+            plant = dict(plant)
+            tasks = dict(self._plant_tasks[plant_id])
+            tasks[task_type] = next_due
+            definition = CARE_TASK_TYPES.get(task_type)
+            if definition and definition.plant_columns:
+                _, next_column, last_column = definition.plant_columns
+                plant[next_column] = next_due
+                plant[last_column] = done_at
+                # Как в CareTask._apply_completion
+                plant['updated_at'] = done_at.replace(microsecond=0)
+            self._remove(plant_id)
+            self._add(plant, tasks)
+
+    def _fingerprint(self):
+        """Те же агрегаты, что CareTask.get_status_fingerprint, по данным индекса"""
+        with self._lock:
+            return {
+                'plants': len(self._plants),
+                'names': sum(zlib.crc32(plant['name'].encode('utf-8')) for plant in self._plants.values()),
+                'watered': sum(_to_days(day) * count for day, count in self._watered.items()),
+                'updated': sum(
+                    _to_seconds(plant['updated_at']) for plant in self._plants.values() if plant.get('updated_at')
+                ),
+                'tasks': {
+                    task_type: (len(entries), sum(_to_days(entry[0]) for entry in entries))
+                    for task_type, entries in self._due.items() if entries
+                },
+            }
+
+    def check(self):
+        """
+        Сверить индекс с БД и перестроить при расхождении
+
+        Returns:
+            True, если индекс совпал с БД
+        """
+        if CareTask.get_status_fingerprint() == self._fingerprint():
+            return True
+        logger.warning("Индекс сроков ухода расходится с БД - перестраиваем")
+        self.rebuild()
+        return False
+
+    def observe_version(self, version):
+        """
+        Версия данных в БД (DataVersion.get) изменилась - сверить индекс сразу
+
+        Иначе изменение из другого процесса попало бы в страницу под новым
+        ETag только после ближайшей плановой сверки.
+        """
+        if version == self._data_version:
+            return
+        self._data_version = version
+        if self._built_at is None:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            self.check()
+        except Exception as e:
+            logger.error(f"Ошибка сверки индекса сроков ухода: {e}")
+
+    def _ensure_fresh(self):
+        if self._built_at is None:
+            with self._lock:
+                if self._built_at is None:
+                    self.rebuild()
+            return
+
+        now = time.monotonic()
+        if now - self._checked_at > self.check_interval:
+            # Сверяет один поток, остальные читают текущий индекс
+            self._checked_at = now
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Ошибка сверки индекса сроков ухода: {e}")
+
+    def _sorted_plants(self):
+        """Растения по алфавиту (под блокировкой; список пересобирается после изменений)"""
+        if self._plant_list is None:
+            self._plant_list = sorted(
+                self._plants.values(), key=lambda plant: (plant['name'].casefold(), plant['id'])
+            )
+        return self._plant_list
+
+    def plants(self):
+        """Все активные растения по алфавиту"""
+        self._ensure_fresh()
+        with self._lock:
+            return self._sorted_plants()
+
+    def total(self):
+        """Число активных растений"""
+        self._ensure_fresh()
+        return len(self._plants)
+
+    def due_counts(self, today=None):
+        """Число растений с наступившим сроком по типам: {task_type: count}"""
+        self._ensure_fresh()
+        boundary = ((today or datetime.now().date()) + timedelta(days=1),)
+        with self._lock:
+            counts = {task_type: bisect_left(entries, boundary) for task_type, entries in self._due.items()}
+        return {task_type: count for task_type, count in counts.items() if count}
+
+    def due(self, task_type, today=None):
+        """Растения с наступившим сроком ухода от самых просроченных (plants.* плюс next_due)"""
+        self._ensure_fresh()
+        boundary = ((today or datetime.now().date()) + timedelta(days=1),)
+        with self._lock:
+            entries = self._due.get(task_type, [])
+            return [
+                {**self._plants[plant_id], 'next_due': next_due}
+                for next_due, _, plant_id in entries[:bisect_left(entries, boundary)]
+            ]
+
+    def ok_plants(self, today=None):
+        """Растения без наступивших сроков ухода, по алфавиту"""
+        today = today or datetime.now().date()
+        self._ensure_fresh()
+        with self._lock:
+            return [
+                plant for plant in self._sorted_plants()
+                if all(next_due > today for next_due in self._plant_tasks[plant['id']].values())
+            ]
+
+    def watered_on(self, day):
+        """Сколько растений последний раз полито в этот день"""
+        self._ensure_fresh()
+        return self._watered.get(day, 0)
+
+    def stats(self, today=None):
+        """Статистика дашборда (/api/dashboard/stats и живые обновления)"""
+        today = today or datetime.now().date()
+        due_counts = self.due_counts(today)
+        return {
+            'total_plants': self.total(),
+            'plants_needing_water': due_counts.get('watering', 0),
+            'plants_needing_fertilizer': due_counts.get('fertilizer', 0),
+            'due_by_task_type': due_counts,
+            'watered_today': self.watered_on(today)
+        }
+
+
+# Глобальный индекс сроков ухода
+due_index = DueStatusIndex()
+events.subscribe(events.PLANT_CHANGED, lambda plant_id: due_index.refresh_plant(plant_id))
+events.subscribe(events.CARE_DONE, due_index.care_done)
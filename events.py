@@ -0,0 +1,42 @@
+"""
+События изменения данных внутри процесса (издатель - подписчики)
+
+Модели публикуют событие после фиксации транзакции, а кеши и индексы
+(список растений бота, поиск растений, сроки ухода, календарь) обновляются по нему, не перечитывая
+всё из БД. События не выходят за пределы процесса: изменения, сделанные
+другим процессом, кеши подхватывают по своему TTL.
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Растение создано, изменено или удалено (plant_id)
+PLANT_CHANGED = 'plant_changed'
+
+# Уход отмечен выполненным (plant_id, task_type, next_due, done_at)
+CARE_DONE = 'care_done'
+
+# Данные пользователя изменены (user_id)
+USER_CHANGED = 'user_changed'
+
+_subscribers = {}
+_lock = threading.Lock()
+
+
+def subscribe(event, handler):
+    """Вызывать handler(**payload) при каждом событии event"""
+    with _lock:
+        _subscribers.setdefault(event, []).append(handler)
+
+
+def publish(event, **payload):
+    """Оповестить подписчиков; ошибка подписчика не мешает остальным и издателю"""
+    with _lock:
+        handlers = list(_subscribers.get(event, ()))
+
+    for handler in handlers:
+        try:
+            handler(**payload)
+        except Exception as e:
+            logger.error(f"Ошибка обработчика события {event}: {e}", exc_info=True)
@@ -0,0 +1,211 @@
+"""
+Живые обновления дашборда: Server-Sent Events вместо периодического опроса
+"""
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+import events
+from care_tasks import CARE_TASK_TYPES
+from config import Config
+from database import DataVersion
+from due_index import due_index
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних сообщений хранится для переподключившихся клиентов (Last-Event-ID)
+LIVE_BUFFER_SIZE = 256
+
+# Пауза перед переподключением EventSource после обрыва (миллисекунды)
+LIVE_RETRY_MS = 5000
+
+
+def _encode(event, data, message_id=None):
+    """Сообщение в формате text/event-stream"""
+    lines = [f"id: {message_id}"] if message_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, ensure_ascii=False, default=str)}"]
+    return '\n'.join(lines) + '\n\n'
+
+
+def _plant_state(plant, due_types, today):
+    """Состояние карточки растения на дашборде: сроки ухода по типам"""
+    tasks = {}
+    for task_type in CARE_TASK_TYPES.values():
+        if not task_type.plant_columns:
+            continue
+        interval_column, next_column, last_column = task_type.plant_columns
+        next_due = plant.get(next_column)
+        tasks[task_type.key] = None if not plant.get(interval_column) else {
+            'next_due': next_due.isoformat() if next_due else None,
+            'days': (next_due - today).days if next_due else None,
+            'last_done_at': plant[last_column].isoformat() if plant.get(last_column) else None,
+        }
+    return {
+        'id': plant['id'],
+        'name': plant['name'],
+        'tasks': tasks,
+        'due': sorted(task_type for task_type, plant_ids in due_types.items() if plant['id'] in plant_ids),
+    }
+
+
+class LiveUpdates:
+    """
+    Рассылка изменений дашборда открытым соединениям SSE
+
+    Один фоновый поток на процесс сверяет версию данных (DataVersion.get) раз в
+    LIVE_UPDATES_POLL_SECONDS и сразу после событий CARE_DONE/PLANT_CHANGED этого
+    процесса. При изменении он сравнивает состояние растений из due_index с
+    предыдущим снимком и публикует сообщения: plant (сроки изменились, уход
+    отмечен или наступил), plant_added, plant_removed и stats. Так отметки из бота,
+    планировщика и других воркеров доходят до браузеров без запросов на каждого
+    клиента. Соединения только ждут на общем условии: сообщение кодируется один
+    раз и хранится в кольцевом буфере, из которого переподключившийся клиент
+    получает пропущенное по Last-Event-ID.
+    """
+
+    def __init__(self, poll_interval=None, heartbeat_interval=None, buffer_size=LIVE_BUFFER_SIZE):
+        self.poll_interval = poll_interval or Config.LIVE_UPDATES_POLL_SECONDS
+        self.heartbeat_interval = heartbeat_interval or Config.LIVE_UPDATES_HEARTBEAT_SECONDS
+        self._messages = deque(maxlen=buffer_size)
+        self._last_id = 0
+        # Номера сообщений свои у каждого процесса: Last-Event-ID другого воркера не подходит
+        self._stream_tag = os.urandom(4).hex()
+        self._changed = threading.Condition()
+        self._wake = threading.Event()
+        self._clients = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._version = None
+        self._day = None
+        self._snapshot = None
+        self._stats = None
+
+    @property
+    def clients(self):
+        """Число открытых соединений"""
+        return self._clients
+
+    def wake(self):
+        """Сверить данные сейчас, не дожидаясь интервала опроса"""
+        self._wake.set()
+
+    def publish(self, event, data):
+        """Разослать сообщение всем соединениям"""
+        with self._changed:
+            self._last_id += 1
+            self._messages.append((self._last_id, _encode(event, data, self._event_id(self._last_id))))
+            self._changed.notify_all()
+
+    def _event_id(self, number):
+        return f"{self._stream_tag}-{number}"
+
+    def _parse_event_id(self, event_id):
+        """Номер сообщения из Last-Event-ID этого процесса или None"""
+        tag, _, number = (event_id or '').partition('-')
+        if tag != self._stream_tag or not number.isdigit():
+            return None
+        return int(number)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="live-updates", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            woken = self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if not self._clients:
+                # Без слушателей снимок устаревает: следующий клиент начнёт с нового
+                self._snapshot = self._stats = None
+                continue
+            try:
+                self.refresh(force=woken)
+            except Exception as e:
+                logger.error(f"Ошибка проверки живых обновлений: {e}")
+
+    def refresh(self, force=False):
+        """Сравнить данные с предыдущим снимком и разослать изменения"""
+        version = DataVersion.get()
+        today = datetime.now().date()
+        if not force and self._snapshot is not None and (version, today) == (self._version, self._day):
+            return
+        self._version, self._day = version, today
+        due_index.observe_version(version)
+
+        due_types = {
+            task_type: {plant['id'] for plant in due_index.due(task_type, today)} for task_type in CARE_TASK_TYPES
+        }
+        snapshot = {plant['id']: _plant_state(plant, due_types, today) for plant in due_index.plants()}
+        stats = due_index.stats(today)
+
+        if self._snapshot is not None:
+            for plant_id, state in snapshot.items():
+                previous = self._snapshot.get(plant_id)
+                if previous is None:
+                    self.publish('plant_added', state)
+                elif previous != state:
+                    self.publish('plant', {
+                        **state,
+                        'done': [
+                            key for key, task in state['tasks'].items()
+                            if task and task['last_done_at'] and task['last_done_at'] != (
+                                (previous['tasks'].get(key) or {}).get('last_done_at'))
+                        ],
+                        'became_due': [key for key in state['due'] if key not in previous['due']],
+                    })
+            for plant_id in self._snapshot.keys() - snapshot.keys():
+                self.publish('plant_removed', {'id': plant_id, 'name': self._snapshot[plant_id]['name']})
+        if stats != self._stats:
+            self.publish('stats', stats)
+        self._snapshot, self._stats = snapshot, stats
+
+    def stream(self, last_event_id=None):
+        """
+        Генератор тела ответа text/event-stream для одного клиента
+
+        Args:
+            last_event_id: Заголовок Last-Event-ID переподключившегося EventSource
+        """
+        self._ensure_started()
+        resume_from = self._parse_event_id(last_event_id)
+        with self._changed:
+            self._clients += 1
+            position = self._last_id
+            if resume_from is not None and resume_from <= self._last_id:
+                position = resume_from
+        self.wake()
+
+        try:
+            yield f"retry: {LIVE_RETRY_MS}\n\n"
+            if self._stats is not None:
+                yield _encode('stats', self._stats)
+            while True:
+                with self._changed:
+                    if position == self._last_id:
+                        self._changed.wait(self.heartbeat_interval)
+                    if self._messages and self._messages[0][0] > position + 1:
+                        # Пропущенное уже вытеснено из буфера - клиенту проще перезагрузить страницу
+                        chunk = _encode('reload', {}, self._event_id(self._last_id))
+                    else:
+                        chunk = ''.join(text for message_id, text in self._messages if message_id > position)
+                    position = self._last_id
+                # Комментарий-пинг: прокси не закрывает соединение, а закрытая вкладка
+                # обнаруживается ошибкой записи
+                yield chunk or ": ping\n\n"
+        finally:
+            with self._changed:
+                self._clients -= 1
+
+
+# Глобальная рассылка живых обновлений (поток запускается при первом подключении)
+live_updates = LiveUpdates()
+events.subscribe(
+    events.CARE_DONE,
+    lambda plant_id, task_type, next_due, done_at: live_updates.wake()
+)
+events.subscribe(events.PLANT_CHANGED, lambda plant_id: live_updates.wake())
@@ -0,0 +1,27 @@
+-- Миграция для существующих баз: очередь исходящих сообщений (outbox)
+-- Применение: mysql -u root -p plant_watering < migrations/001_outbox.sql
+USE plant_watering;
+
+-- Колонка используется планировщиком повторов, но отсутствовала в исходной схеме.
+-- Если колонка уже добавлена вручную, эту команду можно пропустить
+ALTER TABLE notification_log ADD COLUMN last_attempt_at TIMESTAMP NULL AFTER attempt_number;
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    chat_id VARCHAR(100) NOT NULL,
+    text TEXT NOT NULL,
+    parse_mode VARCHAR(20) NULL,
+    reply_markup TEXT NULL,
+    notification_log_id INT NULL,
+    user_id INT NULL,
+    status ENUM('pending', 'sending', 'sent', 'failed') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    claimed_at TIMESTAMP NULL,
+    sent_at TIMESTAMP NULL,
+    FOREIGN KEY (notification_log_id) REFERENCES notification_log(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
+    INDEX idx_status_available (status, available_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
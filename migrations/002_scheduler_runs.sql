@@ -0,0 +1,18 @@
+-- Миграция для существующих баз: история тиков планировщика
+-- Применение: mysql -u root -p plant_watering < migrations/002_scheduler_runs.sql
+USE plant_watering;
+
+CREATE TABLE IF NOT EXISTS scheduler_runs (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    job_id VARCHAR(50) NOT NULL,
+    node_id VARCHAR(255) NULL,
+    status VARCHAR(20) NOT NULL,
+    started_at DATETIME(3) NOT NULL,
+    finished_at DATETIME(3) NULL,
+    duration_ms INT NULL,
+    phases TEXT NULL,
+    counts TEXT NULL,
+    error TEXT NULL,
+    INDEX idx_started_at (started_at),
+    INDEX idx_job_started (job_id, started_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,10 @@
+-- Миграция для существующих баз: узлы шардированного планировщика
+-- Применение: mysql -u root -p plant_watering < migrations/003_scheduler_nodes.sql
+USE plant_watering;
+
+CREATE TABLE IF NOT EXISTS scheduler_nodes (
+    node_id VARCHAR(255) PRIMARY KEY,
+    started_at DATETIME(3) NOT NULL,
+    heartbeat_at DATETIME(3) NOT NULL,
+    INDEX idx_heartbeat_at (heartbeat_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,13 @@
+-- Миграция для существующих баз: отложенная до окна уведомлений доставка
+-- Применение: mysql -u root -p plant_watering < migrations/004_outbox_release.sql
+USE plant_watering;
+
+ALTER TABLE outbox
+    MODIFY status ENUM('pending', 'sending', 'sent', 'failed', 'cancelled') NOT NULL DEFAULT 'pending',
+    ADD COLUMN priority INT NOT NULL DEFAULT 0 AFTER status,
+    ADD COLUMN release_at DATETIME NULL AFTER available_at,
+    ADD INDEX idx_status_release (status, release_at);
+
+INSERT INTO system_settings (setting_key, setting_value, description) VALUES
+('notification_release_spread_minutes', '30', 'За сколько минут после начала окна распределяются отложенные уведомления')
+ON DUPLICATE KEY UPDATE setting_key = setting_key;
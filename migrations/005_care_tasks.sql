@@ -0,0 +1,34 @@
+-- Миграция для существующих баз: общие задачи ухода вместо колонок по типам
+-- Применение: mysql -u root -p plant_watering < migrations/005_care_tasks.sql
+USE plant_watering;
+
+-- Типы ухода задаются в care_tasks.py, поэтому ENUM заменяются строками
+ALTER TABLE watering_history MODIFY action_type VARCHAR(30) NOT NULL;
+ALTER TABLE notification_log MODIFY notification_type VARCHAR(30) NOT NULL;
+
+CREATE TABLE IF NOT EXISTS care_tasks (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    plant_id INT NOT NULL,
+    task_type VARCHAR(30) NOT NULL,
+    interval_days INT NULL,
+    next_due DATE NULL,
+    last_done_at TIMESTAMP NULL,
+    is_active BOOLEAN DEFAULT TRUE,
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_plant_task (plant_id, task_type),
+    INDEX idx_next_due_active (next_due, is_active)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Задачи ухода из колонок plants (повторный запуск безопасен)
+INSERT INTO care_tasks (plant_id, task_type, interval_days, next_due, last_done_at, is_active)
+SELECT id, 'watering', watering_interval_days, next_watering_date, last_watered_at, TRUE
+FROM plants
+ON DUPLICATE KEY UPDATE interval_days = VALUES(interval_days), next_due = VALUES(next_due),
+    last_done_at = VALUES(last_done_at), is_active = VALUES(is_active);
+
+INSERT INTO care_tasks (plant_id, task_type, interval_days, next_due, last_done_at, is_active)
+SELECT id, 'fertilizer', fertilizer_interval_days, next_fertilizer_date, last_fertilized_at,
+    fertilizer_interval_days IS NOT NULL
+FROM plants
+ON DUPLICATE KEY UPDATE interval_days = VALUES(interval_days), next_due = VALUES(next_due),
+    last_done_at = VALUES(last_done_at), is_active = VALUES(is_active);
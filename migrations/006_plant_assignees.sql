@@ -0,0 +1,21 @@
+-- Миграция для существующих баз: ответственные за растения и эскалация уведомлений
+-- Применение: mysql -u root -p plant_watering < migrations/006_plant_assignees.sql
+USE plant_watering;
+
+CREATE TABLE IF NOT EXISTS plant_assignees (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    plant_id INT NULL,
+    location VARCHAR(255) NULL,
+    user_id INT NOT NULL,
+    position INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (plant_id) REFERENCES plants(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_plant_id (plant_id),
+    INDEX idx_location (location)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT INTO system_settings (setting_key, setting_value, description) VALUES
+('assignee_rotation', 'none', 'Ротация ответственных за растения: none или weekly'),
+('notification_escalate_after_retries', '2', 'Сколько повторов отправлять только ответственным, прежде чем оповестить всех')
+ON DUPLICATE KEY UPDATE setting_key = setting_key;
@@ -0,0 +1,24 @@
+-- Миграция для существующих баз: доставка уведомлений по получателям
+-- Применение: mysql -u root -p plant_watering < migrations/007_notification_delivery.sql
+USE plant_watering;
+
+ALTER TABLE users
+    ADD COLUMN telegram_suppressed_at TIMESTAMP NULL AFTER receive_notifications,
+    ADD COLUMN telegram_suppressed_reason TEXT NULL AFTER telegram_suppressed_at;
+
+CREATE TABLE IF NOT EXISTS notification_delivery (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    notification_log_id INT NOT NULL,
+    user_id INT NOT NULL,
+    chat_id VARCHAR(100) NOT NULL,
+    status ENUM('pending', 'sent', 'failed', 'suppressed', 'cancelled') NOT NULL DEFAULT 'pending',
+    message_id BIGINT NULL,
+    error TEXT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (notification_log_id) REFERENCES notification_log(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_log_user (notification_log_id, user_id),
+    INDEX idx_status (status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
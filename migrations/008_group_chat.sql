@@ -0,0 +1,20 @@
+-- Миграция для существующих баз: уведомления в общий чат Telegram и правка сообщений
+-- Применение: mysql -u root -p plant_watering < migrations/008_group_chat.sql
+USE plant_watering;
+
+ALTER TABLE users
+    ADD COLUMN dm_notifications BOOLEAN DEFAULT FALSE AFTER receive_notifications;
+
+-- Доставка учитывается по чатам: у общего чата нет пользователя
+ALTER TABLE notification_delivery
+    MODIFY user_id INT NULL,
+    ADD UNIQUE KEY uq_log_chat (notification_log_id, chat_id),
+    DROP INDEX uq_log_user;
+
+ALTER TABLE outbox
+    ADD COLUMN action ENUM('send', 'edit') NOT NULL DEFAULT 'send' AFTER status,
+    ADD COLUMN message_id BIGINT NULL AFTER action;
+
+INSERT INTO system_settings (setting_key, setting_value, description) VALUES
+('telegram_group_chat_id', '', 'ID общего чата Telegram для уведомлений (пусто - только личные сообщения)')
+ON DUPLICATE KEY UPDATE setting_key = setting_key;
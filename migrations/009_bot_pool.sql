@@ -0,0 +1,17 @@
+-- Миграция для существующих баз: пул Telegram-ботов
+-- Применение: mysql -u root -p plant_watering < migrations/009_bot_pool.sql
+USE plant_watering;
+
+ALTER TABLE outbox
+    ADD COLUMN bot_id VARCHAR(20) NULL AFTER message_id;
+
+ALTER TABLE notification_delivery
+    ADD COLUMN bot_id VARCHAR(20) NULL AFTER message_id;
+
+CREATE TABLE IF NOT EXISTS telegram_chat_bots (
+    chat_id VARCHAR(100) NOT NULL,
+    bot_id VARCHAR(20) NOT NULL,
+    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (chat_id, bot_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,21 @@
+-- Миграция для существующих баз: все доставленные сообщения уведомлений
+-- Применение: mysql -u root -p plant_watering < migrations/010_notification_messages.sql
+USE plant_watering;
+
+CREATE TABLE IF NOT EXISTS notification_messages (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    notification_log_id INT NOT NULL,
+    chat_id VARCHAR(100) NOT NULL,
+    message_id BIGINT NOT NULL,
+    bot_id VARCHAR(20) NULL,
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (notification_log_id) REFERENCES notification_log(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_chat_message (chat_id, message_id),
+    INDEX idx_log (notification_log_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Последние сообщения уже доставленных уведомлений
+INSERT IGNORE INTO notification_messages (notification_log_id, chat_id, message_id, bot_id, sent_at)
+SELECT notification_log_id, chat_id, message_id, bot_id, updated_at
+FROM notification_delivery
+WHERE message_id IS NOT NULL;
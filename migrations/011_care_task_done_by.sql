@@ -0,0 +1,7 @@
+-- Миграция для существующих баз: автор последней отметки ухода
+-- Применение: mysql -u root -p plant_watering < migrations/011_care_task_done_by.sql
+USE plant_watering;
+
+ALTER TABLE care_tasks
+    ADD COLUMN last_done_by INT NULL AFTER last_done_at,
+    ADD FOREIGN KEY (last_done_by) REFERENCES users(id) ON DELETE SET NULL;
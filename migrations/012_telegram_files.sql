@@ -0,0 +1,21 @@
+-- Миграция для существующих баз: фото растений в уведомлениях и кеш file_id
+-- Применение: mysql -u root -p plant_watering < migrations/012_telegram_files.sql
+USE plant_watering;
+
+ALTER TABLE outbox
+    ADD COLUMN photo VARCHAR(500) NULL AFTER bot_id;
+
+ALTER TABLE notification_messages
+    ADD COLUMN photo VARCHAR(500) NULL AFTER bot_id;
+
+CREATE TABLE IF NOT EXISTS telegram_files (
+    image_url VARCHAR(500) NOT NULL,
+    bot_id VARCHAR(20) NOT NULL,
+    file_id VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (bot_id, image_url)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT INTO system_settings (setting_key, setting_value, description) VALUES
+('notification_include_photo', 'false', 'Прикладывать фото растения к уведомлениям')
+ON DUPLICATE KEY UPDATE setting_key = setting_key;
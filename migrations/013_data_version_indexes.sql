@@ -0,0 +1,7 @@
+-- Миграция для существующих баз: индексы для версии данных (DataVersion.get)
+-- Применение: mysql -u root -p plant_watering < migrations/013_data_version_indexes.sql
+USE plant_watering;
+
+ALTER TABLE plants ADD INDEX idx_updated_at (updated_at);
+
+ALTER TABLE users ADD INDEX idx_updated_at (updated_at);
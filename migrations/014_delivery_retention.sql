@@ -0,0 +1,7 @@
+-- Миграция для существующих баз: индексы для очистки истории доставки (OUTBOX_RETENTION_DAYS)
+-- Применение: mysql -u root -p plant_watering < migrations/014_delivery_retention.sql
+USE plant_watering;
+
+ALTER TABLE notification_delivery ADD INDEX idx_updated_at (updated_at);
+
+ALTER TABLE notification_messages ADD INDEX idx_sent_at (sent_at);
@@ -0,0 +1,146 @@
+"""
+Общие шаблоны уведомлений о поливе и прикормке для планировщика и бота
+"""
+import threading
+from functools import lru_cache
+import pytz
+from care_tasks import CARE_TASK_TYPES
+
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+# Сколько шаблонов повторов можно настроить на странице настроек
+RETRY_TEMPLATE_COUNT = 5
+
+
+def get_moscow_time():
+    """Получить текущее московское время"""
+    from datetime import datetime
+    return datetime.now(MOSCOW_TZ)
+
+
+@lru_cache(maxsize=4096)
+def _plant_body(name, location, description):
+    """Часть сообщения о растении (не зависит от типа и номера попытки)"""
+    body = f"🌿 Растение: **{name}**\n"
+    if location:
+        body += f"📍 Местоположение: {location}\n"
+    if description:
+        body += f"ℹ️ {description}\n"
+    return body
+
+
+class NotificationTemplates:
+    """
+    Скомпилированные шаблоны для одной версии системных настроек
+
+    Заголовки для всех типов и номеров попыток (включая замены для прикормки)
+    строятся один раз при компиляции, поэтому отрисовка сообщения сводится
+    к склейке трёх готовых частей.
+    """
+
+    def __init__(self, settings, version=None):
+        self.version = version
+        self.include_photo = settings.get('notification_include_photo') == 'true'
+        self._headers = {}
+
+        for notif_type, task_type in CARE_TASK_TYPES.items():
+            self._headers[(notif_type, 0)] = task_type.first_header
+            for attempt in range(1, RETRY_TEMPLATE_COUNT + 1):
+                retry_message = settings.get(f'retry_message_{attempt}', '')
+                self._headers[(notif_type, attempt)] = self._compile_retry_header(
+                    notif_type, attempt, retry_message
+                )
+
+    @staticmethod
+    def _compile_retry_header(notif_type, attempt, retry_message):
+        """Собрать заголовок повторного уведомления"""
+        task_type = CARE_TASK_TYPES[notif_type]
+        if retry_message:
+            for old, new in task_type.retry_replacements:
+                retry_message = retry_message.replace(old, new)
+            return f"{retry_message}\n\n"
+        return f"⚠️ Напоминание #{attempt}: растение всё ещё ждёт {task_type.action_genitive}!\n\n"
+
+    def header(self, notif_type, attempt):
+        """Заголовок для типа уведомления и номера попытки"""
+        header = self._headers.get((notif_type, attempt))
+        if header is None:
+            # Попыток больше, чем настраиваемых шаблонов
+            header = self._compile_retry_header(notif_type, attempt, '')
+            self._headers[(notif_type, attempt)] = header
+        return header
+
+    def render(self, plant, notif_type, attempt, now=None):
+        """Отрисовать текст уведомления для растения"""
+        now = now or get_moscow_time()
+        return (
+            self.header(notif_type, attempt)
+            + _plant_body(plant['name'], plant.get('location'), plant.get('description'))
+            + _footer(now.strftime('%d.%m.%Y %H:%M'))
+        )
+
+    def photo(self, plant):
+        """Фото растения для уведомления (image_url) или None, если фото не прикладывается"""
+        if self.include_photo:
+            return plant.get('image_url') or None
+        return None
+
+    @staticmethod
+    def reply_markup(notif_type, plant_id, log_id):
+        """Клавиатура уведомления в виде dict (для хранения в outbox)"""
+        task_type = CARE_TASK_TYPES[notif_type]
+        callback_data = f"{task_type.callback_prefix}_{plant_id}_{log_id}"
+        return {'inline_keyboard': [[{'text': task_type.button_text, 'callback_data': callback_data}]]}
+
+    @staticmethod
+    def keyboard(notif_type, plant_id, log_id):
+        """Клавиатура уведомления для прямой отправки ботом"""
+        return _keyboard(notif_type, plant_id, log_id)
+
+
+def render_completion(plant_name, notif_type, user_name, now=None):
+    """Текст уведомления после выполнения ухода (им заменяется сообщение с кнопкой)"""
+    now = now or get_moscow_time()
+    return (
+        f"✅ {user_name} {CARE_TASK_TYPES[notif_type].action_past} растение **{plant_name}**\n"
+        f"Дата: {now.strftime('%d.%m.%Y %H:%M')}"
+    )
+
+
+@lru_cache(maxsize=1024)
+def _footer(timestamp):
+    """Строка с датой уведомления (одна на минуту)"""
+    return f"\n⏰ Дата уведомления: {timestamp}"
+
+
+@lru_cache(maxsize=1024)
+def _keyboard(notif_type, plant_id, log_id):
+    """InlineKeyboardMarkup неизменяем, поэтому один объект отдаётся всем получателям"""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    task_type = CARE_TASK_TYPES[notif_type]
+    return InlineKeyboardMarkup([[InlineKeyboardButton(
+        task_type.button_text, callback_data=f"{task_type.callback_prefix}_{plant_id}_{log_id}"
+    )]])
+
+
+_templates = None
+_templates_lock = threading.Lock()
+
+
+def get_notification_templates():
+    """
+    Получить шаблоны для текущей версии настроек
+
+    Версия проверяется одним лёгким запросом; перекомпиляция выполняется,
+    только если настройки изменились (например, на странице настроек).
+    """
+    global _templates
+    from database import SystemSettings
+
+    version = SystemSettings.get_version()
+    with _templates_lock:
+        if _templates is None or _templates.version != version:
+            settings = {s['setting_key']: s['setting_value'] for s in SystemSettings.get_all()}
+            _templates = NotificationTemplates(settings, version)
+        return _templates
@@ -0,0 +1,377 @@
+"""
+Пул воркеров для доставки сообщений из очереди outbox в Telegram
+"""
+import asyncio
+import json
+import logging
+import threading
+from contextlib import AsyncExitStack
+from bot_pool import bot_pool
+from config import Config
+from database import NotificationDelivery, Outbox, User
+from telegram_files import UPLOAD_WAIT_SECONDS, image_path, telegram_file_cache
+
+logger = logging.getLogger(__name__)
+
+
+# Пауза между сообщениями при разовой доставке deliver_batch (секунды);
+# в пуле частоту ограничивают лимиты ботов (TELEGRAM_BOT_RATE)
+SEND_PAUSE = 0.1
+
+# Ошибки BadRequest, означающие, что чата нет (в отличие от ошибок в самом сообщении)
+CHAT_GONE_ERRORS = ('chat not found', 'user not found', 'chat_id is empty', 'peer_id_invalid')
+
+# Ошибки BadRequest, означающие, что сохранённый file_id фото больше не принимается
+FILE_ID_ERRORS = ('wrong file identifier', 'file reference', 'wrong remote file')
+
+# Максимальная длина подписи к фото; более длинное уведомление уходит без фото
+CAPTION_LIMIT = 1024
+
+
+class OutboxSender:
+    """
+    Пул потоков-отправителей
+
+    Каждый поток держит свой event loop и экземпляры Bot для всех токенов пула
+    (bot_pool.py): бот для сообщения выбирается по закреплению чата, а частоту
+    отправки каждого бота ограничивает его лимит, общий для потоков. Внутри потока
+    захватчик забирает пачки сообщений через SELECT ... FOR UPDATE SKIP LOCKED
+    и кладёт их в ограниченную asyncio.Queue, а несколько корутин-отправителей
+    (OUTBOX_CONCURRENCY) параллельно отправляют сообщения из неё. Когда очередь
+    заполнена, захватчик ждёт, поэтому в памяти и в статусе 'sending' находится
+    не больше пачки сообщений на поток, а остальные доступны другим воркерам.
+    Пропускная способность растёт добавлением потоков (OUTBOX_WORKERS) или
+    процессов (run_outbox.py): пачки разных воркеров не пересекаются.
+    """
+
+    def __init__(self, workers=None, batch_size=None, concurrency=None, pool=None, files=None):
+        self.pool = pool or bot_pool
+        self.files = files or telegram_file_cache
+        self.workers = workers or Config.OUTBOX_WORKERS
+        self.batch_size = batch_size or Config.OUTBOX_BATCH_SIZE
+        self.concurrency = concurrency or Config.OUTBOX_CONCURRENCY
+        self.is_running = False
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._wakeups = []
+        self._wakeups_lock = threading.Lock()
+
+    def start(self):
+        """Запустить потоки-отправители"""
+        if self.is_running:
+            logger.warning("Пул отправителей outbox уже запущен")
+            return
+
+        if not self.pool.tokens:
+            logger.warning("Telegram бот не настроен, отправка из outbox не запущена")
+            return
+
+        self._stop_event.clear()
+        self._threads = []
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._run_worker,
+                args=(index,),
+                name=f"outbox-sender-{index}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        self.is_running = True
+        logger.info(f"Пул отправителей outbox запущен ({self.workers} воркеров, "
+                    f"{self.concurrency} отправителей в каждом, ботов: {len(self.pool.tokens)})")
+
+    def stop(self, timeout=10):
+        """Остановить потоки после отправки уже захваченных сообщений"""
+        if not self.is_running:
+            return
+
+        self._stop_event.set()
+        self.wake()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        self.is_running = False
+        logger.info("Пул отправителей outbox остановлен")
+
+    def wake(self):
+        """
+        Разбудить захватчики: в outbox появились новые сообщения
+
+        Вызывается планировщиком после каждой зафиксированной транзакции, чтобы
+        первое сообщение уходило сразу, а не после OUTBOX_POLL_SECONDS. Без
+        запущенных потоков (например, в процессе бота) ничего не делает.
+        """
+        with self._wakeups_lock:
+            wakeups = list(self._wakeups)
+
+        for loop, event in wakeups:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Цикл потока уже закрыт
+                pass
+
+    def _run_worker(self, index):
+        """Точка входа потока: собственный event loop на весь срок жизни"""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._worker_loop(index))
+        except Exception as e:
+            logger.error(f"Воркер outbox #{index} остановился с ошибкой: {e}", exc_info=True)
+        finally:
+            loop.close()
+
+    async def _worker_loop(self, index):
+        """Захватчик и отправители одного потока"""
+        from telegram import Bot
+
+        wakeup = asyncio.Event()
+        registration = (asyncio.get_running_loop(), wakeup)
+        with self._wakeups_lock:
+            self._wakeups.append(registration)
+
+        queue = asyncio.Queue(maxsize=self.batch_size)
+        try:
+            async with AsyncExitStack() as stack:
+                bots = {}
+                for token in self.pool.tokens:
+                    bots[self.pool.bot_id_of(token)] = await stack.enter_async_context(
+                        Bot(token=token, **self.pool.api_urls())
+                    )
+
+                senders = [
+                    asyncio.create_task(self._sender_loop(bots, queue))
+                    for _ in range(self.concurrency)
+                ]
+                try:
+                    await self._claim_loop(index, queue, wakeup)
+                    # Доотправляем уже захваченные сообщения
+                    await queue.join()
+                finally:
+                    for task in senders:
+                        task.cancel()
+                    await asyncio.gather(*senders, return_exceptions=True)
+        finally:
+            with self._wakeups_lock:
+                self._wakeups.remove(registration)
+
+    async def _claim_loop(self, index, queue, wakeup):
+        """Захватывать пачки и передавать их отправителям"""
+        while not self._stop_event.is_set():
+            wakeup.clear()
+            try:
+                rows = Outbox.claim_batch(self.batch_size, Config.OUTBOX_STALE_SECONDS)
+            except Exception as e:
+                logger.error(f"Воркер outbox #{index}: ошибка захвата сообщений: {e}")
+                rows = []
+
+            # put ждёт свободного места: захват не обгоняет отправку
+            for row in rows:
+                await queue.put(row)
+
+            if not rows:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), Config.OUTBOX_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _sender_loop(self, bots, queue):
+        """Отправлять сообщения из очереди потока (частоту ограничивают лимиты ботов)"""
+        while True:
+            row = await queue.get()
+            try:
+                await self._deliver(bots, row)
+            except Exception as e:
+                # Сообщение останется в 'sending' и будет захвачено повторно
+                logger.error(f"Ошибка записи результата outbox #{row['id']}: {e}")
+            finally:
+                queue.task_done()
+
+    async def deliver_batch(self, bot, pause=SEND_PAUSE):
+        """
+        Захватить и последовательно отправить одну пачку сообщений
+
+        Используется для разовой доставки вне пула (например, в симуляции).
+
+        Args:
+            bot: Экземпляр telegram.Bot (или совместимый объект, например в симуляции)
+                либо словарь {bot_id: bot}
+            pause: Задержка между отправками в секундах
+
+        Returns:
+            Количество обработанных сообщений
+        """
+        bots = bot if isinstance(bot, dict) else {self.pool.primary_id: bot}
+        rows = Outbox.claim_batch(self.batch_size, Config.OUTBOX_STALE_SECONDS)
+        for row in rows:
+            await self._deliver(bots, row)
+
+            # Небольшая задержка между отправками
+            if pause:
+                await asyncio.sleep(pause)
+        return len(rows)
+
+    async def _deliver(self, bots, row):
+        """Отправить одно сообщение через выбранного бота пула и записать результат"""
+        from telegram import InlineKeyboardMarkup
+        from telegram.error import BadRequest, Forbidden, RetryAfter
+
+        bot_id = self.pool.choose(row['chat_id'], row['bot_id'])
+        if bot_id not in bots:
+            if row['bot_id']:
+                # Правка сообщения бота, которого больше нет в пуле
+                Outbox.mark_failed(row['id'], f"бот {bot_id} не настроен")
+                return
+            bot_id = next(iter(bots))
+        bot = bots[bot_id]
+
+        # Ждём свой слот: лимит одного бота не тормозит отправку через остальных
+        delay = self.pool.reserve(bot_id)
+        if delay:
+            await asyncio.sleep(delay)
+
+        attempts = row['attempts'] + 1
+        reply_markup = None
+        if row['reply_markup']:
+            reply_markup = InlineKeyboardMarkup.de_json(json.loads(row['reply_markup']), bot)
+
+        try:
+            if row['action'] == 'edit':
+                await self._edit(bot, row, reply_markup)
+                Outbox.mark_sent(row['id'])
+                logger.info(f"Сообщение {row['message_id']} в чате {row['chat_id']} изменено (outbox #{row['id']})")
+                return
+
+            message, photo = await self._send(bot, bot_id, row, reply_markup)
+            Outbox.mark_sent(row['id'])
+            self._record_delivery(
+                row, 'sent', message_id=getattr(message, 'message_id', None), bot_id=bot_id, photo=photo
+            )
+            logger.info(f"Сообщение outbox #{row['id']} отправлено в чат {row['chat_id']}")
+        except RetryAfter as e:
+            # Ограничение частоты не считается ошибкой сообщения
+            self.pool.penalize(bot_id, e.retry_after)
+            Outbox.mark_retry(row['id'], str(e), e.retry_after)
+        except (Forbidden, BadRequest) as e:
+            if row['photo'] and any(text in str(e).lower() for text in FILE_ID_ERRORS):
+                # file_id устарел: при следующей попытке фото загрузится заново
+                self.files.forget(row['photo'], bot_id)
+                Outbox.mark_retry(row['id'], str(e), 0)
+                return
+
+            chat_gone = isinstance(e, Forbidden) or any(text in str(e).lower() for text in CHAT_GONE_ERRORS)
+            if chat_gone and not row['bot_id'] and self.pool.forget_chat(row['chat_id'], bot_id):
+                # Чат недоступен через этого бота, но общался с другими ботами пула
+                Outbox.mark_retry(row['id'], str(e), 0)
+                return
+
+            # Бот заблокирован, чат не найден, неверная разметка - повтор не поможет
+            Outbox.mark_failed(row['id'], str(e))
+            logger.error(f"Сообщение outbox #{row['id']} не доставлено в чат {row['chat_id']}: {e}")
+            if chat_gone:
+                # Чат недоступен навсегда: не тратим на него запросы до /start или смены ID
+                self._record_delivery(row, 'suppressed', error=str(e))
+                if User.suppress_telegram(row['chat_id'], str(e)):
+                    logger.warning(f"Доставка в чат {row['chat_id']} остановлена: {e}")
+            else:
+                self._record_delivery(row, 'failed', error=str(e))
+        except Exception as e:
+            if attempts >= Config.OUTBOX_MAX_ATTEMPTS:
+                Outbox.mark_failed(row['id'], str(e))
+                self._record_delivery(row, 'failed', error=str(e))
+                logger.error(f"Сообщение outbox #{row['id']} не доставлено после {attempts} попыток: {e}")
+            else:
+                Outbox.mark_retry(row['id'], str(e), 2 ** attempts)
+
+    async def _send(self, bot, bot_id, row, reply_markup):
+        """
+        Отправить новое сообщение; с фото растения текст уходит подписью
+
+        Фото загружается в Telegram один раз на бота: дальше отправка ссылается
+        на сохранённый file_id, поэтому трафик и время отправки не растут с числом
+        получателей и повторов. Пока фото загружается, остальные отправители
+        процесса ждут его file_id. Без файла на диске или со слишком длинным
+        текстом отправляется обычное сообщение.
+
+        Returns:
+            (сообщение, image_url фото или None)
+        """
+        photo = row['photo']
+        if photo and len(row['text']) <= CAPTION_LIMIT:
+            file_id = self.files.get(photo, bot_id)
+            if not file_id and image_path(photo):
+                uploader, event = self.files.start_upload(photo, bot_id)
+                if not uploader:
+                    await asyncio.to_thread(event.wait, UPLOAD_WAIT_SECONDS)
+                    file_id = self.files.get(photo, bot_id)
+                if not file_id:
+                    try:
+                        with open(image_path(photo), 'rb') as file:
+                            message = await bot.send_photo(
+                                chat_id=row['chat_id'], photo=file, caption=row['text'],
+                                reply_markup=reply_markup, parse_mode=row['parse_mode']
+                            )
+                    finally:
+                        if uploader:
+                            self.files.finish_upload(photo, bot_id)
+                    if message.photo:
+                        self.files.put(photo, bot_id, message.photo[-1].file_id)
+                    return message, photo
+            if file_id:
+                message = await bot.send_photo(
+                    chat_id=row['chat_id'], photo=file_id, caption=row['text'],
+                    reply_markup=reply_markup, parse_mode=row['parse_mode']
+                )
+                return message, photo
+
+        message = await bot.send_message(
+            chat_id=row['chat_id'],
+            text=row['text'],
+            reply_markup=reply_markup,
+            parse_mode=row['parse_mode']
+        )
+        return message, None
+
+    @staticmethod
+    async def _edit(bot, row, reply_markup):
+        """Изменить ранее отправленное сообщение (без reply_markup кнопки убираются)"""
+        from telegram.error import BadRequest
+
+        try:
+            if row['photo']:
+                # У сообщения с фото правится подпись
+                await bot.edit_message_caption(
+                    chat_id=row['chat_id'],
+                    message_id=row['message_id'],
+                    caption=row['text'],
+                    reply_markup=reply_markup,
+                    parse_mode=row['parse_mode']
+                )
+                return
+            await bot.edit_message_text(
+                chat_id=row['chat_id'],
+                message_id=row['message_id'],
+                text=row['text'],
+                reply_markup=reply_markup,
+                parse_mode=row['parse_mode']
+            )
+        except BadRequest as e:
+            # Сообщение уже в нужном виде (например, его изменил обработчик кнопки)
+            if 'message is not modified' not in str(e).lower():
+                raise
+
+    @staticmethod
+    def _record_delivery(row, status, message_id=None, error=None, bot_id=None, photo=None):
+        """Записать результат в notification_delivery (только для отправки уведомлений)"""
+        if row['notification_log_id'] and row['action'] == 'send':
+            NotificationDelivery.update_status(
+                row['notification_log_id'], row['chat_id'], status,
+                message_id=message_id, error=error, bot_id=bot_id, photo=photo
+            )
+
+
+# Глобальный пул отправителей
+outbox_sender = OutboxSender()
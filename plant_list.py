@@ -0,0 +1,106 @@
+"""
+Кешированный список растений для постраничного /plants в боте
+"""
+import logging
+import threading
+import time
+import zlib
+import events
+from database import Plant
+
+logger = logging.getLogger(__name__)
+
+# Как долго список считается актуальным (секунды)
+PLANT_LIST_TTL = 60
+
+# Растений на одной странице /plants
+PLANTS_PAGE_SIZE = 8
+
+
+def location_key(location):
+    """
+    Короткий ключ местоположения для callback_data (до 64 байт целиком)
+
+    Сами названия не помещаются в callback_data, а порядковый номер
+    сбивается при изменении списка, поэтому используется crc32 названия.
+    """
+    return format(zlib.crc32(location.strip().lower().encode('utf-8')), '08x')
+
+
+class PlantListCache:
+    """
+    Отсортированный по названию список активных растений
+
+    Перечитывается из БД не чаще раза в PLANT_LIST_TTL секунд, поэтому
+    листание страниц и фильтр по местоположению не обращаются к БД.
+    Растение, добавленное на портале, появится в списке не позже чем через TTL.
+    """
+
+    def __init__(self, ttl=PLANT_LIST_TTL):
+        self.ttl = ttl
+        self._plants = []
+        self._locations = {}
+        self._by_location = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at <= self.ttl:
+                return
+            try:
+                plants = Plant.get_all() or []
+            except Exception as e:
+                logger.error(f"Ошибка загрузки списка растений: {e}")
+                if self._loaded_at is None:
+                    raise
+                # Лучше показать устаревший список, чем ошибку
+                return
+            self._plants = sorted(
+                ({'id': p['id'], 'name': p['name'], 'location': (p.get('location') or '').strip()} for p in plants),
+                key=lambda p: (p['name'].casefold(), p['id'])
+            )
+            # Растения по местоположениям - фильтр отдаёт готовый список
+            by_location = {}
+            names = {}
+            for plant in self._plants:
+                if plant['location']:
+                    key = location_key(plant['location'])
+                    by_location.setdefault(key, []).append(plant)
+                    names.setdefault(key, plant['location'])
+            self._by_location = by_location
+            self._locations = dict(sorted(names.items(), key=lambda item: item[1].casefold()))
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Перечитать список при следующем обращении"""
+        with self._lock:
+            self._loaded_at = None
+
+    def locations(self):
+        """{ключ: название} местоположений по алфавиту"""
+        self._ensure_loaded()
+        return self._locations
+
+    def page(self, page, loc_key=None, page_size=PLANTS_PAGE_SIZE):
+        """
+        Страница списка
+
+        Args:
+            page: Номер страницы с нуля (выходящий за границы приводится к крайней)
+            loc_key: Ключ местоположения (location_key) или None - все растения
+
+        Returns:
+            (растения страницы, номер страницы, всего страниц, название местоположения)
+        """
+        self._ensure_loaded()
+        location = self._locations.get(loc_key) if loc_key else None
+        plants = self._by_location.get(loc_key, []) if location else self._plants
+        pages = max(1, (len(plants) + page_size - 1) // page_size)
+        page = min(max(page, 0), pages - 1)
+        return plants[page * page_size:(page + 1) * page_size], page, pages, location
+
+
+# Глобальный кеш списка растений
+plant_list_cache = PlantListCache()
+events.subscribe(events.PLANT_CHANGED, lambda plant_id: plant_list_cache.invalidate())
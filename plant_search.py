@@ -0,0 +1,160 @@
+"""
+Поиск растений по названию и местоположению для inline-режима бота
+"""
+import logging
+import threading
+import time
+import events
+from database import Plant
+
+logger = logging.getLogger(__name__)
+
+# Полная перестройка индекса: подхватывает изменения, сделанные другими процессами (секунды)
+PLANT_SEARCH_TTL = 300
+
+# Сколько растений возвращает поиск
+SEARCH_LIMIT = 20
+
+# Длина n-грамм индекса; более короткие запросы ищутся по началу слов
+NGRAM = 3
+
+
+def normalize(text):
+    """Строка для сравнения: регистр и ё не различаются"""
+    return (text or '').casefold().replace('ё', 'е')
+
+
+class PlantSearchIndex:
+    """
+    Индекс растений в памяти: триграммы и начала слов названия и местоположения
+
+    Строится один раз из БД и обновляется по событию PLANT_CHANGED (events.py)
+    только для изменённого растения. Поиск по подстроке - пересечение списков
+    растений по триграммам запроса с проверкой подстроки; запросы короче
+    трёх символов ищутся по началу слов. Запросы к БД на каждое нажатие
+    клавиши не выполняются.
+    """
+
+    def __init__(self, ttl=PLANT_SEARCH_TTL):
+        self.ttl = ttl
+        self._plants = {}
+        self._texts = {}
+        self._grams = {}
+        self._prefixes = {}
+        self._built_at = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _words(text):
+        return [word for word in text.replace(',', ' ').replace('-', ' ').split() if word]
+
+    def _keys(self, text):
+        """Триграммы и начала (1-2 символа) слов текста"""
+        grams = set()
+        prefixes = set()
+        for word in self._words(text):
+            for length in range(1, NGRAM):
+                prefixes.add(word[:length])
+            for i in range(len(word) - NGRAM + 1):
+                grams.add(word[i:i + NGRAM])
+        return grams, prefixes
+
+    def _add(self, plant):
+        text = normalize(f"{plant['name']} {plant.get('location') or ''}")
+        grams, prefixes = self._keys(text)
+        self._plants[plant['id']] = plant
+        self._texts[plant['id']] = (text, normalize(plant['name']))
+        for gram in grams:
+            self._grams.setdefault(gram, set()).add(plant['id'])
+        for prefix in prefixes:
+            self._prefixes.setdefault(prefix, set()).add(plant['id'])
+
+    def _remove(self, plant_id):
+        entry = self._texts.pop(plant_id, None)
+        self._plants.pop(plant_id, None)
+        if not entry:
+            return
+        grams, prefixes = self._keys(entry[0])
+        for gram in grams:
+            self._grams.get(gram, set()).discard(plant_id)
+        for prefix in prefixes:
+            self._prefixes.get(prefix, set()).discard(plant_id)
+
+    def rebuild(self):
+        """Перестроить индекс по всем активным растениям"""
+        plants = Plant.get_all() or []
+        with self._lock:
+            self._plants, self._texts, self._grams, self._prefixes = {}, {}, {}, {}
+            for plant in plants:
+                self._add(plant)
+            self._built_at = time.monotonic()
+        logger.info(f"Индекс поиска растений построен: {len(plants)} растений")
+
+    def refresh_plant(self, plant_id):
+        """Обновить одно растение (после изменения на портале)"""
+        if self._built_at is None:
+            return
+        plant = Plant.get_by_id(plant_id)
+        with self._lock:
+            self._remove(plant_id)
+            if plant and plant.get('is_active', True):
+                self._add(plant)
+
+    def _ensure_built(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.ttl:
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"Ошибка построения индекса поиска растений: {e}")
+                if self._built_at is None:
+                    raise
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """
+        Растения, в названии или местоположении которых есть все слова запроса
+
+        Сначала растения, чьё название начинается с запроса, затем по алфавиту.
+        Пустой запрос возвращает первые растения по алфавиту.
+        """
+        self._ensure_built()
+        words = self._words(normalize(query))
+        with self._lock:
+            if not words:
+                ids = set(self._plants)
+            else:
+                ids = None
+                for word in words:
+                    found = self._match_word(word)
+                    ids = found if ids is None else ids & found
+                    if not ids:
+                        return []
+
+            needle = ' '.join(words)
+            ranked = sorted(
+                ids,
+                key=lambda plant_id: (
+                    not self._texts[plant_id][1].startswith(needle),
+                    self._texts[plant_id][1],
+                    plant_id,
+                )
+            )
+            return [self._plants[plant_id] for plant_id in ranked[:limit]]
+
+    def _match_word(self, word):
+        """ID растений, в тексте которых есть слово запроса (под блокировкой)"""
+        if len(word) < NGRAM:
+            return set(self._prefixes.get(word, ()))
+
+        candidates = None
+        for i in range(len(word) - NGRAM + 1):
+            posting = self._grams.get(word[i:i + NGRAM])
+            if not posting:
+                return set()
+            candidates = set(posting) if candidates is None else candidates & posting
+        # Триграммы могут совпасть вразброс - проверяем саму подстроку
+        return {plant_id for plant_id in candidates if word in self._texts[plant_id][0]}
+
+
+# Глобальный индекс поиска растений
+plant_search_index = PlantSearchIndex()
+events.subscribe(events.PLANT_CHANGED, lambda plant_id: plant_search_index.refresh_plant(plant_id))
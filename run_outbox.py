@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Скрипт для запуска отправителей outbox отдельным процессом
+Используйте его, чтобы масштабировать доставку сообщений процессами, а не только потоками
+"""
+import logging
+import time
+from config import Config
+from outbox import OutboxSender
+
+# Настройка логирования
+logging.basicConfig(
+    level=logging.ERROR,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Запуск пула отправителей"""
+    if not Config.TELEGRAM_BOT_TOKEN:
+        logger.error("Telegram бот токен не настроен!")
+        logger.error("Пожалуйста, установите TELEGRAM_BOT_TOKEN в файле .env")
+        return
+
+    sender = OutboxSender()
+    sender.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("Остановка отправителей outbox...")
+    finally:
+        sender.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -45,6 +45,20 @@ SET
     END
 WHERE is_active = TRUE;
 
+-- Задачи ухода из колонок plants (повторный запуск безопасен)
+INSERT INTO care_tasks (plant_id, task_type, interval_days, next_due, last_done_at, is_active)
+SELECT id, 'watering', watering_interval_days, next_watering_date, last_watered_at, TRUE
+FROM plants
+ON DUPLICATE KEY UPDATE interval_days = VALUES(interval_days), next_due = VALUES(next_due),
+    last_done_at = VALUES(last_done_at), is_active = VALUES(is_active);
+
+INSERT INTO care_tasks (plant_id, task_type, interval_days, next_due, last_done_at, is_active)
+SELECT id, 'fertilizer', fertilizer_interval_days, next_fertilizer_date, last_fertilized_at,
+    fertilizer_interval_days IS NOT NULL
+FROM plants
+ON DUPLICATE KEY UPDATE interval_days = VALUES(interval_days), next_due = VALUES(next_due),
+    last_done_at = VALUES(last_done_at), is_active = VALUES(is_active);
+
 -- Информационное сообщение
 SELECT 'Примеры растений успешно добавлены!' as Message;
 SELECT COUNT(*) as 'Всего растений' FROM plants WHERE is_active = TRUE;
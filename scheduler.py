@@ -2,22 +2,46 @@
 Модуль планировщика задач для автоматической отправки уведомлений
 """
 import logging
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime
-import pytz
-import asyncio
-from database import Plant, SystemSettings, NotificationLog, User
+import threading
+from datetime import datetime, timedelta
+from assignments import RecipientResolver
+from database import (CareTask, Database, Plant, SystemSettings, NotificationLog, NotificationDelivery,
+                      Outbox)
 from config import Config
+from outbox import outbox_sender
+from scheduler_cluster import ClusterMembership
+from scheduler_leader import LeaderElection
+from scheduler_stats import STATUS_MISSED, STATUS_OVERLAP, SchedulerRunHistory
+from notification_templates import MOSCOW_TZ, NotificationTemplates, get_notification_templates
 
 logger = logging.getLogger(__name__)
 
+# Статусы доставки, при которых повтор в чат не ставится: уже доставлено или ещё в очереди
+RETRY_SKIP_STATUSES = ('sent', 'pending')
+
 
 class NotificationScheduler:
     """Класс для планирования уведомлений"""
 
-    def __init__(self):
+    def __init__(self, clock=None, sender=None):
+        """
+        Args:
+            clock: Функция, возвращающая текущее московское время (aware datetime).
+                По умолчанию реальные часы; в симуляции подставляются виртуальные
+            sender: Пул отправителей outbox, который будится после каждого
+                поставленного в очередь уведомления (по умолчанию глобальный)
+        """
+        # APScheduler импортируется здесь, а не в начале модуля: импорт app.py
+        # не должен платить за него, пока планировщик не нужен
+        from apscheduler.schedulers.background import BackgroundScheduler
+
         self.scheduler = BackgroundScheduler(timezone='Europe/Moscow')
+        self.mode = Config.SCHEDULER_MODE
+        self.leader = LeaderElection()
+        self.cluster = ClusterMembership(node_id=self.leader.node_id)
+        self.clock = clock or (lambda: datetime.now(MOSCOW_TZ))
+        self.history = SchedulerRunHistory(node_id=self.leader.node_id, clock=self.clock)
+        self.sender = sender or outbox_sender
         self.is_running = False
 
     def start(self):
@@ -26,293 +50,456 @@ class NotificationScheduler:
             logger.warning("Планировщик уже запущен")
             return
 
-        # Проверка уведомлений каждый час
-        self.scheduler.add_job(
-            self.check_and_send_notifications,
-            CronTrigger(minute=0, timezone='Europe/Moscow'),
-            id='check_notifications',
-            name='Проверка и отправка уведомлений',
-            replace_existing=True
-        )
+        from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+        from apscheduler.triggers.interval import IntervalTrigger
 
-        # Проверка повторных уведомлений каждые 5 минут
+        # Heartbeat лидерства (или членства в кластере): сразу при старте и далее
+        # с заданным интервалом. Планировщик работает в каждом воркере, но задачи
+        # ниже выполняет только лидер либо, в режиме sharded, каждый узел для своей доли
         self.scheduler.add_job(
-            self.check_retry_notifications,
-            CronTrigger(minute='*/5', timezone='Europe/Moscow'),
-            id='retry_notifications',
-            name='Проверка повторных уведомлений',
+            self._heartbeat,
+            IntervalTrigger(seconds=Config.SCHEDULER_LEADER_HEARTBEAT_SECONDS, timezone='Europe/Moscow'),
+            id='node_heartbeat',
+            name='Heartbeat узла планировщика',
+            next_run_time=datetime.now(MOSCOW_TZ),
             replace_existing=True
         )
 
+        for job, trigger, job_id, name in self.job_definitions():
+            self.scheduler.add_job(
+                self._run_if_active,
+                trigger,
+                args=[job],
+                id=job_id,
+                name=name,
+                replace_existing=True
+            )
+
+        # Пропущенные (misfire) и наложившиеся (предыдущий тик ещё идёт) запуски
+        self.scheduler.add_listener(self._on_job_event, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+
         self.scheduler.start()
         self.is_running = True
         logger.info("Планировщик уведомлений запущен")
 
+    def job_definitions(self):
+        """Задачи уведомлений: (функция, триггер, id, название)"""
+        from apscheduler.triggers.cron import CronTrigger
+
+        return [
+            # Проверка уведомлений каждый час
+            (
+                self.check_and_send_notifications,
+                CronTrigger(minute=0, timezone='Europe/Moscow'),
+                'check_notifications',
+                'Проверка и отправка уведомлений',
+            ),
+            # Проверка повторных уведомлений каждые 5 минут
+            (
+                self.check_retry_notifications,
+                CronTrigger(minute='*/5', timezone='Europe/Moscow'),
+                'retry_notifications',
+                'Проверка повторных уведомлений',
+            ),
+            # Очистка завершённых сообщений outbox и журналов доставки раз в сутки
+            (
+                self.cleanup_delivery_history,
+                CronTrigger(hour=3, minute=30, timezone='Europe/Moscow'),
+                'cleanup_delivery_history',
+                'Очистка истории доставки',
+            ),
+        ]
+
     def stop(self):
         """Остановить планировщик"""
         if self.is_running:
             self.scheduler.shutdown()
+            if self.mode == 'sharded':
+                self.cluster.leave()
+            else:
+                self.leader.release()
             self.is_running = False
             logger.info("Планировщик уведомлений остановлен")
 
-    def _is_in_notification_window(self):
-        """Проверить, находимся ли в разрешённом временном окне"""
-        start_hour = int(SystemSettings.get('notification_start_hour', 8))
-        end_hour = int(SystemSettings.get('notification_end_hour', 22))
-
-        moscow_tz = pytz.timezone('Europe/Moscow')
-        now = datetime.now(moscow_tz)
-        current_hour = now.hour
-
-        if current_hour < start_hour or current_hour >= end_hour:
-            logger.info(f"Текущее время {current_hour}:00 вне диапазона уведомлений ({start_hour}:00 - {end_hour}:00)")
-            return False, now
-        return True, now
+    def _heartbeat(self):
+        """Подтвердить лидерство или членство в кластере (в зависимости от режима)"""
+        if self.mode == 'sharded':
+            return self.cluster.heartbeat() is not None
+        return self.leader.heartbeat()
+
+    def _run_if_active(self, job):
+        """Выполнить задачу, только если этот процесс — лидер или узел с долей растений"""
+        # Подтверждаем роль прямо перед запуском, чтобы не полагаться на
+        # результат heartbeat, который мог устареть на несколько секунд
+        if not self._heartbeat():
+            logger.info(f"Пропуск задачи {job.__name__}: процесс {self.leader.node_id} не обрабатывает уведомления")
+            return
+        job()
 
-    def _get_moscow_time(self):
-        """Получить текущее московское время"""
-        moscow_tz = pytz.timezone('Europe/Moscow')
-        return datetime.now(moscow_tz)
+    def _is_active(self):
+        """Обрабатывает ли этот процесс уведомления (по последнему heartbeat)"""
+        if self.mode == 'sharded':
+            return self.cluster.partition is not None
+        return self.leader.is_leader
 
-    def _send_notifications_sync(self, notifications_to_send):
-        """Отправить все уведомления синхронно с новым ботом"""
-        from telegram import Bot
+    def _partition(self):
+        """Доля растений этого узла: (index, count) в режиме sharded, иначе None (все)"""
+        return self.cluster.partition if self.mode == 'sharded' else None
 
-        if not Config.TELEGRAM_BOT_TOKEN:
-            logger.warning("Telegram бот не настроен")
-            return
+    def _on_job_event(self, event):
+        """Записать в историю пропущенный или наложившийся запуск задачи"""
+        from apscheduler.events import EVENT_JOB_MISSED
 
-        users = User.get_users_for_notifications()
-        if not users:
-            logger.info("Нет пользователей для отправки уведомлений")
+        # Задачи уведомлений выполняют только активные узлы, поэтому
+        # пропуски в остальных процессах не интересны
+        if event.job_id == 'node_heartbeat' or not self._is_active():
             return
 
-        async def send_all():
-            # Создаём новый экземпляр бота для этой сессии отправки
-            bot = Bot(token=Config.TELEGRAM_BOT_TOKEN)
-
-            async with bot:
-                for notif in notifications_to_send:
-                    plant = notif['plant']
-                    attempt = notif['attempt']
-                    log_id = notif['log_id']
-                    notif_type = notif['type']
-
-                    # Формируем сообщение
-                    message = self._format_notification_message(plant, notif_type, attempt)
-
-                    # Формируем кнопку
-                    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-                    if notif_type == 'watering':
-                        keyboard = [[InlineKeyboardButton("✅ Я полью", callback_data=f"water_{plant['id']}_{log_id}")]]
-                    else:
-                        keyboard = [[InlineKeyboardButton("✅ Я прикормлю", callback_data=f"fert_{plant['id']}_{log_id}")]]
-                    reply_markup = InlineKeyboardMarkup(keyboard)
-
-                    # Отправляем всем пользователям
-                    for user in users:
-                        try:
-                            await bot.send_message(
-                                chat_id=user['telegram_id'],
-                                text=message,
-                                reply_markup=reply_markup,
-                                parse_mode='Markdown'
-                            )
-                            logger.info(f"Отправлено уведомление пользователю {user['name']}")
-                        except Exception as e:
-                            logger.error(f"Ошибка отправки уведомления пользователю {user['name']}: {e}")
-
-                        # Небольшая задержка между отправками
-                        await asyncio.sleep(0.1)
-
-        # Запускаем в новом event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(send_all())
-        finally:
-            loop.close()
-
-    def _format_notification_message(self, plant, notif_type, attempt):
-        """Форматировать сообщение уведомления"""
-        if attempt > 0:
-            retry_message = SystemSettings.get(f'retry_message_{attempt}', '')
-            if retry_message:
-                if notif_type == 'fertilizer':
-                    retry_message = retry_message.replace('полив', 'прикормк')
-                    retry_message = retry_message.replace('Полейте', 'Прикормите')
-                    retry_message = retry_message.replace('вод', 'удобрен')
-                header = f"{retry_message}\n\n"
-            else:
-                action = "полива" if notif_type == 'watering' else "прикормки"
-                header = f"⚠️ Напоминание #{attempt}: растение всё ещё ждёт {action}!\n\n"
+        if event.code == EVENT_JOB_MISSED:
+            self.history.record_event(event.job_id, STATUS_MISSED, event.scheduled_run_time,
+                                      "пропущен (misfire): планировщик не успел запустить задачу вовремя")
         else:
-            if notif_type == 'watering':
-                header = "💧 **Время полить растение!**\n\n"
-            else:
-                header = "🌱 **Время прикормить растение!**\n\n"
-
-        message = f"{header}🌿 Растение: **{plant['name']}**\n"
-
-        if plant.get('location'):
-            message += f"📍 Местоположение: {plant['location']}\n"
-
-        if plant.get('description'):
-            message += f"ℹ️ {plant['description']}\n"
+            self.history.record_event(event.job_id, STATUS_OVERLAP, event.scheduled_run_time,
+                                      "пропущен: предыдущий запуск ещё выполняется")
+
+    def status(self):
+        """Состояние планировщика и лидерства (для логов и метрик)"""
+        return {
+            'is_running': self.is_running,
+            'mode': self.mode,
+            'leader': self.leader.status(),
+            'cluster': self.cluster.status(),
+        }
+
+    def _notification_window(self):
+        """
+        Проверить, находимся ли в разрешённом временном окне
+
+        Returns:
+            (in_window, now, release_at, spread_minutes), где release_at - открытие
+            окна, к которому привязывается утренний пакет уведомлений: ближайшее
+            открытие, если сейчас вне окна, сегодняшнее - в первые spread_minutes
+            минут окна, иначе None
+        """
+        start_hour = int(SystemSettings.get('notification_start_hour', 8))
+        end_hour = int(SystemSettings.get('notification_end_hour', 22))
+        spread_minutes = int(SystemSettings.get('notification_release_spread_minutes', 30))
 
-        message += f"\n⏰ Дата уведомления: {self._get_moscow_time().strftime('%d.%m.%Y %H:%M')}"
+        now = self.clock()
+        current_hour = now.hour
+        window_open = now.replace(hour=start_hour, minute=0, second=0, microsecond=0)
 
-        return message
+        if current_hour < start_hour or current_hour >= end_hour:
+            logger.info(f"Текущее время {current_hour}:00 вне диапазона уведомлений ({start_hour}:00 - {end_hour}:00)")
+            if current_hour >= end_hour:
+                window_open += timedelta(days=1)
+            return False, now, window_open, spread_minutes
+
+        if now < window_open + timedelta(minutes=spread_minutes):
+            return True, now, window_open, spread_minutes
+        return True, now, None, spread_minutes
+
+    @staticmethod
+    def _overdue_days(next_due, day):
+        """Сколько дней уход просрочен на дату day (приоритет в утреннем пакете)"""
+        return max(0, (day - next_due).days) if next_due else 0
+
+    @staticmethod
+    def _release(release_at, spread_minutes):
+        """(release_at, hold_until) для утреннего пакета или None"""
+        if not release_at:
+            return None
+        return release_at, release_at + timedelta(minutes=spread_minutes)
+
+    def _release_batch(self, stats, release_at, spread_minutes):
+        """Разложить утренний пакет по первым spread_minutes минутам окна"""
+        with stats.phase('send'):
+            released = Outbox.spread_release(
+                release_at.replace(tzinfo=None), spread_minutes * 60, now=self.clock().replace(tzinfo=None)
+            )
+        logger.info(f"Утренний пакет на {release_at:%d.%m %H:%M}: {released} уведомлений "
+                    f"распределено по {spread_minutes} мин")
+
+    def _enqueue_notification(self, cursor, templates, plant, notif_type, log_id, attempt, recipients, now,
+                              release=None, priority=0):
+        """
+        Поставить уведомление в очередь outbox для всех получателей
+
+        Вызывается в транзакции, которая создаёт или обновляет запись
+        notification_log, поэтому запись журнала и сообщения фиксируются
+        атомарно. Доставкой занимается пул отправителей (outbox.py).
+        recipients - RecipientResolver тика: он выбирает личные сообщения
+        (ответственным или, после эскалации, всем) и общий чат, если он настроен.
+        release=(release_at, hold_until) относит уведомление к утреннему пакету:
+        до раскладки (Outbox.spread_release) сообщения недоступны отправителям
+        до hold_until, а затем распределяются по первым минутам окна.
+
+        Доставка записывается по чатам в notification_delivery. Повтор уходит
+        только в чаты, где предыдущее сообщение этого уведомления не доставлено
+        (failed, cancelled) или которых ещё не было (эскалация). Чаты со статусом
+        sent повтор не получают, а pending - ещё в очереди: outbox сам повторяет
+        неудачную отправку, и второе сообщение было бы лишним запросом к API.
+        """
+        # attempt_number считает и первичную отправку, поэтому попытка attempt - это повтор attempt - 1
+        retry = attempt - 1 if attempt else 0
+        chats = [(user['id'], str(user['telegram_id'])) for user in recipients.recipients(plant, retry)]
+        if recipients.group_chat_id:
+            chats.append((None, recipients.group_chat_id))
+
+        if attempt and chats:
+            deliveries = NotificationDelivery.get_for_log(log_id, cursor=cursor)
+            chats = [
+                (user_id, chat_id) for user_id, chat_id in chats
+                if deliveries.get(chat_id, {}).get('status') not in RETRY_SKIP_STATUSES
+            ]
+        if not chats:
+            return 0
+
+        message = templates.render(plant, notif_type, attempt, now)
+        reply_markup = NotificationTemplates.reply_markup(notif_type, plant['id'], log_id)
+        photo = templates.photo(plant)
+
+        group_message = message
+        if recipients.group_chat_id:
+            names = recipients.assignee_names(plant)
+            if names and not recipients.is_escalated(retry):
+                group_message += f"\n👤 Ответственный: {', '.join(names)}"
+
+        NotificationDelivery.add_many(log_id, chats, cursor=cursor)
+        return Outbox.add_many([
+            {
+                'chat_id': chat_id,
+                'text': message if user_id else group_message,
+                'parse_mode': 'Markdown',
+                'reply_markup': reply_markup,
+                'photo': photo,
+                'log_id': log_id,
+                'user_id': user_id,
+                'release_at': release[0].replace(tzinfo=None) if release else None,
+                'available_at': release[1].replace(tzinfo=None) if release else None,
+                'priority': priority,
+            }
+            for user_id, chat_id in chats
+        ], cursor=cursor)
 
     def check_and_send_notifications(self):
         """Проверить и отправить ПЕРВИЧНЫЕ уведомления"""
         try:
             logger.info("Запуск проверки уведомлений")
 
-            in_window, now = self._is_in_notification_window()
-            if not in_window:
-                return
-
-            moscow_tz = pytz.timezone('Europe/Moscow')
-            notifications_to_send = []
-
-            # === ПОЛИВ ===
-            plants_to_water = Plant.get_plants_needing_water()
-            logger.info(f"Найдено растений для полива: {len(plants_to_water)}")
-
-            for plant in plants_to_water:
-                logger.info(f"Проверка растения: {plant['name']} (ID: {plant['id']})")
-
-                pending = NotificationLog.get_pending_for_plant(plant['id'], 'watering')
-
-                today_sent = False
-                if pending:
-                    for notif in pending:
-                        sent_at = notif['sent_at']
-                        if isinstance(sent_at, str):
-                            sent_at = datetime.strptime(sent_at, '%Y-%m-%d %H:%M:%S')
-                        if sent_at.tzinfo is None:
-                            sent_at = moscow_tz.localize(sent_at)
-
-                        if sent_at.date() == now.date():
-                            today_sent = True
-                            logger.info(f"Уведомление для {plant['name']} уже отправлено сегодня")
-                            break
-
-                if not today_sent:
-                    log_id = NotificationLog.create(plant['id'], 'watering')
-                    logger.info(f"Создано уведомление ID: {log_id} для растения {plant['name']}")
-                    notifications_to_send.append({
-                        'type': 'watering',
-                        'plant': plant,
-                        'log_id': log_id,
-                        'attempt': 0
-                    })
-
-            # === ПРИКОРМКА ===
-            plants_to_fertilize = Plant.get_plants_needing_fertilizer()
-            logger.info(f"Найдено растений для прикормки: {len(plants_to_fertilize)}")
-
-            for plant in plants_to_fertilize:
-                pending = NotificationLog.get_pending_for_plant(plant['id'], 'fertilizer')
-
-                today_sent = False
-                if pending:
-                    for notif in pending:
-                        sent_at = notif['sent_at']
-                        if isinstance(sent_at, str):
-                            sent_at = datetime.strptime(sent_at, '%Y-%m-%d %H:%M:%S')
-                        if sent_at.tzinfo is None:
-                            sent_at = moscow_tz.localize(sent_at)
-
-                        if sent_at.date() == now.date():
-                            today_sent = True
-                            break
-
-                if not today_sent:
-                    log_id = NotificationLog.create(plant['id'], 'fertilizer')
-                    notifications_to_send.append({
-                        'type': 'fertilizer',
-                        'plant': plant,
-                        'log_id': log_id,
-                        'attempt': 0
-                    })
-
-            # Отправляем все уведомления
-            if notifications_to_send:
-                logger.info(f"Отправка {len(notifications_to_send)} уведомлений...")
-                self._send_notifications_sync(notifications_to_send)
+            with self.history.track('check_notifications') as stats:
+                with stats.phase('settings'):
+                    in_window, now, release_at, spread_minutes = self._notification_window()
+
+                # Вне окна работа не отбрасывается: уведомления создаются сразу со
+                # временем открытия окна, а сообщения ждут его в outbox. Иначе первый
+                # тик окна отправил бы всё накопленное одним всплеском
+                send_at = now if in_window else release_at
+
+                with stats.phase('settings'):
+                    templates = get_notification_templates()
+                    # Получатели по растениям вычисляются один раз за тик
+                    recipients = RecipientResolver.load(today=send_at.date())
+                if not recipients.users and not recipients.group_chat_id:
+                    logger.info("Нет пользователей для отправки уведомлений")
+
+                # Один проход по задачам ухода всех типов. Задачи читаются пачками,
+                # и каждое уведомление фиксируется сразу: отправка начинается до
+                # окончания прохода
+                due_tasks = CareTask.iter_due(send_at.date(), partition=self._partition())
+                self._create_first_notifications(
+                    stats, due_tasks, templates, recipients, send_at, self._release(release_at, spread_minutes)
+                )
+
+                if release_at and stats.counts.get('created'):
+                    if not in_window:
+                        stats.counts['deferred'] = stats.counts['created']
+                    self._release_batch(stats, release_at, spread_minutes)
+
+                if stats.counts.get('created'):
+                    logger.info(f"Поставлено в очередь {stats.counts['created']} уведомлений")
 
             logger.info("Проверка уведомлений завершена")
 
         except Exception as e:
             logger.error(f"Ошибка при проверке уведомлений: {e}", exc_info=True)
 
-    def check_retry_notifications(self):
-        """Проверить и отправить ПОВТОРНЫЕ уведомления"""
-        try:
-            logger.info("Запуск проверки повторных уведомлений")
-
-            in_window, now = self._is_in_notification_window()
-            if not in_window:
-                return
-
-            retry_interval = int(SystemSettings.get('notification_retry_interval_minutes', 30))
-            max_retries = int(SystemSettings.get('notification_max_retries', 5))
-
-            moscow_tz = pytz.timezone('Europe/Moscow')
-            notifications_to_send = []
-
-            pending_notifications = NotificationLog.get_all_pending()
-            logger.info(f"Найдено незавершённых уведомлений: {len(pending_notifications) if pending_notifications else 0}")
-
-            for notification in (pending_notifications or []):
-                if notification['attempt_number'] >= max_retries:
-                    logger.info(f"Уведомление ID {notification['id']} достигло максимума попыток ({max_retries})")
+    def _create_first_notifications(self, stats, due_tasks, templates, recipients, now, release=None):
+        """
+        Создать записи журнала и поставить первичные уведомления в очередь
+
+        due_tasks - строки CareTask.iter_due (растение + task_type и next_due),
+        recipients - RecipientResolver тика (первичное уведомление - ответственным),
+        now - время уведомления (для отложенных до окна - время открытия окна),
+        release - (release_at, hold_until), если уведомление входит в утренний пакет
+        """
+        for plant in stats.timed('due_scan', due_tasks):
+            notif_type = plant['task_type']
+            stats.count('due')
+            try:
+                with stats.phase('due_scan'):
+                    today_sent = self._sent_today(plant, notif_type, now)
+                if today_sent:
+                    logger.info(f"Уведомление для {plant['name']} уже отправлено сегодня")
                     continue
 
-                last_attempt_at = notification.get('last_attempt_at') or notification['sent_at']
-                if isinstance(last_attempt_at, str):
-                    last_attempt_at = datetime.strptime(last_attempt_at, '%Y-%m-%d %H:%M:%S')
-                if last_attempt_at.tzinfo is None:
-                    last_attempt_at = moscow_tz.localize(last_attempt_at)
-
-                time_diff = (now - last_attempt_at).total_seconds() / 60
-
-                logger.info(f"Уведомление ID {notification['id']}: попытка {notification['attempt_number']}, "
-                           f"прошло {time_diff:.1f} мин, интервал {retry_interval} мин")
-
-                if time_diff >= retry_interval:
-                    plant = Plant.get_by_id(notification['plant_id'])
-                    if not plant:
-                        logger.warning(f"Растение ID {notification['plant_id']} не найдено")
+                with Database.get_cursor(commit=True) as cursor:
+                    # Повторная проверка под блокировкой растения: при перестройке
+                    # разбиения два узла могут недолго считать растение своим
+                    with stats.phase('due_scan'):
+                        Plant.lock(plant['id'], cursor)
+                        today_sent = self._sent_today(plant, notif_type, now, cursor)
+                    if today_sent:
+                        stats.count('duplicate')
                         continue
 
-                    NotificationLog.increment_attempt(notification['id'])
-                    attempt_num = notification['attempt_number'] + 1
+                    with stats.phase('log_creation'):
+                        log_id = NotificationLog.create(
+                            plant['id'], notif_type, cursor=cursor, now=now.replace(tzinfo=None)
+                        )
+                    with stats.phase('send'):
+                        sent = self._enqueue_notification(
+                            cursor, templates, plant, notif_type, log_id, 0, recipients, now,
+                            release, self._overdue_days(plant['next_due'], now.date())
+                        )
+                stats.count('created')
+                stats.count('sent', sent)
+                self.sender.wake()
+                logger.info(f"Создано уведомление ID: {log_id} для растения {plant['name']}")
+            except Exception as e:
+                # Ошибка по одному растению не должна останавливать весь тик
+                stats.count('failed')
+                logger.error(f"Ошибка уведомления ({notif_type}) для растения ID {plant['id']}: {e}")
+
+    @staticmethod
+    def _sent_today(plant, notif_type, now, cursor=None):
+        """Есть ли незавершённое уведомление этого типа, отправленное сегодня"""
+        for notif in NotificationLog.get_pending_for_plant(plant['id'], notif_type, cursor=cursor) or []:
+            sent_at = notif['sent_at']
+            if isinstance(sent_at, str):
+                sent_at = datetime.strptime(sent_at, '%Y-%m-%d %H:%M:%S')
+            if sent_at.tzinfo is None:
+                sent_at = MOSCOW_TZ.localize(sent_at)
+
+            if sent_at.date() == now.date():
+                return True
+        return False
 
-                    notifications_to_send.append({
-                        'type': notification['notification_type'],
-                        'plant': plant,
-                        'log_id': notification['id'],
-                        'attempt': attempt_num
-                    })
+    def check_retry_notifications(self):
+        """Проверить и отправить ПОВТОРНЫЕ уведомления"""
+        try:
+            logger.info("Запуск проверки повторных уведомлений")
 
-            # Отправляем все уведомления
-            if notifications_to_send:
-                logger.info(f"Отправка {len(notifications_to_send)} повторных уведомлений...")
-                self._send_notifications_sync(notifications_to_send)
+            with self.history.track('retry_notifications') as stats:
+                with stats.phase('settings'):
+                    in_window, now, release_at, spread_minutes = self._notification_window()
+                if not in_window:
+                    stats.count('skipped_window')
+                    stats.skip("вне окна уведомлений")
+                    return
+
+                with stats.phase('settings'):
+                    retry_interval = int(SystemSettings.get('notification_retry_interval_minutes', 30))
+                    max_retries = int(SystemSettings.get('notification_max_retries', 5))
+                    templates = get_notification_templates()
+                    recipients = RecipientResolver.load(today=now.date())
+
+                # Отбор по числу попыток и интервалу выполняется в SQL
+                last_attempt_before = (now - timedelta(minutes=retry_interval)).replace(tzinfo=None)
+                due_retries = NotificationLog.iter_due_retries(
+                    max_retries, last_attempt_before, partition=self._partition()
+                )
+
+                for notification in stats.timed('due_scan', due_retries):
+                    stats.count('due')
+                    logger.info(f"Уведомление ID {notification['id']}: попытка {notification['attempt_number']}, "
+                               f"интервал {retry_interval} мин истёк")
+                    try:
+                        with stats.phase('due_scan'):
+                            plant = Plant.get_by_id(notification['plant_id'])
+                        if not plant:
+                            logger.warning(f"Растение ID {notification['plant_id']} не найдено")
+                            continue
+
+                        attempt_num = notification['attempt_number'] + 1
+                        # attempt_number считает и первичную отправку, поэтому это
+                        # повтор номер attempt_num - 1. После escalate_after повторов
+                        # без ответа уведомление уходит всем пользователям
+                        retry_num = attempt_num - 1
+
+                        with Database.get_cursor(commit=True) as cursor:
+                            with stats.phase('log_creation'):
+                                # Условное обновление: попытку засчитывает только один узел
+                                updated = NotificationLog.increment_attempt(
+                                    notification['id'], cursor=cursor, now=now.replace(tzinfo=None),
+                                    expected_attempt=notification['attempt_number']
+                                )
+                            if not updated:
+                                stats.count('duplicate')
+                                continue
+                            with stats.phase('send'):
+                                # Повторы в первые минуты окна входят в утренний пакет
+                                sent = self._enqueue_notification(
+                                    cursor, templates, plant, notification['notification_type'],
+                                    notification['id'], attempt_num, recipients, now,
+                                    self._release(release_at, spread_minutes),
+                                    self._overdue_days(notification['next_due'], now.date())
+                                )
+                        stats.count('created')
+                        stats.count('sent', sent)
+                        if retry_num == recipients.escalate_after + 1 and recipients.assignees(plant):
+                            stats.count('escalated')
+                            logger.info(f"Уведомление ID {notification['id']} передано всем пользователям: "
+                                        f"ответственные не отреагировали на {recipients.escalate_after} повтор(а)")
+                        self.sender.wake()
+                    except Exception as e:
+                        stats.count('failed')
+                        logger.error(f"Ошибка повторного уведомления ID {notification['id']}: {e}")
+
+                if stats.counts.get('created'):
+                    logger.info(f"Поставлено в очередь {stats.counts['created']} повторных уведомлений")
+                    if release_at:
+                        self._release_batch(stats, release_at, spread_minutes)
 
             logger.info("Проверка повторных уведомлений завершена")
 
         except Exception as e:
             logger.error(f"Ошибка при проверке повторных уведомлений: {e}", exc_info=True)
 
+    def cleanup_delivery_history(self):
+        """Удалить завершённые сообщения outbox и строки доставки старше OUTBOX_RETENTION_DAYS"""
+        try:
+            with self.history.track('cleanup_delivery_history') as stats:
+                with stats.phase('outbox'):
+                    stats.count('outbox', Outbox.delete_finished_older_than(Config.OUTBOX_RETENTION_DAYS))
+                with stats.phase('delivery'):
+                    stats.count('delivery', NotificationDelivery.delete_older_than(Config.OUTBOX_RETENTION_DAYS))
+
+            logger.info(f"Очистка истории доставки: удалено {stats.counts.get('outbox', 0)} сообщений outbox, "
+                        f"{stats.counts.get('delivery', 0)} строк доставки")
+
+        except Exception as e:
+            logger.error(f"Ошибка очистки истории доставки: {e}", exc_info=True)
+
     def trigger_immediate_check(self):
         """Запустить немедленную проверку уведомлений (для тестирования)"""
         logger.info("Запуск немедленной проверки уведомлений")
         self.check_and_send_notifications()
 
 
-# Глобальный экземпляр планировщика
-notification_scheduler = NotificationScheduler()
\ No newline at end of file
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_notification_scheduler():
+    """
+    Глобальный планировщик, создаётся при первом обращении
+
+    Так импорт app.py не строит планировщик и не запускает выборы лидера,
+    а ID узла (хост:pid) берётся в процессе воркера, а не в родителе до fork.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = NotificationScheduler()
+        return _scheduler
\ No newline at end of file
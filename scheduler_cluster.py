@@ -0,0 +1,109 @@
+"""
+Шардирование планировщика: несколько узлов делят растения по хешу id
+"""
+import logging
+import os
+import socket
+import threading
+from datetime import datetime
+import pymysql
+from database import Database
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ClusterMembership:
+    """
+    Членство узла в кластере планировщиков (таблица scheduler_nodes)
+
+    Каждый узел периодически обновляет свою строку. Живыми считаются узлы,
+    чей heartbeat моложе SCHEDULER_NODE_TIMEOUT_SECONDS (по часам MySQL, так
+    что расхождение часов узлов не важно). Узлы сортируются по node_id, и
+    узел с номером index из count обрабатывает растения с id % count == index.
+    При входе или выходе узла разбиение пересчитывается на следующем heartbeat.
+    """
+
+    def __init__(self, node_id=None):
+        self.node_id = node_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.partition = None
+        self.members = []
+        self.last_heartbeat_at = None
+        self.rebalances = 0
+        self._lock = threading.Lock()
+
+    def heartbeat(self):
+        """
+        Обновить свою строку и пересчитать разбиение
+
+        Returns:
+            (index, count) - своя доля растений, или None, если узел не в кластере
+        """
+        with self._lock:
+            try:
+                members = self._refresh()
+            except pymysql.Error as e:
+                logger.error(f"Ошибка heartbeat узла планировщика {self.node_id}: {e}")
+                # Без связи с БД узел не может знать актуальное разбиение
+                self._set_partition(None, [])
+                return None
+
+            if self.node_id in members:
+                self._set_partition((members.index(self.node_id), len(members)), members)
+            else:
+                self._set_partition(None, members)
+
+            self.last_heartbeat_at = datetime.now()
+            return self.partition
+
+    def leave(self):
+        """Выйти из кластера (при остановке): доля узла сразу перейдёт остальным"""
+        with self._lock:
+            try:
+                Database.execute_query(
+                    "DELETE FROM scheduler_nodes WHERE node_id = %s", (self.node_id,), commit=True
+                )
+            except pymysql.Error as e:
+                logger.error(f"Ошибка выхода узла {self.node_id} из кластера: {e}")
+            self._set_partition(None, [])
+
+    def status(self):
+        """Текущее состояние узла для логов и метрик"""
+        return {
+            'node_id': self.node_id,
+            'partition': list(self.partition) if self.partition else None,
+            'members': list(self.members),
+            'last_heartbeat_at': self.last_heartbeat_at.isoformat() if self.last_heartbeat_at else None,
+            'rebalances': self.rebalances,
+        }
+
+    def _refresh(self):
+        """Записать heartbeat, удалить мёртвые узлы и вернуть живые (по порядку)"""
+        timeout = Config.SCHEDULER_NODE_TIMEOUT_SECONDS
+        with Database.get_cursor(commit=True) as cursor:
+            cursor.execute(
+                """
+                INSERT INTO scheduler_nodes (node_id, started_at, heartbeat_at)
+                VALUES (%s, NOW(3), NOW(3))
+                ON DUPLICATE KEY UPDATE heartbeat_at = NOW(3)
+                """,
+                (self.node_id,)
+            )
+            cursor.execute(
+                "DELETE FROM scheduler_nodes WHERE heartbeat_at < NOW(3) - INTERVAL %s SECOND",
+                (timeout,)
+            )
+            cursor.execute("SELECT node_id FROM scheduler_nodes ORDER BY node_id")
+            return [row['node_id'] for row in cursor.fetchall()]
+
+    def _set_partition(self, partition, members):
+        """Зафиксировать разбиение и записать в лог его изменение"""
+        if partition != self.partition:
+            self.rebalances += 1
+            if partition:
+                logger.warning(f"Узел {self.node_id}: доля {partition[0]} из {partition[1]} "
+                               f"(узлы: {', '.join(members)})")
+            else:
+                logger.warning(f"Узел {self.node_id} не участвует в разбиении растений")
+        self.partition = partition
+        self.members = members
@@ -0,0 +1,133 @@
+"""
+Выбор лидера планировщика между несколькими процессами (воркерами WSGI)
+"""
+import logging
+import os
+import socket
+import threading
+from datetime import datetime
+import pymysql
+from database import Database
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """
+    Лидерство на основе именованной блокировки MySQL (GET_LOCK)
+
+    Блокировка принадлежит соединению, а не процессу: если лидер падает,
+    MySQL закрывает его соединение и сразу снимает блокировку. Поэтому
+    переключение на другой процесс занимает не больше одного интервала
+    heartbeat и не требует ожидания истечения аренды.
+    """
+
+    def __init__(self, lock_name=None):
+        self.lock_name = lock_name or Config.SCHEDULER_LEADER_LOCK
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self.leader_since = None
+        self.last_heartbeat_at = None
+        self.elections_won = 0
+        self.leadership_lost = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def heartbeat(self):
+        """
+        Подтвердить или попытаться захватить лидерство
+
+        Returns:
+            True, если этот процесс сейчас лидер
+        """
+        with self._lock:
+            try:
+                if self.is_leader:
+                    if not self._is_lock_held():
+                        self._set_leader(False, "блокировка больше не принадлежит процессу")
+                else:
+                    if self._try_acquire():
+                        self._set_leader(True)
+            except pymysql.Error as e:
+                logger.error(f"Ошибка проверки лидерства планировщика: {e}")
+                self._close_connection()
+                if self.is_leader:
+                    self._set_leader(False, "потеряно соединение с БД")
+
+            self.last_heartbeat_at = datetime.now()
+            return self.is_leader
+
+    def release(self):
+        """Добровольно отдать лидерство (при остановке процесса)"""
+        with self._lock:
+            if self._connection is not None and self.is_leader:
+                try:
+                    with self._connection.cursor() as cursor:
+                        cursor.execute("SELECT RELEASE_LOCK(%s)", (self.lock_name,))
+                except pymysql.Error as e:
+                    logger.error(f"Ошибка освобождения блокировки лидера: {e}")
+            if self.is_leader:
+                self._set_leader(False, "остановка процесса")
+            self._close_connection()
+
+    def status(self):
+        """Текущее состояние лидерства для логов и метрик"""
+        return {
+            'node_id': self.node_id,
+            'lock_name': self.lock_name,
+            'is_leader': self.is_leader,
+            'leader_since': self.leader_since.isoformat() if self.leader_since else None,
+            'last_heartbeat_at': self.last_heartbeat_at.isoformat() if self.last_heartbeat_at else None,
+            'elections_won': self.elections_won,
+            'leadership_lost': self.leadership_lost,
+        }
+
+    def _get_connection(self):
+        """Получить постоянное соединение, на котором держится блокировка"""
+        if self._connection is None:
+            self._connection = Database.connect()
+        return self._connection
+
+    def _try_acquire(self):
+        """Попытаться взять блокировку без ожидания"""
+        connection = self._get_connection()
+        connection.ping(reconnect=False)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (self.lock_name,))
+            result = cursor.fetchone()
+        return bool(result and result['acquired'] == 1)
+
+    def _is_lock_held(self):
+        """Проверить, что блокировка всё ещё принадлежит нашему соединению"""
+        connection = self._get_connection()
+        # Без переподключения: новое соединение блокировку уже не держит
+        connection.ping(reconnect=False)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT IS_USED_LOCK(%s) = CONNECTION_ID() AS held",
+                (self.lock_name,)
+            )
+            result = cursor.fetchone()
+        return bool(result and result['held'] == 1)
+
+    def _set_leader(self, is_leader, reason=None):
+        """Зафиксировать смену роли и записать её в лог"""
+        self.is_leader = is_leader
+        if is_leader:
+            self.leader_since = datetime.now()
+            self.elections_won += 1
+            logger.info(f"Процесс {self.node_id} стал лидером планировщика (блокировка '{self.lock_name}')")
+        else:
+            self.leader_since = None
+            self.leadership_lost += 1
+            logger.warning(f"Процесс {self.node_id} потерял лидерство планировщика: {reason}")
+
+    def _close_connection(self):
+        """Закрыть соединение (блокировка снимается вместе с ним)"""
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except pymysql.Error:
+                pass
+            self._connection = None
@@ -0,0 +1,180 @@
+"""
+Инструментирование тиков планировщика: время фаз, счётчики и история запусков
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from config import Config
+from database import SchedulerRun
+
+logger = logging.getLogger(__name__)
+
+# Статусы тиков
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+STATUS_SKIPPED = 'skipped'
+STATUS_MISSED = 'missed'
+STATUS_OVERLAP = 'overlap'
+
+# Как часто (в записанных тиках) удалять старые строки scheduler_runs
+CLEANUP_EVERY = 500
+
+
+def _local_time(value):
+    """Время без часового пояса, как оно хранится в scheduler_runs и остальных таблицах"""
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+class TickStats:
+    """Замеры одного тика: фазы в миллисекундах и счётчики"""
+
+    def __init__(self, job_id, node_id=None, clock=None):
+        self.job_id = job_id
+        self.node_id = node_id
+        self.clock = clock or datetime.now
+        self.status = STATUS_OK
+        self.error = None
+        self.started_at = _local_time(self.clock())
+        self.finished_at = None
+        self.phases = {}
+        self.counts = {}
+        self._started = time.perf_counter()
+        self.duration_ms = None
+
+    @contextmanager
+    def phase(self, name):
+        """Засечь время фазы (повторные входы в одну фазу суммируются)"""
+        phase_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - phase_start) * 1000
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def timed(self, name, iterable):
+        """Итерировать, относя время получения каждого элемента к фазе name"""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name, value=1):
+        """Увеличить счётчик"""
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def skip(self, reason):
+        """Отметить тик как пропущенный (например, вне окна уведомлений)"""
+        self.status = STATUS_SKIPPED
+        self.error = reason
+
+    def finish(self):
+        """Зафиксировать время окончания"""
+        self.finished_at = _local_time(self.clock())
+        self.duration_ms = int((time.perf_counter() - self._started) * 1000)
+
+    def to_dict(self):
+        """Представление для JSON и записи в scheduler_runs"""
+        return {
+            'job_id': self.job_id,
+            'node_id': self.node_id,
+            'status': self.status,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'duration_ms': self.duration_ms,
+            'phases': {name: round(ms, 1) for name, ms in self.phases.items()},
+            'counts': dict(self.counts),
+            'error': self.error,
+        }
+
+
+class SchedulerRunHistory:
+    """
+    История тиков планировщика
+
+    Последние тики хранятся в кольцевом буфере процесса (видны сразу, даже
+    если БД недоступна) и дублируются в таблицу scheduler_runs, общую для
+    всех процессов. Ошибка записи истории не прерывает сам тик.
+    """
+
+    def __init__(self, node_id=None, size=None, clock=None):
+        """
+        Args:
+            clock: Функция текущего времени (часы планировщика), по умолчанию
+                datetime.now; в симуляции время тиков берётся из виртуальных часов
+        """
+        self.node_id = node_id
+        self.clock = clock or datetime.now
+        self._runs = deque(maxlen=size or Config.SCHEDULER_RUNS_BUFFER)
+        self._lock = threading.Lock()
+        self._persisted = 0
+
+    @contextmanager
+    def track(self, job_id):
+        """
+        Замерить тик задачи
+
+        Исключение внутри блока помечает тик как ошибочный и пробрасывается дальше.
+        """
+        stats = TickStats(job_id, self.node_id, clock=self.clock)
+        try:
+            yield stats
+        except Exception as e:
+            stats.status = STATUS_ERROR
+            stats.error = str(e)
+            raise
+        finally:
+            stats.finish()
+            self._record(stats.to_dict())
+
+            if stats.duration_ms / 1000 >= Config.SCHEDULER_SLOW_TICK_SECONDS:
+                logger.warning(f"Медленный тик {job_id}: {stats.duration_ms} мс, "
+                               f"фазы {stats.to_dict()['phases']}, счётчики {stats.counts}")
+
+    def record_event(self, job_id, status, scheduled_at=None, error=None):
+        """Записать пропущенный (missed) или наложившийся (overlap) запуск"""
+        now = _local_time(self.clock())
+        if scheduled_at is not None:
+            scheduled_at = _local_time(scheduled_at)
+
+        self._record({
+            'job_id': job_id,
+            'node_id': self.node_id,
+            'status': status,
+            'started_at': scheduled_at or now,
+            'finished_at': now,
+            'duration_ms': None,
+            'phases': {},
+            'counts': {},
+            'error': error,
+        })
+        logger.warning(f"Задача {job_id}: запуск на {scheduled_at} не выполнен ({status})")
+
+    def recent(self, limit=None):
+        """Последние тики этого процесса (новые первыми)"""
+        with self._lock:
+            runs = list(self._runs)
+        runs.reverse()
+        return runs[:limit] if limit else runs
+
+    def _record(self, run):
+        """Добавить тик в буфер и в БД"""
+        with self._lock:
+            self._runs.append(run)
+            self._persisted += 1
+            cleanup = self._persisted % CLEANUP_EVERY == 0
+
+        try:
+            SchedulerRun.add(run)
+            if cleanup:
+                SchedulerRun.delete_older_than(Config.SCHEDULER_RUNS_RETENTION_DAYS)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить тик {run['job_id']} в scheduler_runs: {e}")
@@ -266,9 +266,117 @@ function debounce(func, wait) {
     };
 }
 
+// Экранирование текста для вставки в HTML
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+// Живые обновления дашборда (Server-Sent Events, /api/events)
+const liveTaskTexts = {
+    watering: {
+        due: 'Полить сегодня', dueClass: 'text-warning', later: 'Полить через',
+        done: 'Полито', becameDue: 'Пора полить'
+    },
+    fertilizer: {
+        due: 'Прикормить сегодня', dueClass: 'text-info', later: 'Прикормить через',
+        done: 'Прикормлено', becameDue: 'Пора прикормить'
+    }
+};
+
+function renderTaskStatus(element, taskType, task) {
+    const texts = liveTaskTexts[taskType];
+    if (!texts || !task) {
+        return;
+    }
+    if (task.days === null) {
+        element.textContent = 'Не назначено';
+    } else if (task.days <= 0) {
+        element.innerHTML = `<strong class="${texts.dueClass}">${texts.due}</strong>`;
+    } else {
+        element.textContent = `${texts.later} ${task.days} дн.`;
+    }
+}
+
+function updatePlantCard(plant) {
+    const card = document.querySelector(`.plant-card[data-plant-id="${plant.id}"]`);
+    if (!card) {
+        return;
+    }
+    Object.entries(plant.tasks).forEach(([taskType, task]) => {
+        const status = card.querySelector(`[data-task="${taskType}"]`);
+        if (status) {
+            renderTaskStatus(status, taskType, task);
+        }
+    });
+    const watering = plant.tasks.watering;
+    card.classList.toggle('needs-attention', Boolean(watering && watering.days !== null && watering.days <= 0));
+}
+
+function startLiveUpdates(url) {
+    const source = new EventSource(url);
+
+    source.addEventListener('stats', event => {
+        const stats = JSON.parse(event.data);
+        document.querySelectorAll('[data-stat]').forEach(element => {
+            const value = stats[element.dataset.stat];
+            if (value !== undefined) {
+                element.textContent = value;
+            }
+        });
+    });
+
+    source.addEventListener('plant', event => {
+        const plant = JSON.parse(event.data);
+        updatePlantCard(plant);
+        plant.done.forEach(taskType => {
+            const texts = liveTaskTexts[taskType];
+            if (texts) {
+                showNotification(`${texts.done}: ${escapeHtml(plant.name)}`, 'success');
+            }
+        });
+        plant.became_due.forEach(taskType => {
+            const texts = liveTaskTexts[taskType];
+            if (texts) {
+                showNotification(`${texts.becameDue}: ${escapeHtml(plant.name)}`, 'warning');
+            }
+        });
+    });
+
+    // Карточку нового растения проще получить с сервера вместе со всей страницей
+    source.addEventListener('plant_added', event => {
+        const plant = JSON.parse(event.data);
+        if (!document.querySelector(`.plant-card[data-plant-id="${plant.id}"]`)) {
+            window.location.reload();
+        }
+    });
+
+    source.addEventListener('plant_removed', event => {
+        const card = document.querySelector(`.plant-card[data-plant-id="${JSON.parse(event.data).id}"]`);
+        if (card) {
+            card.remove();
+        }
+    });
+
+    // Пропущенные сообщения уже недоступны на сервере
+    source.addEventListener('reload', () => window.location.reload());
+
+    // EventSource переподключается сам и передаёт Last-Event-ID
+    return source;
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const liveContainer = document.querySelector('[data-live-events]');
+    if (liveContainer && window.EventSource) {
+        startLiveUpdates(liveContainer.dataset.liveEvents);
+    }
+});
+
 // Экспорт функций для использования в других скриптах
 window.plantWatering = {
     showNotification,
-    debounce
+    debounce,
+    startLiveUpdates
 };
 
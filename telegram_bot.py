@@ -2,54 +2,129 @@
 Модуль для работы с Telegram ботом для отправки уведомлений о поливе
 """
 import logging
-from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes
+import threading
+import time
+from telegram import (Bot, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle,
+                      InlineQueryResultsButton, InputTextMessageContent, Update)
+from telegram.error import BadRequest
+from telegram.ext import (Application, CallbackQueryHandler, CommandHandler, ContextTypes, InlineQueryHandler,
+                          TypeHandler)
 import asyncio
 from config import Config
-from database import User, Plant, NotificationLog, WateringHistory
+from bot_pool import bot_pool
+from care_tasks import CARE_TASK_TYPES, TASK_TYPES_BY_PREFIX, TASK_TYPES_BY_QUICK_PREFIX
+from database import CareAlreadyDone, CareTask, User, Plant, WateringHistory
+from due_index import due_index
+from notification_templates import (NotificationTemplates, get_moscow_time, get_notification_templates,
+                                    render_completion)
+from plant_list import plant_list_cache
+from plant_search import plant_search_index
 
 logger = logging.getLogger(__name__)
 
+# Типы обновлений, которые бот запрашивает у Telegram (ВАЖНО: без callback_query не работают кнопки)
+ALLOWED_UPDATES = ['message', 'callback_query', 'inline_query']
+
+# Как долго помнить, что автор inline-запроса - пользователь портала (секунды)
+INLINE_AUTH_TTL = 300
+
 
 class TelegramNotifier:
     """Класс для работы с Telegram уведомлениями"""
     
     def __init__(self):
         self.bot_token = Config.TELEGRAM_BOT_TOKEN
-        self.bot = None
-        self.application = None
-        
-        if self.bot_token:
-            self.bot = Bot(token=self.bot_token)
-            self.application = Application.builder().token(self.bot_token).build()
-            self._setup_handlers()
-
-    def _setup_handlers(self):
+        # Bot и приложения создаются при первом обращении, а не при импорте модуля
+        self._bot = None
+        self._applications = None
+        self._lock = threading.Lock()
+
+    @property
+    def bot(self):
+        """Bot основного токена или None, если токен не задан"""
+        if self._bot is None and self.bot_token:
+            with self._lock:
+                if self._bot is None:
+                    self._bot = Bot(token=self.bot_token, **bot_pool.api_urls())
+        return self._bot
+
+    @property
+    def applications(self):
+        """Приложения всех ботов пула (первое - основной бот)"""
+        if self._applications is None:
+            with self._lock:
+                if self._applications is None:
+                    self._applications = self._build_applications()
+        return self._applications
+
+    @property
+    def application(self):
+        """Приложение основного бота или None, если токен не задан"""
+        return self.applications[0] if self.applications else None
+
+    def _build_applications(self):
+        if not self.bot_token:
+            return []
+        applications = []
+        for token in bot_pool.tokens:
+            # Обновления обрабатываются параллельно: медленный /status не задерживает
+            # нажатия кнопок. Запросы к БД в обработчиках идут через asyncio.to_thread
+            builder = Application.builder().token(token).concurrent_updates(Config.TELEGRAM_CONCURRENT_UPDATES)
+            for option, url in bot_pool.api_urls().items():
+                builder = getattr(builder, option)(url)
+            application = builder.build()
+            self._setup_handlers(application)
+            applications.append(application)
+        return applications
+
+    def _setup_handlers(self, application):
         """Настройка обработчиков команд и callback'ов"""
-        if not self.application:
+        if not application:
             return
 
         logger.info("Setting up handlers...")
 
+        # До остальных обработчиков: запоминаем, каким ботам пула пишет чат
+        application.add_handler(TypeHandler(Update, self.remember_chat), group=-1)
+
         # Команды
-        self.application.add_handler(CommandHandler("start", self.cmd_start))
-        self.application.add_handler(CommandHandler("plants", self.cmd_plants))
-        self.application.add_handler(CommandHandler("status", self.cmd_status))
-        self.application.add_handler(CommandHandler("help", self.cmd_help))
+        application.add_handler(CommandHandler("start", self.cmd_start))
+        application.add_handler(CommandHandler("plants", self.cmd_plants))
+        application.add_handler(CommandHandler("status", self.cmd_status))
+        application.add_handler(CommandHandler("help", self.cmd_help))
+
+        # Поиск растений: @бот <часть названия или местоположения>
+        application.add_handler(InlineQueryHandler(self.handle_inline_query))
 
         # Callback обработчики
-        self.application.add_handler(CallbackQueryHandler(self.handle_plant_detail_callback, pattern=r'^detail_'))
-        self.application.add_handler(CallbackQueryHandler(self.handle_watering_callback, pattern=r'^water_'))
-        self.application.add_handler(CallbackQueryHandler(self.handle_fertilizer_callback, pattern=r'^fert_'))
-        self.application.add_handler(CallbackQueryHandler(self.handle_quick_water_callback, pattern=r'^qwater_'))
-        self.application.add_handler(CallbackQueryHandler(self.handle_quick_fert_callback, pattern=r'^qfert_'))
+        application.add_handler(CallbackQueryHandler(self.handle_plant_detail_callback, pattern=r'^detail_'))
+        application.add_handler(CallbackQueryHandler(self.handle_plant_list_callback, pattern=r'^plist_'))
+        application.add_handler(CallbackQueryHandler(self.handle_location_list_callback, pattern=r'^plocs$'))
+        # Кнопки ухода: префиксы callback_data всех типов из реестра care_tasks.py
+        application.add_handler(CallbackQueryHandler(
+            self.handle_care_callback, pattern=rf"^({'|'.join(TASK_TYPES_BY_PREFIX)})_"
+        ))
+        application.add_handler(CallbackQueryHandler(
+            self.handle_quick_care_callback, pattern=rf"^({'|'.join(TASK_TYPES_BY_QUICK_PREFIX)})_"
+        ))
 
         logger.info("Handlers setup complete!")
 
+    async def remember_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Записать связь чата с ботом, получившим обновление (закрепление в пуле ботов)"""
+        if update.effective_chat:
+            await asyncio.to_thread(
+                bot_pool.remember_chat, update.effective_chat.id, bot_pool.bot_id_of(context.bot.token)
+            )
+
     async def cmd_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
         chat_id = update.effective_chat.id
 
+        # Пользователь снова пишет боту - доставка в его чат возобновляется
+        if await asyncio.to_thread(User.unsuppress_telegram, chat_id):
+            logger.info(f"Доставка в чат {chat_id} возобновлена после /start")
+
         message = (
             "🌱 Добро пожаловать в систему управления поливом растений!\n\n"
             f"Ваш Telegram ID: `{chat_id}`\n\n"
@@ -64,124 +139,198 @@ class TelegramNotifier:
         await update.message.reply_text(message, parse_mode='Markdown')
 
     async def cmd_plants(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработчик команды /plants - показать список растений"""
-        user_telegram_id = str(update.effective_user.id)
+        """
+        Обработчик команды /plants - список растений одним сообщением
 
+        Список листается кнопками, сообщение правится на месте. /plants <местоположение>
+        показывает только растения этого местоположения.
+        """
         # Проверяем, авторизован ли пользователь
-        users = User.get_all()
-        authorized = False
-        for u in users:
-            if u['telegram_id'] == user_telegram_id:
-                authorized = True
-                break
-
-        if not authorized:
+        if not await asyncio.to_thread(self._find_user, update.effective_user.id):
             await update.message.reply_text(
                 "❌ Вы не авторизованы в системе.\n\n"
                 "Добавьте ваш Telegram ID в профиль на портале для доступа к этой команде."
             )
             return
 
-        # Получаем все растения
-        plants = Plant.get_all()
+        loc_key = None
+        if context.args:
+            wanted = ' '.join(context.args).strip().lower()
+            locations = await asyncio.to_thread(plant_list_cache.locations)
+            loc_key = next((key for key, name in locations.items() if name.lower() == wanted), None) or \
+                next((key for key, name in locations.items() if wanted in name.lower()), None)
+            if not loc_key:
+                await update.message.reply_text(
+                    f"📍 Местоположение «{' '.join(context.args)}» не найдено",
+                    reply_markup=self._locations_keyboard()
+                )
+                return
+
+        message, reply_markup = await asyncio.to_thread(self._render_plant_page, 0, loc_key)
+        await update.message.reply_text(message, parse_mode='Markdown', reply_markup=reply_markup)
+
+    def _render_plant_page(self, page, loc_key=None):
+        """Текст и клавиатура страницы списка растений (из кеша, без запросов к БД)"""
+        plants, page, pages, location = plant_list_cache.page(page, loc_key)
+        loc_key = loc_key if location else ''
 
         if not plants:
-            await update.message.reply_text("🌱 В системе пока нет растений")
-            return
+            return "🌱 В системе пока нет растений", None
 
-        # Отправляем заголовок
-        await update.message.reply_text("🌿 **Список растений:**", parse_mode='Markdown')
+        message = "🌿 **Список растений**"
+        if location:
+            message += f"\n📍 {location}"
+        if pages > 1:
+            message += f"\nСтраница {page + 1} из {pages}"
 
-        # Отправляем каждое растение отдельным сообщением с кнопкой
+        keyboard = []
         for plant in plants:
-            message = f"🌱 **{plant['name']}**\n"
+            text = f"🌱 {plant['name']}"
+            if plant['location'] and not location:
+                text += f" · {plant['location']}"
+            keyboard.append([InlineKeyboardButton(text, callback_data=f"detail_{plant['id']}_{page}_{loc_key}")])
+
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("◀️ Назад", callback_data=f"plist_{page - 1}_{loc_key}"))
+        if page < pages - 1:
+            navigation.append(InlineKeyboardButton("Вперёд ▶️", callback_data=f"plist_{page + 1}_{loc_key}"))
+        if navigation:
+            keyboard.append(navigation)
+
+        if location:
+            keyboard.append([InlineKeyboardButton("🌿 Все растения", callback_data="plist_0_")])
+        elif plant_list_cache.locations():
+            keyboard.append([InlineKeyboardButton("📍 По местоположению", callback_data="plocs")])
+
+        return message, InlineKeyboardMarkup(keyboard)
+
+    def _locations_keyboard(self):
+        """Клавиатура выбора местоположения для списка растений"""
+        keyboard = [
+            [InlineKeyboardButton(f"📍 {name}", callback_data=f"plist_0_{key}")]
+            for key, name in plant_list_cache.locations().items()
+        ]
+        keyboard.append([InlineKeyboardButton("🌿 Все растения", callback_data="plist_0_")])
+        return InlineKeyboardMarkup(keyboard)
+
+    async def handle_plant_list_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Листание списка растений (plist_<страница>_<ключ местоположения>)"""
+        query = update.callback_query
+        await query.answer()
 
-            if plant['location']:
-                message += f"📍 {plant['location']}\n"
+        try:
+            _, page, loc_key = query.data.split('_', 2)
+            message, reply_markup = await asyncio.to_thread(self._render_plant_page, int(page), loc_key or None)
+            await query.edit_message_text(message, parse_mode='Markdown', reply_markup=reply_markup)
+        except BadRequest as e:
+            # Повторное нажатие той же кнопки
+            if 'message is not modified' not in str(e).lower():
+                raise
+        except Exception as e:
+            logger.error(f"Ошибка в handle_plant_list_callback: {e}", exc_info=True)
+            await query.edit_message_text("❌ Произошла ошибка при загрузке списка растений")
 
-            # Создаем кнопку для просмотра деталей
-            keyboard = [[
-                InlineKeyboardButton(
-                    "📊 Подробнее",
-                    callback_data=f"detail_{plant['id']}"
+    async def handle_location_list_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Выбор местоположения для списка растений"""
+        query = update.callback_query
+        await query.answer()
+        reply_markup = await asyncio.to_thread(self._locations_keyboard)
+        await query.edit_message_text("📍 **Выберите местоположение:**", parse_mode='Markdown',
+                                      reply_markup=reply_markup)
+
+    async def handle_inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Inline-поиск растений с кнопками быстрого ухода (индекс в памяти, без БД на запрос)"""
+        inline_query = update.inline_query
+
+        # Авторизация проверяется по БД не чаще раза в INLINE_AUTH_TTL для пользователя
+        checked_at = context.user_data.get('inline_authorized_at')
+        if checked_at is None or time.monotonic() - checked_at > INLINE_AUTH_TTL:
+            if not await asyncio.to_thread(self._find_user, inline_query.from_user.id):
+                await inline_query.answer(
+                    [], cache_time=5, is_personal=True,
+                    button=InlineQueryResultsButton("Добавьте Telegram ID в профиль на портале", start_parameter='start')
                 )
-            ]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+                return
+            context.user_data['inline_authorized_at'] = time.monotonic()
 
-            await update.message.reply_text(
-                message,
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
+        plants = await asyncio.to_thread(plant_search_index.search, inline_query.query)
+        await inline_query.answer(
+            [self._plant_inline_result(plant) for plant in plants],
+            cache_time=5, is_personal=True
+        )
+
+    @staticmethod
+    def _plant_inline_result(plant):
+        """Результат inline-поиска: карточка растения с кнопками ухода"""
+        lines = [f"🌿 **{plant['name']}**"]
+        if plant.get('location'):
+            lines.append(f"📍 {plant['location']}")
+
+        buttons = []
+        for task_type in CARE_TASK_TYPES.values():
+            if not task_type.plant_columns:
+                continue
+            interval = plant.get(task_type.plant_columns[0])
+            if interval:
+                lines.append(f"{task_type.icon} {task_type.title}: каждые {interval} дн.")
+                buttons.append(InlineKeyboardButton(
+                    task_type.quick_button_text, callback_data=f"{task_type.quick_prefix}_{plant['id']}"
+                ))
+
+        keyboard = [buttons] if buttons else []
+        keyboard.append([InlineKeyboardButton("📊 Подробнее", callback_data=f"detail_{plant['id']}")])
+
+        return InlineQueryResultArticle(
+            id=str(plant['id']),
+            title=plant['name'],
+            description=plant.get('location') or None,
+            input_message_content=InputTextMessageContent('\n'.join(lines), parse_mode='Markdown'),
+            reply_markup=InlineKeyboardMarkup(keyboard),
+        )
 
     async def cmd_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /status - показать статус растений"""
-        user_telegram_id = str(update.effective_user.id)
-
         # Проверяем, авторизован ли пользователь
-        users = User.get_all()
-        authorized = False
-        for u in users:
-            if u['telegram_id'] == user_telegram_id:
-                authorized = True
-                break
-
-        if not authorized:
+        if not await asyncio.to_thread(self._find_user, update.effective_user.id):
             await update.message.reply_text(
                 "❌ Вы не авторизованы в системе.\n\n"
                 "Добавьте ваш Telegram ID в профиль на портале для доступа к этой команде."
             )
             return
 
-        # Получаем все растения
-        plants = Plant.get_all()
+        message = await asyncio.to_thread(self._build_status_message)
+        await update.message.reply_text(message, parse_mode='Markdown')
 
-        if not plants:
-            await update.message.reply_text("🌱 В системе пока нет растений")
-            return
+    def _build_status_message(self):
+        """Текст /status (синхронно: выполняется в потоке, чтобы не держать event loop)"""
+        if not due_index.total():
+            return "🌱 В системе пока нет растений"
 
         from datetime import datetime
         today = datetime.now().date()
 
-        # Разделяем растения на категории
-        need_water = []
-        need_fertilizer = []
-        ok_plants = []
-
-        for plant in plants:
-            needs_water = plant['next_watering_date'] and plant['next_watering_date'] <= today
-            needs_fert = (plant['fertilizer_interval_days'] and
-                         plant['next_fertilizer_date'] and
-                         plant['next_fertilizer_date'] <= today)
-
-            if needs_water:
-                need_water.append(plant)
-            elif needs_fert:
-                need_fertilizer.append(plant)
-            else:
-                ok_plants.append(plant)
+        # Сроки ухода из индекса в памяти: списки уже отсортированы по сроку
+        due_by_type = {task_type: due_index.due(task_type, today) for task_type in CARE_TASK_TYPES}
+        due_plant_ids = {task['id'] for tasks in due_by_type.values() for task in tasks}
+        ok_plants = due_index.ok_plants(today)
 
         # Формируем сообщение
         message = "📊 **Статус растений**\n\n"
 
-        if need_water:
-            message += "💧 **Требуют полива:**\n"
-            for plant in need_water:
-                days_overdue = (today - plant['next_watering_date']).days if plant['next_watering_date'] else 0
-                if days_overdue > 0:
-                    message += f"  🔴 {plant['name']} (просрочено {days_overdue} дн.)\n"
-                else:
-                    message += f"  ⚠️ {plant['name']} (сегодня)\n"
-            message += "\n"
-
-        if need_fertilizer:
-            message += "🌱 **Требуют прикормки:**\n"
-            for plant in need_fertilizer:
-                days_overdue = (today - plant['next_fertilizer_date']).days if plant['next_fertilizer_date'] else 0
+        for task_type, tasks in due_by_type.items():
+            if not tasks:
+                continue
+            definition = CARE_TASK_TYPES.get(task_type)
+            icon = definition.icon if definition else "🔔"
+            title = definition.action_genitive if definition else task_type
+            message += f"{icon} **Требуют {title}:**\n"
+            for task in tasks:
+                days_overdue = (today - task['next_due']).days
                 if days_overdue > 0:
-                    message += f"  🟡 {plant['name']} (просрочено {days_overdue} дн.)\n"
+                    message += f"  🔴 {task['name']} (просрочено {days_overdue} дн.)\n"
                 else:
-                    message += f"  ⚠️ {plant['name']} (сегодня)\n"
+                    message += f"  ⚠️ {task['name']} (сегодня)\n"
             message += "\n"
 
         if ok_plants:
@@ -193,10 +342,10 @@ class TelegramNotifier:
                 else:
                     message += f"  🟢 {plant['name']}\n"
 
-        if not need_water and not need_fertilizer:
+        if not due_plant_ids:
             message += "\n🎉 Все растения в порядке!"
 
-        await update.message.reply_text(message, parse_mode='Markdown')
+        return message
 
     async def cmd_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /help - справка"""
@@ -205,12 +354,14 @@ class TelegramNotifier:
             "📋 **Доступные команды:**\n\n"
             "/start - Получить ваш Telegram ID\n"
             "/plants - Показать список всех растений\n"
+            "/plants <место> - Растения одного местоположения\n"
+            "@бот <название> - Найти растение в любом чате\n"
             "/status - Показать статус растений (какие требуют ухода)\n"
             "/help - Показать эту справку\n\n"
             "💡 **Как это работает:**\n"
             "• Система автоматически отправит уведомление, когда растение нужно полить\n"
             "• Нажмите кнопку '✅ Я полью' после полива\n"
-            "• Другие пользователи получат уведомление о выполненном поливе\n"
+            "• У остальных уведомление сменится на «выполнено» и кнопка исчезнет\n"
             "• Используйте /plants для просмотра всех растений\n"
             "• Используйте /status для проверки текущего состояния\n\n"
             "❓ Вопросы? Обратитесь к администратору системы."
@@ -219,220 +370,122 @@ class TelegramNotifier:
         await update.message.reply_text(message, parse_mode='Markdown')
 
     async def handle_plant_detail_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработчик кнопки просмотра деталей растения"""
+        """Обработчик кнопки просмотра деталей растения (detail_<id>[_<страница>_<местоположение>])"""
         query = update.callback_query
         await query.answer()
 
         try:
-            # Парсим ID растения
-            plant_id = int(query.data.split('_')[1])
+            # Парсим ID растения и страницу списка, с которой открыли детали
+            parts = query.data.split('_', 3)
+            plant_id = int(parts[1])
 
-            # Получаем растение
-            plant = Plant.get_by_id(plant_id)
-            if not plant:
+            back = f"plist_{parts[2]}_{parts[3]}" if len(parts) == 4 else None
+            detail = await asyncio.to_thread(self._build_plant_detail, plant_id, back)
+            if not detail:
                 await query.edit_message_text("❌ Растение не найдено")
                 return
 
-            # Получаем историю
-            history = WateringHistory.get_by_plant(plant_id, limit=5)
-
-            from datetime import datetime
-            today = datetime.now().date()
-
-            # Формируем детальное сообщение
-            message = f"🌿 **{plant['name']}**\n\n"
-
-            if plant.get('description'):
-                message += f"ℹ️ {plant['description']}\n\n"
-
-            if plant.get('location'):
-                message += f"📍 Местоположение: {plant['location']}\n"
-
-            message += f"💧 Интервал полива: {plant['watering_interval_days']} дней\n"
-
-            if plant.get('fertilizer_interval_days'):
-                message += f"🌱 Интервал прикормки: {plant['fertilizer_interval_days']} дней\n"
-
-            message += "\n"
-
-            # Следующий полив
-            if plant.get('next_watering_date'):
-                days_until = (plant['next_watering_date'] - today).days
-                if days_until < 0:
-                    message += f"💧 **Полив просрочен на {abs(days_until)} дн.**\n"
-                elif days_until == 0:
-                    message += f"💧 **Полить сегодня**\n"
-                else:
-                    message += f"💧 Следующий полив: через {days_until} дн. ({plant['next_watering_date'].strftime('%d.%m.%Y')})\n"
-
-            # Следующая прикормка
-            if plant.get('next_fertilizer_date'):
-                days_until = (plant['next_fertilizer_date'] - today).days
-                if days_until < 0:
-                    message += f"🌱 **Прикормка просрочена на {abs(days_until)} дн.**\n"
-                elif days_until == 0:
-                    message += f"🌱 **Прикормить сегодня**\n"
-                else:
-                    message += f"🌱 Следующая прикормка: через {days_until} дн. ({plant['next_fertilizer_date'].strftime('%d.%m.%Y')})\n"
-
-            # История
-            if history:
-                message += "\n📜 **Последние действия:**\n"
-                for entry in history[:3]:
-                    action_icon = "💧" if entry['action_type'] == 'watering' else "🌱"
-                    action_text = "полил(а)" if entry['action_type'] == 'watering' else "прикормил(а)"
-                    date_str = entry['watered_at'].strftime('%d.%m.%Y')
-                    message += f"{action_icon} {entry['user_name']} {action_text} ({date_str})\n"
-            else:
-                message += "\n📜 История пока пуста\n"
-
-            # Создаём кнопки для быстрого полива и прикормки
-            keyboard = [[
-                InlineKeyboardButton("💧 Полить", callback_data=f"qwater_{plant['id']}"),
-            ]]
-            # Добавляем кнопку прикормки только если у растения есть интервал прикормки
-            if plant.get('fertilizer_interval_days'):
-                keyboard[0].append(InlineKeyboardButton("🌱 Прикормить", callback_data=f"qfert_{plant['id']}"))
-
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
+            message, reply_markup = detail
             await query.edit_message_text(message, parse_mode='Markdown', reply_markup=reply_markup)
 
         except Exception as e:
             logger.error(f"Ошибка в handle_plant_detail_callback: {e}", exc_info=True)
             await query.edit_message_text("❌ Произошла ошибка при загрузке информации о растении")
 
-    async def handle_quick_water_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработчик быстрого полива из деталей растения"""
-        query = update.callback_query
-        await query.answer()
-
-        plant_id = int(query.data.split('_')[1])
-        user_telegram_id = str(query.from_user.id)
-
-        users = User.get_all()
-        user = None
-        for u in users:
-            if u['telegram_id'] == user_telegram_id:
-                user = u
-                break
+    def _build_plant_detail(self, plant_id, back=None):
+        """
+        Текст и клавиатура деталей растения (синхронно, выполняется в потоке)
 
-        if not user:
-            await query.edit_message_text(
-                "❌ Пользователь не найден. Убедитесь, что ваш Telegram ID добавлен в профиль."
-            )
-            return
+        Args:
+            back: callback_data кнопки возврата к списку или None
 
+        Returns:
+            (текст, клавиатура) или None, если растение не найдено
+        """
+        # Получаем растение
         plant = Plant.get_by_id(plant_id)
         if not plant:
-            await query.edit_message_text("❌ Растение не найдено.")
-            return
+            return None
 
-        success = Plant.update_watering(plant_id, user['id'])
+        # Получаем историю
+        history = WateringHistory.get_by_plant(plant_id, limit=5)
 
-        if success:
-            await query.edit_message_text(
-                f"✅ {user['name']} полил(а) растение **{plant['name']}**\n"
-                f"Дата: {self._get_moscow_time().strftime('%d.%m.%Y %H:%M')}",
-                parse_mode='Markdown'
-            )
-            await self.notify_watering_completed(plant, user)
-        else:
-            await query.edit_message_text("❌ Ошибка при обновлении данных о поливе.")
+        from datetime import datetime
+        today = datetime.now().date()
 
-    async def handle_quick_fert_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработчик быстрой прикормки из деталей растения"""
-        query = update.callback_query
-        await query.answer()
+        # Формируем детальное сообщение
+        message = f"🌿 **{plant['name']}**\n\n"
 
-        plant_id = int(query.data.split('_')[1])
-        user_telegram_id = str(query.from_user.id)
+        if plant.get('description'):
+            message += f"ℹ️ {plant['description']}\n\n"
 
-        users = User.get_all()
-        user = None
-        for u in users:
-            if u['telegram_id'] == user_telegram_id:
-                user = u
-                break
+        if plant.get('location'):
+            message += f"📍 Местоположение: {plant['location']}\n"
 
-        if not user:
-            await query.edit_message_text(
-                "❌ Пользователь не найден. Убедитесь, что ваш Telegram ID добавлен в профиль."
-            )
-            return
+        message += f"💧 Интервал полива: {plant['watering_interval_days']} дней\n"
 
-        plant = Plant.get_by_id(plant_id)
-        if not plant:
-            await query.edit_message_text("❌ Растение не найдено.")
-            return
+        if plant.get('fertilizer_interval_days'):
+            message += f"🌱 Интервал прикормки: {plant['fertilizer_interval_days']} дней\n"
 
-        success = Plant.update_fertilizer(plant_id, user['id'])
+        message += "\n"
 
-        if success:
-            await query.edit_message_text(
-                f"✅ {user['name']} прикормил(а) растение **{plant['name']}**\n"
-                f"Дата: {self._get_moscow_time().strftime('%d.%m.%Y %H:%M')}",
-                parse_mode='Markdown'
-            )
-            await self.notify_fertilizer_completed(plant, user)
+        # Следующий полив
+        if plant.get('next_watering_date'):
+            days_until = (plant['next_watering_date'] - today).days
+            if days_until < 0:
+                message += f"💧 **Полив просрочен на {abs(days_until)} дн.**\n"
+            elif days_until == 0:
+                message += f"💧 **Полить сегодня**\n"
+            else:
+                message += f"💧 Следующий полив: через {days_until} дн. ({plant['next_watering_date'].strftime('%d.%m.%Y')})\n"
+
+        # Следующая прикормка
+        if plant.get('next_fertilizer_date'):
+            days_until = (plant['next_fertilizer_date'] - today).days
+            if days_until < 0:
+                message += f"🌱 **Прикормка просрочена на {abs(days_until)} дн.**\n"
+            elif days_until == 0:
+                message += f"🌱 **Прикормить сегодня**\n"
+            else:
+                message += f"🌱 Следующая прикормка: через {days_until} дн. ({plant['next_fertilizer_date'].strftime('%d.%m.%Y')})\n"
+
+        # История
+        if history:
+            message += "\n📜 **Последние действия:**\n"
+            for entry in history[:3]:
+                definition = CARE_TASK_TYPES.get(entry['action_type'])
+                action_icon = definition.icon if definition else "✅"
+                action_text = definition.action_past if definition else entry['action_type']
+                date_str = entry['watered_at'].strftime('%d.%m.%Y')
+                message += f"{action_icon} {entry['user_name']} {action_text} ({date_str})\n"
         else:
-            await query.edit_message_text("❌ Ошибка при обновлении данных о прикормке.")
-
-    async def handle_watering_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработчик нажатия кнопки полива"""
-        query = update.callback_query
-        await query.answer()
+            message += "\n📜 История пока пуста\n"
 
-        # Парсим данные из callback
-        data = query.data.split('_')
-        if len(data) < 3:
-            return
-
-        plant_id = int(data[1])
-        log_id = int(data[2])
-        user_telegram_id = str(query.from_user.id)
-
-        # Находим пользователя по Telegram ID
-        users = User.get_all()
-        user = None
-        for u in users:
-            if u['telegram_id'] == user_telegram_id:
-                user = u
-                break
-
-        if not user:
-            await query.edit_message_text(
-                "❌ Пользователь не найден. Убедитесь, что ваш Telegram ID добавлен в профиль."
+        # Кнопки быстрого ухода - по активным задачам растения
+        keyboard = [[
+            InlineKeyboardButton(
+                CARE_TASK_TYPES[task['task_type']].quick_button_text,
+                callback_data=f"{CARE_TASK_TYPES[task['task_type']].quick_prefix}_{plant['id']}"
             )
-            return
-
-        # Получаем растение
-        plant = Plant.get_by_id(plant_id)
-        if not plant:
-            await query.edit_message_text("❌ Растение не найдено.")
-            return
+            for task in CareTask.get_for_plant(plant_id)
+            if task['task_type'] in CARE_TASK_TYPES
+        ]]
+        if back:
+            keyboard.append([InlineKeyboardButton("⬅️ К списку", callback_data=back)])
 
-        # Обновляем полив
-        success = Plant.update_watering(plant_id, user['id'])
+        return message, InlineKeyboardMarkup(keyboard)
 
-        if success:
-            # Отмечаем уведомление как выполненное
-            NotificationLog.mark_completed(log_id, user['id'])
-
-            # Обновляем сообщение
-            await query.edit_message_text(
-                f"✅ {user['name']} полил(а) растение **{plant['name']}**\n"
-                f"Дата: {self._get_moscow_time().strftime('%d.%m.%Y %H:%M')}",
-                parse_mode='Markdown'
-            )
+    async def handle_quick_care_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик быстрого ухода из деталей растения (qwater_<plant>, qfert_<plant>, ...)"""
+        query = update.callback_query
+        await query.answer()
 
-            # Уведомляем других пользователей
-            await self.notify_watering_completed(plant, user)
-        else:
-            await query.edit_message_text("❌ Ошибка при обновлении данных о поливе.")
+        prefix, plant_id = query.data.split('_')[:2]
+        task_type = TASK_TYPES_BY_QUICK_PREFIX[prefix]
+        await self._complete_care(query, task_type, int(plant_id))
 
-    async def handle_fertilizer_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработчик нажатия кнопки прикормки"""
+    async def handle_care_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик кнопки уведомления (water_<plant>_<log>, fert_<plant>_<log>, ...)"""
         query = update.callback_query
         await query.answer()
 
@@ -441,113 +494,81 @@ class TelegramNotifier:
         if len(data) < 3:
             return
 
-        plant_id = int(data[1])
-        log_id = int(data[2])
-        user_telegram_id = str(query.from_user.id)
+        task_type = TASK_TYPES_BY_PREFIX[data[0]]
+        await self._complete_care(query, task_type, int(data[1]), int(data[2]))
 
-        # Находим пользователя по Telegram ID
-        users = User.get_all()
-        user = None
-        for u in users:
-            if u['telegram_id'] == user_telegram_id:
-                user = u
-                break
+    async def _complete_care(self, query, task_type, plant_id, log_id=None):
+        """Отметить уход выполненным от имени нажавшего кнопку пользователя"""
+        edited_message = (query.message.chat_id, query.message.message_id) if log_id and query.message else None
+        result = await asyncio.to_thread(
+            self._complete_care_sync, query.from_user.id, task_type, plant_id, log_id, edited_message
+        )
+        if query.message and query.message.photo:
+            # Уведомление с фото растения: текст в подписи
+            await query.edit_message_caption(result, parse_mode='Markdown')
+        else:
+            await query.edit_message_text(result, parse_mode='Markdown')
+
+    def _complete_care_sync(self, telegram_id, task_type, plant_id, log_id, edited_message):
+        """
+        Запросы к БД для отметки ухода (выполняется в потоке)
 
+        Returns:
+            Текст, которым заменяется нажатое сообщение
+        """
+        # Находим пользователя по Telegram ID
+        user = self._find_user(telegram_id)
         if not user:
-            await query.edit_message_text(
-                "❌ Пользователь не найден. Убедитесь, что ваш Telegram ID добавлен в профиль."
-            )
-            return
+            return "❌ Пользователь не найден. Убедитесь, что ваш Telegram ID добавлен в профиль."
 
         # Получаем растение
         plant = Plant.get_by_id(plant_id)
         if not plant:
-            await query.edit_message_text("❌ Растение не найдено.")
-            return
-
-        # Обновляем прикормку
-        success = Plant.update_fertilizer(plant_id, user['id'])
-
-        if success:
-            # Отмечаем уведомление как выполненное
-            NotificationLog.mark_completed(log_id, user['id'])
+            return "❌ Растение не найдено."
 
-            # Обновляем сообщение
-            await query.edit_message_text(
-                f"✅ {user['name']} прикормил(а) растение **{plant['name']}**\n"
-                f"Дата: {self._get_moscow_time().strftime('%d.%m.%Y %H:%M')}",
-                parse_mode='Markdown'
+        # Доставленные уведомления остальных получателей правятся на месте:
+        # правки пишутся в outbox в той же транзакции. Нажатое сообщение правит вызывающий код
+        completion_text = render_completion(plant['name'], task_type.key, user['name'], self._get_moscow_time())
+        try:
+            success = CareTask.complete(
+                plant_id, task_type.key, user['id'],
+                completion_text=completion_text, edited_message=edited_message, log_id=log_id
+            )
+        except CareAlreadyDone as e:
+            # Кто-то успел раньше: вторая отметка за тот же срок не записывается
+            done_at = f" в {e.done_at.strftime('%H:%M')}" if e.done_at else ""
+            return (
+                f"{task_type.icon} **{plant['name']}**\n\n"
+                f"✅ Уже выполнено: {e.user_name or 'другой пользователь'}{done_at}"
             )
 
-            # Уведомляем других пользователей
-            await self.notify_fertilizer_completed(plant, user)
-        else:
-            await query.edit_message_text("❌ Ошибка при обновлении данных о прикормке.")
+        if not success:
+            return f"❌ Ошибка при обновлении данных ({task_type.title.lower()})."
+        return completion_text
+
+    @staticmethod
+    def _find_user(telegram_id):
+        """Пользователь портала с этим Telegram ID или None"""
+        telegram_id = str(telegram_id)
+        for user in User.get_all():
+            if user['telegram_id'] == telegram_id:
+                return user
+        return None
 
     def _get_moscow_time(self):
         """Получить текущее московское время"""
-        from datetime import datetime
-        import pytz
-        moscow_tz = pytz.timezone('Europe/Moscow')
-        return datetime.now(moscow_tz)
+        return get_moscow_time()
 
     async def send_watering_notification(self, plant, log_id, attempt_number=0):
         """Отправить уведомление о необходимости полива"""
-        if not self.bot:
-            logger.warning("Telegram бот не инициализирован")
-            return
-
-        users = User.get_users_for_notifications()
-
-        if not users:
-            logger.info("Нет пользователей для отправки уведомлений")
-            return
-
-        # Формируем заголовок
-        if attempt_number > 0:
-            from database import SystemSettings
-            retry_message = SystemSettings.get(f'retry_message_{attempt_number}', '')
-
-            if retry_message:
-                header = f"{retry_message}\n\n"
-            else:
-                header = f"⚠️ Напоминание #{attempt_number}: растение все еще ждет полива!\n\n"
-        else:
-            header = "💧 **Время полить растение!**\n\n"
-
-        # Формируем сообщение
-        message = (
-            f"{header}"
-            f"🌿 Растение: **{plant['name']}**\n"
-        )
-
-        if plant['location']:
-            message += f"📍 Местоположение: {plant['location']}\n"
-
-        if plant['description']:
-            message += f"ℹ️ {plant['description']}\n"
-
-        message += f"\n⏰ Дата уведомления: {self._get_moscow_time().strftime('%d.%m.%Y %H:%M')}"
-
-        # Создаем кнопку
-        keyboard = [[InlineKeyboardButton("✅ Я полью", callback_data=f"water_{plant['id']}_{log_id}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        # Отправляем всем пользователям
-        for user in users:
-            try:
-                await self.bot.send_message(
-                    chat_id=user['telegram_id'],
-                    text=message,
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
-                logger.info(f"Отправлено уведомление о поливе пользователю {user['name']}")
-            except Exception as e:
-                logger.error(f"Ошибка отправки уведомления пользователю {user['name']}: {e}")
+        await self.send_notification(plant, 'watering', log_id, attempt_number)
 
     async def send_fertilizer_notification(self, plant, log_id, attempt_number=0):
         """Отправить уведомление о необходимости прикормки"""
+        await self.send_notification(plant, 'fertilizer', log_id, attempt_number)
+
+    async def send_notification(self, plant, notif_type, log_id, attempt_number=0):
+        """Отправить уведомление всем пользователям по общим шаблонам планировщика"""
         if not self.bot:
             logger.warning("Telegram бот не инициализирован")
             return
@@ -558,38 +579,8 @@ class TelegramNotifier:
             logger.info("Нет пользователей для отправки уведомлений")
             return
 
-        # Формируем заголовок
-        if attempt_number > 0:
-            from database import SystemSettings
-            retry_message = SystemSettings.get(f'retry_message_{attempt_number}', '')
-
-            if retry_message:
-                retry_message = retry_message.replace('полив', 'прикормк')
-                retry_message = retry_message.replace('Полейте', 'Прикормите')
-                retry_message = retry_message.replace('вод', 'удобрен')
-                header = f"{retry_message}\n\n"
-            else:
-                header = f"⚠️ Напоминание #{attempt_number}: растение все еще ждет прикормки!\n\n"
-        else:
-            header = "🌱 **Время прикормить растение!**\n\n"
-
-        # Формируем сообщение
-        message = (
-            f"{header}"
-            f"🌿 Растение: **{plant['name']}**\n"
-        )
-
-        if plant['location']:
-            message += f"📍 Местоположение: {plant['location']}\n"
-
-        if plant['description']:
-            message += f"ℹ️ {plant['description']}\n"
-
-        message += f"\n⏰ Дата уведомления: {self._get_moscow_time().strftime('%d.%m.%Y %H:%M')}"
-
-        # Создаем кнопку
-        keyboard = [[InlineKeyboardButton("✅ Я прикормлю", callback_data=f"fert_{plant['id']}_{log_id}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        message = get_notification_templates().render(plant, notif_type, attempt_number)
+        reply_markup = NotificationTemplates.keyboard(notif_type, plant['id'], log_id)
 
         # Отправляем всем пользователям
         for user in users:
@@ -600,73 +591,57 @@ class TelegramNotifier:
                     reply_markup=reply_markup,
                     parse_mode='Markdown'
                 )
-                logger.info(f"Отправлено уведомление о прикормке пользователю {user['name']}")
+                logger.info(f"Отправлено уведомление ({notif_type}) пользователю {user['name']}")
             except Exception as e:
                 logger.error(f"Ошибка отправки уведомления пользователю {user['name']}: {e}")
 
-    async def notify_watering_completed(self, plant, completed_by_user):
-        """Уведомить других пользователей о выполненном поливе"""
-        if not self.bot:
-            return
-
-        users = User.get_users_for_notifications()
-
-        message = (
-            f"ℹ️ **Информация о поливе**\n\n"
-            f"👤 {completed_by_user['name']} полил(а) растение **{plant['name']}**\n"
-            f"⏰ {self._get_moscow_time().strftime('%d.%m.%Y %H:%M')}"
-        )
-
-        for user in users:
-            if user['id'] != completed_by_user['id']:
-                try:
-                    await self.bot.send_message(
-                        chat_id=user['telegram_id'],
-                        text=message,
-                        parse_mode='Markdown'
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка отправки уведомления пользователю {user['name']}: {e}")
-
-    async def notify_fertilizer_completed(self, plant, completed_by_user):
-        """Уведомить других пользователей о выполненной прикормке"""
-        if not self.bot:
-            return
-
-        users = User.get_users_for_notifications()
-
-        message = (
-            f"ℹ️ **Информация о прикормке**\n\n"
-            f"👤 {completed_by_user['name']} прикормил(а) растение **{plant['name']}**\n"
-            f"⏰ {self._get_moscow_time().strftime('%d.%m.%Y %H:%M')}"
-        )
-
-        for user in users:
-            if user['id'] != completed_by_user['id']:
-                try:
-                    await self.bot.send_message(
-                        chat_id=user['telegram_id'],
-                        text=message,
-                        parse_mode='Markdown'
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка отправки уведомления пользователю {user['name']}: {e}")
-
     def run_bot(self):
-        """Запустить бота"""
-        if self.application:
+        """Запустить бота (или все боты пула в одном event loop)"""
+        if self.applications and Config.TELEGRAM_MODE == 'webhook':
+            from telegram_webhook import WebhookServer
+
+            logger.info("Starting bot webhook server...")
+            try:
+                asyncio.run(WebhookServer(self.applications, ALLOWED_UPDATES).run())
+            except Exception as e:
+                logger.error(f"Error in webhook server: {e}", exc_info=True)
+        elif len(self.applications) > 1:
+            logger.info(f"Starting polling for {len(self.applications)} bots...")
+            try:
+                asyncio.run(self._run_all_polling())
+            except Exception as e:
+                logger.error(f"Error in polling: {e}", exc_info=True)
+        elif self.application:
             logger.info("Starting bot polling...")
             try:
-                # ВАЖНО: указываем allowed_updates для получения callback'ов
                 self.application.run_polling(
                     drop_pending_updates=True,
-                    allowed_updates=['message', 'callback_query']
+                    allowed_updates=ALLOWED_UPDATES
                 )
             except Exception as e:
                 logger.error(f"Error in run_polling: {e}", exc_info=True)
         else:
             logger.error("Cannot run bot: application is None")
 
+    async def _run_all_polling(self):
+        """Опрос обновлений всех ботов пула до остановки процесса"""
+        started = []
+        try:
+            for application in self.applications:
+                await application.initialize()
+                await application.start()
+                await application.updater.start_polling(
+                    drop_pending_updates=True,
+                    allowed_updates=ALLOWED_UPDATES
+                )
+                started.append(application)
+            await asyncio.Event().wait()
+        finally:
+            for application in reversed(started):
+                await application.updater.stop()
+                await application.stop()
+                await application.shutdown()
+
 
 # Глобальный экземпляр уведомителя
 telegram_notifier = TelegramNotifier()
\ No newline at end of file
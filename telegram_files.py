@@ -0,0 +1,101 @@
+"""
+Кеш file_id Telegram для фото растений
+"""
+import logging
+import os
+import threading
+from database import TelegramFile
+
+logger = logging.getLogger(__name__)
+
+# Корень приложения: image_url вида /static/uploads/<файл> лежит относительно него
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Сколько другие отправители ждут загрузки фото первым (секунды)
+UPLOAD_WAIT_SECONDS = 30
+
+
+def image_path(image_url):
+    """Путь к файлу фото на диске или None, если файла нет"""
+    if not image_url or not image_url.startswith('/static/'):
+        return None
+    path = os.path.normpath(os.path.join(APP_ROOT, image_url.lstrip('/')))
+    if not path.startswith(os.path.join(APP_ROOT, 'static')) or not os.path.isfile(path):
+        return None
+    return path
+
+
+class TelegramFileCache:
+    """
+    file_id загруженных в Telegram фото (таблица telegram_files)
+
+    file_id действителен только для загрузившего бота, поэтому хранится по
+    паре (image_url, bot_id). Новое фото растения получает новый image_url
+    (имя файла с меткой времени), так что старый file_id просто перестаёт
+    использоваться; его строки удаляются при смене фото (Plant.update).
+    Пока одно фото загружается, остальные отправители того же процесса ждут
+    его file_id, а не загружают файл параллельно.
+    """
+
+    def __init__(self):
+        self._file_ids = {}
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def get(self, image_url, bot_id):
+        """file_id фото для бота или None (сначала память процесса, затем БД)"""
+        key = (image_url, bot_id)
+        file_id = self._file_ids.get(key)
+        if file_id is None:
+            try:
+                file_id = TelegramFile.get_file_id(image_url, bot_id)
+            except Exception as e:
+                logger.error(f"Ошибка чтения file_id для {image_url}: {e}")
+                return None
+            if file_id:
+                self._file_ids[key] = file_id
+        return file_id
+
+    def put(self, image_url, bot_id, file_id):
+        """Запомнить file_id после первой загрузки и разбудить ждущих"""
+        self._file_ids[(image_url, bot_id)] = file_id
+        try:
+            TelegramFile.save(image_url, bot_id, file_id)
+        except Exception as e:
+            logger.error(f"Ошибка записи file_id для {image_url}: {e}")
+        self.finish_upload(image_url, bot_id)
+
+    def forget(self, image_url, bot_id):
+        """Забыть file_id, который Telegram больше не принимает"""
+        self._file_ids.pop((image_url, bot_id), None)
+        try:
+            TelegramFile.delete(image_url, bot_id)
+        except Exception as e:
+            logger.error(f"Ошибка удаления file_id для {image_url}: {e}")
+
+    def start_upload(self, image_url, bot_id):
+        """
+        Занять загрузку фото
+
+        Returns:
+            (True, None) - загружать этому отправителю (затем put или finish_upload),
+            (False, event) - фото уже загружается, дождитесь event
+        """
+        key = (image_url, bot_id)
+        with self._lock:
+            event = self._uploads.get(key)
+            if event is not None:
+                return False, event
+            self._uploads[key] = threading.Event()
+            return True, None
+
+    def finish_upload(self, image_url, bot_id):
+        """Снять отметку загрузки (в том числе после ошибки)"""
+        with self._lock:
+            event = self._uploads.pop((image_url, bot_id), None)
+        if event is not None:
+            event.set()
+
+
+# Глобальный кеш file_id
+telegram_file_cache = TelegramFileCache()
@@ -0,0 +1,186 @@
+"""
+Приём обновлений Telegram через вебхук (TELEGRAM_MODE=webhook)
+"""
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telegram import Update
+from config import Config
+from bot_pool import BotPool
+
+logger = logging.getLogger(__name__)
+
+# Путь вебхука, к нему добавляется ID бота пула: /telegram/<bot_id>
+WEBHOOK_PATH = '/telegram'
+
+# Максимальный размер тела запроса (байты)
+MAX_BODY_SIZE = 1024 * 1024
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+    Встроенный HTTP-сервер вебхука
+
+    Запрос проверяется по секрету (заголовок X-Telegram-Bot-Api-Secret-Token):
+    путь /telegram/<bot_id> не защищает, ID бота публичен. Без секрета запросы не
+    принимаются - если TELEGRAM_WEBHOOK_SECRET пуст, секрет генерируется при
+    запуске и передаётся Telegram в set_webhook. Обновление кладётся в очередь, и Telegram сразу получает 200 - не дожидаясь
+    обработки. Обновления обрабатывают TELEGRAM_WEBHOOK_WORKERS корутин в
+    event loop бота. В очереди и в обработке одновременно не больше
+    TELEGRAM_WEBHOOK_QUEUE_SIZE обновлений: сверх этого сервер отвечает 503,
+    и Telegram повторит доставку позже, поэтому всплеск нажатий не съедает память.
+
+    Для локальной проверки задайте TELEGRAM_WEBHOOK_SECRET, оставьте
+    TELEGRAM_WEBHOOK_URL пустым (вебхук не регистрируется) и отправьте записанное обновление POST-запросом на
+    http://localhost:<порт>/telegram/<ID бота>.
+    """
+
+    def __init__(self, applications, allowed_updates, host=None, port=None, secret=None,
+                 workers=None, queue_size=None, public_url=None):
+        """
+        Args:
+            applications: Приложения python-telegram-bot всех ботов пула
+            allowed_updates: Типы обновлений, которые запрашиваются у Telegram
+        """
+        self.applications = {BotPool.bot_id_of(app.bot.token): app for app in applications}
+        self.allowed_updates = allowed_updates
+        self.host = host or Config.TELEGRAM_WEBHOOK_HOST
+        self.port = port or Config.TELEGRAM_WEBHOOK_PORT
+        self.secret = Config.TELEGRAM_WEBHOOK_SECRET if secret is None else secret
+        self.secret_generated = not self.secret
+        if self.secret_generated:
+            # Символы token_urlsafe допустимы в secret_token Bot API
+            self.secret = secrets.token_urlsafe(32)
+        self.workers = workers or Config.TELEGRAM_WEBHOOK_WORKERS
+        self.public_url = Config.TELEGRAM_WEBHOOK_URL if public_url is None else public_url
+        self._slots = threading.BoundedSemaphore(queue_size or Config.TELEGRAM_WEBHOOK_QUEUE_SIZE)
+        self._loop = None
+        self._queue = None
+        self._httpd = None
+        self.received = 0
+        self.rejected = 0
+
+    async def run(self):
+        """Принимать обновления до отмены задачи (Ctrl+C)"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+
+        if self.secret_generated:
+            if self.public_url:
+                logger.warning("TELEGRAM_WEBHOOK_SECRET не задан - вебхук зарегистрирован со случайным "
+                               "секретом этого процесса; для нескольких экземпляров задайте общий секрет")
+            else:
+                logger.warning("TELEGRAM_WEBHOOK_SECRET не задан - все запросы к вебхуку будут отклонены; "
+                               "для локальной проверки задайте секрет")
+
+        started = []
+        workers = []
+        try:
+            for bot_id, application in self.applications.items():
+                await application.initialize()
+                await application.start()
+                started.append(application)
+                if self.public_url:
+                    await application.bot.set_webhook(
+                        url=f"{self.public_url}{WEBHOOK_PATH}/{bot_id}",
+                        secret_token=self.secret,
+                        allowed_updates=self.allowed_updates,
+                        drop_pending_updates=True,
+                    )
+
+            workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+            self._httpd = ThreadingHTTPServer((self.host, self.port), WebhookRequestHandler)
+            self._httpd.daemon_threads = True
+            self._httpd.webhook = self
+            threading.Thread(target=self._httpd.serve_forever, name="telegram-webhook", daemon=True).start()
+            logger.info(f"Вебхук Telegram слушает {self.host}:{self.port}{WEBHOOK_PATH}/<bot_id> "
+                        f"(ботов: {len(self.applications)}, обработчиков: {self.workers})")
+
+            await asyncio.Event().wait()
+        finally:
+            if self._httpd:
+                self._httpd.shutdown()
+                self._httpd.server_close()
+            for task in workers:
+                task.cancel()
+            for application in reversed(started):
+                await application.stop()
+                await application.shutdown()
+
+    def submit(self, bot_id, data):
+        """
+        Поставить обновление в очередь (вызывается из потока HTTP-сервера)
+
+        Returns:
+            False, если очередь заполнена
+        """
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            return False
+        self.received += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (self.applications[bot_id], data))
+        return True
+
+    def check_secret(self, value):
+        """Совпадает ли секрет из заголовка запроса с настроенным"""
+        return hmac.compare_digest((value or '').encode(), self.secret.encode())
+
+    async def _worker(self):
+        """Обработчик обновлений из очереди"""
+        while True:
+            application, data = await self._queue.get()
+            try:
+                await application.process_update(Update.de_json(data, application.bot))
+            except Exception as e:
+                logger.error(f"Ошибка обработки обновления вебхука: {e}", exc_info=True)
+            finally:
+                self._slots.release()
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    """HTTP-обработчик вебхука: проверка, постановка в очередь и немедленный ответ"""
+
+    def do_POST(self):
+        webhook = self.server.webhook
+
+        prefix, _, bot_id = self.path.rpartition('/')
+        if prefix != WEBHOOK_PATH or bot_id not in webhook.applications:
+            self._reply(404)
+            return
+
+        if not webhook.check_secret(self.headers.get(SECRET_HEADER)):
+            logger.warning(f"Запрос вебхука с неверным секретом от {self.client_address[0]}")
+            self._reply(403)
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            self._reply(400)
+            return
+        if length <= 0 or length > MAX_BODY_SIZE:
+            self._reply(400)
+            return
+
+        try:
+            data = json.loads(self.rfile.read(length))
+        except ValueError:
+            self._reply(400)
+            return
+
+        self._reply(200 if webhook.submit(bot_id, data) else 503)
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(f"Вебхук: {self.client_address[0]} {format % args}")